@@ -15,6 +15,9 @@ from pandapipes.properties.fluids import *
 from pandapipes.create import *
 from pandapipes.io.file_io import *
 from pandapipes.pipeflow import *
+from pandapipes.pf.pipeflow_batch import pipeflow_batch
+from pandapipes.pf.incremental_pit import invalidate_pit_structure
+from pandapipes.pf.pipeflow_model import compile_pipeflow, PipeflowModel
 from pandapipes.toolbox import *
 from pandapipes.pf.pipeflow_setup import *
 from pandapipes.std_types import *
@@ -86,6 +86,10 @@ class Component:
     def adaption_after_derivatives_thermal(cls, net, branch_pit, node_pit, idx_lookups, options):
         pass
 
+    @classmethod
+    def adaption_after_derivatives_coupled(cls, net, branch_pit, node_pit, idx_lookups, options):
+        pass
+
 
     @classmethod
     def create_node_lookups(cls, net, ft_lookups, table_lookup, idx_lookups, current_start,
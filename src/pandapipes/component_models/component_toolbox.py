@@ -11,7 +11,7 @@ from pandapipes.constants import NORMAL_PRESSURE, TEMP_GRADIENT_KPM, AVG_TEMPERA
 from pandapipes.idx_branch import LOAD_VEC_NODES, FROM_NODE, TO_NODE
 from pandapipes.idx_node import EXT_GRID_OCCURENCE, EXT_GRID_OCCURENCE_T
 from pandapipes.idx_node import PINIT, NODE_TYPE, P, TINIT, NODE_TYPE_T, T, LOAD
-from pandapipes.pf.internals_toolbox import _sum_by_group
+from pandapipes.pf.internals_toolbox import _sum_by_group, _sum_by_index
 from pandapipes.pf.pipeflow_setup import get_net_option, get_lookup
 
 
@@ -163,20 +163,13 @@ def set_fixed_node_entries(net, node_pit, junctions, eg_types, p_values, t_value
 
 def get_mass_flow_at_nodes(net, node_pit, branch_pit, eg_nodes, comp):
     node_uni, inverse_nodes, counts = np.unique(eg_nodes, return_counts=True, return_inverse=True)
-    eg_from_branches = np.isin(branch_pit[:, FROM_NODE], node_uni)
-    eg_to_branches = np.isin(branch_pit[:, TO_NODE], node_uni)
-    from_nodes = branch_pit[eg_from_branches, FROM_NODE]
-    to_nodes = branch_pit[eg_to_branches, TO_NODE]
-    mass_flow_from = branch_pit[eg_from_branches, LOAD_VEC_NODES]
-    mass_flow_to = branch_pit[eg_to_branches, LOAD_VEC_NODES]
-    loads = node_pit[node_uni, LOAD]
-    all_index_nodes = np.concatenate([from_nodes, to_nodes, node_uni])
-    all_mass_flows = np.concatenate([-mass_flow_from, mass_flow_to, -loads])
-    nodes, sum_mass_flows = _sum_by_group(get_net_option(net, "use_numba"), all_index_nodes,
-                                          all_mass_flows)
-    if not np.all(nodes == node_uni):
-        raise UserWarning("In component %s: Something went wrong with the mass flow balance. "
-                          "Please report this error at github." % comp.__name__)
+    len_n = len(node_pit)
+    # mass flow balance of all nodes (inflow by branches minus loads), read at the given nodes
+    from_nodes = branch_pit[:, FROM_NODE].astype(np.int32)
+    to_nodes = branch_pit[:, TO_NODE].astype(np.int32)
+    mass_flows = branch_pit[:, LOAD_VEC_NODES]
+    sum_mass_flows = _sum_by_index(to_nodes, mass_flows, len_n)[node_uni] \
+        - _sum_by_index(from_nodes, mass_flows, len_n)[node_uni] - node_pit[node_uni, LOAD]
     return sum_mass_flows, inverse_nodes, counts
 
 
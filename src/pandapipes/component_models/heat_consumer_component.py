@@ -9,8 +9,10 @@ from pandapipes.component_models import get_fluid, BranchWZeroLengthComponent, g
     standard_branch_wo_internals_result_lookup
 from pandapipes.component_models.junction_component import Junction
 from pandapipes.idx_branch import D, AREA, MDOTINIT, QEXT, JAC_DERIV_DP1, FROM_NODE_T, JAC_DERIV_DM, JAC_DERIV_DP, \
-    LOAD_VEC_BRANCHES, TOUTINIT, JAC_DERIV_DT, JAC_DERIV_DTOUT, LOAD_VEC_BRANCHES_T, ACTIVE
+    LOAD_VEC_BRANCHES, TOUTINIT, JAC_DERIV_DT, JAC_DERIV_DTOUT, LOAD_VEC_BRANCHES_T, ACTIVE, \
+    JAC_DERIV_DM_T, JAC_DERIV_DT_H, JAC_DERIV_DTOUT_H
 from pandapipes.idx_node import TINIT
+from pandapipes.pf.derivative_calculation import get_temperature_derivative
 from pandapipes.pf.result_extraction import extract_branch_results_without_internals
 from pandapipes.properties.properties_toolbox import get_branch_cp
 
@@ -188,8 +190,38 @@ class HeatConsumer(BranchWZeroLengthComponent):
             hc_pit[mask, LOAD_VEC_BRANCHES_T] = 0
             hc_pit[mask, JAC_DERIV_DTOUT] = -1
             hc_pit[mask, JAC_DERIV_DT] = 0
+            hc_pit[mask, JAC_DERIV_DM_T] = 0
             hc_pit[mask, TOUTINIT] = consumer_array[mask, cls.TRETURN]
 
+    @classmethod
+    def adaption_after_derivatives_coupled(cls, net, branch_pit, node_pit, idx_lookups, options):
+        # the mass flows that are calculated from the heat extraction depend on the heat
+        # capacity, i.e. on the mean of the inlet and outlet temperature
+        f, t = idx_lookups[cls.table_name()]
+        hc_pit = branch_pit[f:t, :]
+        consumer_array = get_component_array(net, cls.table_name())
+        mask_dt = consumer_array[:, cls.MODE] == cls.QE_DT
+        mask_tr = consumer_array[:, cls.MODE] == cls.QE_TR
+        if not np.any(mask_dt | mask_tr):
+            return
+        fluid = get_fluid(net)
+        t_in = node_pit[hc_pit[:, FROM_NODE_T].astype(int), TINIT]
+        t_out = hc_pit[:, TOUTINIT]
+        cp = get_branch_cp(net, fluid, node_pit, hc_pit)
+        # derivative of cp by the inlet and by the outlet temperature
+        der_cp = get_temperature_derivative(fluid.get_heat_capacity, (t_in + t_out) / 2) / 2
+        mdot = hc_pit[:, MDOTINIT]
+
+        # mdot - qext / (cp * deltat) = 0
+        der_dt = mdot[mask_dt] * der_cp[mask_dt] / cp[mask_dt]
+        hc_pit[mask_dt, JAC_DERIV_DT_H] = der_dt
+        hc_pit[mask_dt, JAC_DERIV_DTOUT_H] = der_dt
+
+        # cp * (t_in - t_return) * mdot - qext = 0
+        delta_t = t_in[mask_tr] - consumer_array[mask_tr, cls.TRETURN]
+        hc_pit[mask_tr, JAC_DERIV_DT_H] = mdot[mask_tr] * (cp[mask_tr] + delta_t * der_cp[mask_tr])
+        hc_pit[mask_tr, JAC_DERIV_DTOUT_H] = mdot[mask_tr] * delta_t * der_cp[mask_tr]
+
     @classmethod
     def get_component_input(cls):
         """
@@ -11,7 +11,7 @@ from pandapipes.component_models.component_toolbox import p_correction_height_ai
 from pandapipes.idx_node import L, ELEMENT_IDX, PINIT, node_cols, HEIGHT, TINIT, PAMB, \
     ACTIVE as ACTIVE_ND
 from pandapipes.pf.pipeflow_setup import add_table_lookup, get_table_number, \
-    get_lookup
+    get_lookup, IndexLookup
 
 
 class Junction(NodeComponent):
@@ -51,12 +51,8 @@ class Junction(NodeComponent):
         end = current_start + table_len
         ft_lookups[cls.table_name()] = (current_start, end)
         add_table_lookup(table_lookup, cls.table_name(), current_table)
-        if not table_len:
-            idx_lookups[cls.table_name()] = np.array([], dtype=np.int32)
-            idx_lookups[cls.table_name()][table_indices] = np.arange(table_len) + current_start
-        else:
-            idx_lookups[cls.table_name()] = -np.ones(table_indices.max() + 1, dtype=np.int32)
-            idx_lookups[cls.table_name()][table_indices] = np.arange(table_len) + current_start
+        idx_lookups[cls.table_name()] = IndexLookup(table_indices.values,
+                                                    np.arange(table_len) + current_start)
         return end, current_table + 1
 
     @classmethod
@@ -40,5 +40,9 @@ TEXT = 30
 PL = 31
 TL = 32 # Temperature lift [K]
 BRANCH_TYPE = 33  # branch type relevant for the pressure controller
+JAC_DERIV_DM_T = 34  # Slot for the derivative of the thermal equation by mass (in flow direction)
+JAC_DERIV_DT_H = 35  # Slot for the derivative of the hydraulic equation by T from_node_t
+JAC_DERIV_DT1_H = 36  # Slot for the derivative of the hydraulic equation by T to_node_t
+JAC_DERIV_DTOUT_H = 37  # Slot for the derivative of the hydraulic equation by T out
 
-branch_cols = 34
+branch_cols = 38
@@ -8,15 +8,23 @@ from pandapipes.idx_branch import FROM_NODE, TO_NODE, JAC_DERIV_DM, JAC_DERIV_DP
     JAC_DERIV_DT_NODE, LOAD_VEC_NODES_T, LOAD_VEC_BRANCHES_T, FROM_NODE_T, TO_NODE_T, BRANCH_TYPE
 from pandapipes.idx_node import LOAD, TINIT
 from pandapipes.idx_node import P, PC, NODE_TYPE, T, NODE_TYPE_T
-from pandapipes.pf.internals_toolbox import _sum_by_group_sorted, _sum_by_group
+from pandapipes.pf.internals_toolbox import _sum_by_index
 from pandapipes.pf.pipeflow_setup import get_net_option
 from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
 
 
 def build_system_matrix(net, branch_pit, node_pit, heat_mode):
     """
     Builds the system matrix.
 
+    The sparsity structure of the matrix (row and column of every entry and the order of the \
+    entries in the csr format) only depends on the topology of the active pit, the node and \
+    branch types and, in heat mode, the flow directions. If the options \
+    **only_update_hydraulic_matrix** or **only_update_heat_matrix** are set, the structure is \
+    stored in net["_internal_data"] and only the data of the matrix is rewritten in the \
+    following iterations (c.f. :func:`get_matrix_structure`).
+
     :param net: The pandapipes network
     :type net: pandapipesNet
     :param branch_pit: pandapipes internal table for branching components such as pipes or valves
@@ -28,44 +36,16 @@ def build_system_matrix(net, branch_pit, node_pit, heat_mode):
     :return: system_matrix, load_vector
     :rtype: system_matrix - scipy.sparse.csr.csr_matrix, load_vector - numpy.ndarray
     """
-    update_option = get_net_option(net, "only_update_hydraulic_matrix")
-    update_only = update_option and "hydraulic_data_sorting" in net["_internal_data"] \
-        and "hydraulic_matrix" in net["_internal_data"]
-    use_numba = get_net_option(net, "use_numba")
+    structure = get_matrix_structure(net, branch_pit, node_pit, heat_mode)
 
     len_b = len(branch_pit)
     len_n = len(node_pit)
-    branch_matrix_indices = np.arange(len_b) + len_n
-    fn_col, tn_col, ntyp_col, slack_type, pc_type, num_der = \
-        (FROM_NODE, TO_NODE, NODE_TYPE, P, PC, 3) \
-        if not heat_mode else (FROM_NODE_T, TO_NODE_T, NODE_TYPE_T, T, PC, 2)
-    pc_nodes = np.where(node_pit[:, ntyp_col] == pc_type)[0]
-    fn = branch_pit[:, fn_col].astype(np.int32)
-    tn = branch_pit[:, tn_col].astype(np.int32)
-    not_slack_fn_branch_mask = node_pit[fn, ntyp_col] != slack_type
-    not_slack_tn_branch_mask = node_pit[tn, ntyp_col] != slack_type
-    pc_branch_mask = branch_pit[:, BRANCH_TYPE] == pc_type
-    slack_nodes = np.where(node_pit[:, ntyp_col] == slack_type)[0]
-    pc_matrix_indices = branch_matrix_indices[pc_branch_mask]
-
-    if not heat_mode:
-        len_fn_not_slack = np.sum(not_slack_fn_branch_mask)
-        len_tn_not_slack = np.sum(not_slack_tn_branch_mask)
-        len_fn1 = num_der * len_b + len_fn_not_slack
-        len_tn1 = len_fn1 + len_tn_not_slack
-        len_pc = len_tn1 + pc_nodes.shape[0]
-        full_len = len_pc + slack_nodes.shape[0]
-    else:
-        inc_flow_sum = np.zeros(len(node_pit[:, LOAD]))
-        tn_unique_der, tn_sums_der = _sum_by_group(use_numba, tn, branch_pit[:, JAC_DERIV_DT_NODE])
-        inc_flow_sum[tn_unique_der] += tn_sums_der
-        len_fn1 = num_der * len_b + len(tn_unique_der)
-        len_tn1 = len_fn1 + len_b
-        full_len = len_tn1 + slack_nodes.shape[0]
-
-    system_data = np.zeros(full_len, dtype=np.float64)
+    len_fn1, len_tn1 = structure["len_fn1"], structure["len_tn1"]
+    slack_nodes = structure["slack_nodes"]
+    system_data = np.zeros(structure["full_len"], dtype=np.float64)
 
     if not heat_mode:
+        fn, tn = structure["fn"], structure["tn"]
         # pdF_dv
         system_data[:len_b] = branch_pit[:, JAC_DERIV_DM]
         # pdF_dpi
@@ -73,124 +53,285 @@ def build_system_matrix(net, branch_pit, node_pit, heat_mode):
         # pdF_dpi1
         system_data[2 * len_b:3 * len_b] = branch_pit[:, JAC_DERIV_DP1]
         # jdF_dv_from_nodes
-        system_data[3 * len_b:len_fn1] = branch_pit[not_slack_fn_branch_mask, JAC_DERIV_DM_NODE] * (-1)
+        system_data[3 * len_b:len_fn1] = \
+            branch_pit[structure["not_slack_fn_branch_mask"], JAC_DERIV_DM_NODE] * (-1)
         # jdF_dv_to_nodes
-        system_data[len_fn1:len_tn1] = branch_pit[not_slack_tn_branch_mask, JAC_DERIV_DM_NODE]
+        system_data[len_fn1:len_tn1] = \
+            branch_pit[structure["not_slack_tn_branch_mask"], JAC_DERIV_DM_NODE]
         # pc_nodes and p_nodes
         system_data[len_tn1:] = 1
     else:
+        branch_order = structure["branch_order"]
+        tn_sums_der = _sum_by_sorted_groups(branch_pit[branch_order, JAC_DERIV_DT_NODE],
+                                            structure["tn_group_starts"])
         system_data[:len_b] = branch_pit[:, JAC_DERIV_DT]
         # pdF_dpi1
         system_data[len_b:2 * len_b] = branch_pit[:, JAC_DERIV_DTOUT]
         # jdF_dv_from_nodes
-        system_data[2 * len_b:len_fn1] = inc_flow_sum[tn_unique_der]
+        system_data[2 * len_b:len_fn1] = tn_sums_der
         # jdF_dv_to_nodes
-        data = branch_pit[:, JAC_DERIV_DT_NODE] * (-1)
-        rows = tn
-        index = np.argsort(rows)
-        data = data[index]
-        system_data[len_fn1:len_fn1 + len_b] = data
-        system_data[len_fn1 + len_b:] = 1
-
-    if not update_only:
-        system_cols = np.zeros(full_len, dtype=np.int32)
-        system_rows = np.zeros(full_len, dtype=np.int32)
-
-        if not heat_mode:
-            # pdF_dv
-            system_cols[:len_b] = branch_matrix_indices
-            system_rows[:len_b] = branch_matrix_indices
-
-            # pdF_dpi
-            system_cols[len_b:2 * len_b] = fn
-            system_rows[len_b:2 * len_b] = branch_matrix_indices
-
-            # pdF_dpi1
-            system_cols[2 * len_b:3 * len_b] = tn
-            system_rows[2 * len_b:3 * len_b] = branch_matrix_indices
-
-            # jdF_dv_from_nodes
-            system_cols[3 * len_b:len_fn1] = branch_matrix_indices[not_slack_fn_branch_mask]
-            system_rows[3 * len_b:len_fn1] = fn[not_slack_fn_branch_mask]
-
-            # jdF_dv_to_nodes
-            system_cols[len_fn1:len_tn1] = branch_matrix_indices[not_slack_tn_branch_mask]
-            system_rows[len_fn1:len_tn1] = tn[not_slack_tn_branch_mask]
-
-            # pc_nodes
-            system_cols[len_tn1:len_pc] = pc_nodes
-            system_rows[len_tn1:len_pc] = pc_matrix_indices
-
-            # p_nodes
-            system_cols[len_pc:] = slack_nodes
-            system_rows[len_pc:] = slack_nodes
-        else:
-            # pdF_dTfromnode
-            system_cols[:len_b] = fn
-            system_rows[:len_b] = branch_matrix_indices
-
-            # pdF_dTout
-            system_cols[len_b:2 * len_b] = branch_matrix_indices
-            system_rows[len_b:2 * len_b] = branch_matrix_indices
-
-            # t_nodes
-            system_cols[len_fn1 + len_b:] = slack_nodes
-            system_rows[len_fn1 + len_b:] = np.arange(0, len(slack_nodes))
-
-            # jdF_dTnode_
-            tn_unique_idx = np.unique(tn, return_index=True)
-            system_cols[2 * len_b:len_fn1] = tn_unique_idx[0]
-            system_rows[2 * len_b:len_fn1] = len(slack_nodes) + np.arange(0, len(tn_unique_der))
-
-            # jdF_dTout
-            branch_order = np.argsort(tn)
-            tn_uni, tn_uni_counts = np.unique(tn[branch_order], return_counts=True)
-            row_index = np.repeat(np.arange(len(tn_uni)), tn_uni_counts)
-            system_cols[len_fn1:len_fn1 + len_b] = branch_matrix_indices[branch_order]
-            system_rows[len_fn1:len_fn1 + len_b] = len(slack_nodes) + row_index
-
-        if not update_option:
-            system_matrix = csr_matrix((system_data, (system_rows, system_cols)),
-                                       shape=(len_n + len_b, len_n + len_b))
-
-        else:
-            data_order = np.lexsort([system_cols, system_rows])
-            system_data = system_data[data_order]
-            system_cols = system_cols[data_order]
-            system_rows = system_rows[data_order]
-
-            row_counter = np.zeros(len_b + len_n + 1, dtype=np.int32)
-            unique_rows, row_counts = _sum_by_group_sorted(system_rows, np.ones_like(system_rows))
-            row_counter[unique_rows + 1] += row_counts
-            ptr = row_counter.cumsum()
-            system_matrix = csr_matrix((system_data, system_cols, ptr),
-                                       shape=(len_n + len_b, len_n + len_b))
-            net["_internal_data"]["hydraulic_data_sorting"] = data_order
-            net["_internal_data"]["hydraulic_matrix"] = system_matrix
+        system_data[len_fn1:len_tn1] = branch_pit[branch_order, JAC_DERIV_DT_NODE] * (-1)
+        system_data[len_tn1:] = 1
+
+    if structure["duplicates"]:
+        system_data = np.bincount(structure["data_order"], weights=system_data,
+                                  minlength=len(structure["indices"]))
     else:
-        data_order = net["_internal_data"]["hydraulic_data_sorting"]
-        system_data = system_data[data_order]
-        system_matrix = net["_internal_data"]["hydraulic_matrix"]
-        system_matrix.data = system_data
+        system_data = system_data[structure["data_order"]]
+    # the index arrays are shared with the stored structure, the data is always a new array
+    system_matrix = csr_matrix((system_data, structure["indices"], structure["indptr"]),
+                               shape=(len_n + len_b, len_n + len_b), copy=False)
+    system_matrix.has_sorted_indices = True
 
     if not heat_mode:
-        load_vector = np.empty(len_n + len_b)
-        load_vector[len_n:] = branch_pit[:, LOAD_VEC_BRANCHES]
-        load_vector[:len_n] = node_pit[:, LOAD] * (-1)
-        fn_unique, fn_sums = _sum_by_group(use_numba, fn, branch_pit[:, LOAD_VEC_NODES])
-        tn_unique, tn_sums = _sum_by_group(use_numba, tn, branch_pit[:, LOAD_VEC_NODES])
-        load_vector[fn_unique] -= fn_sums
-        load_vector[tn_unique] += tn_sums
-        load_vector[slack_nodes] = 0
-        load_vector[pc_matrix_indices] = 0
+        load_vector = build_hydraulic_load_vector(branch_pit, node_pit, fn, tn, slack_nodes,
+                                                  structure["pc_matrix_indices"])
     else:
-        tn_unique, tn_sums = _sum_by_group(use_numba, tn, branch_pit[:, LOAD_VEC_NODES_T])
+        tn_unique = structure["tn_unique"]
+        tn_sums = _sum_by_sorted_groups(branch_pit[branch_order, LOAD_VEC_NODES_T],
+                                        structure["tn_group_starts"])
+        mixing_rows = len(slack_nodes) + np.arange(0, len(tn_unique))
         load_vector = np.zeros(len_n + len_b)
-        load_vector[len(slack_nodes) + np.arange(0, len(tn_unique_der))] += tn_sums
-        load_vector[len(slack_nodes) + np.arange(0, len(tn_unique_der))] -= tn_sums_der * node_pit[
-            tn_unique_der, TINIT]
+        load_vector[mixing_rows] += tn_sums
+        load_vector[mixing_rows] -= tn_sums_der * node_pit[tn_unique, TINIT]
         load_vector[0:len(slack_nodes)] = 0.
 
         load_vector[len_n:] = branch_pit[:, LOAD_VEC_BRANCHES_T]
 
     return system_matrix, load_vector
+
+
+def build_hydraulic_load_vector(branch_pit, node_pit, fn=None, tn=None, slack_nodes=None,
+                                pc_matrix_indices=None):
+    """
+    Builds the load vector (residual) of the hydraulic system: the mass flow balance of the \
+    nodes and the branch equations. The rows of slack nodes and pressure controlled branches \
+    are 0.
+
+    :param branch_pit: pandapipes internal table for branching components such as pipes or valves
+    :type branch_pit: numpy.ndarray
+    :param node_pit:  pandapipes internal table for node components
+    :type node_pit: numpy.ndarray
+    :param fn: from nodes of the branches (determined from the branch_pit if None)
+    :type fn: numpy.ndarray, default None
+    :param tn: to nodes of the branches (determined from the branch_pit if None)
+    :type tn: numpy.ndarray, default None
+    :param slack_nodes: indices of the slack nodes (determined from the node_pit if None)
+    :type slack_nodes: numpy.ndarray, default None
+    :param pc_matrix_indices: rows of the pressure controlled branches (determined from the \
+        branch_pit if None)
+    :type pc_matrix_indices: numpy.ndarray, default None
+    :return: load_vector
+    :rtype: numpy.ndarray
+    """
+    len_n, len_b = len(node_pit), len(branch_pit)
+    if fn is None or tn is None:
+        fn = branch_pit[:, FROM_NODE].astype(np.int32)
+        tn = branch_pit[:, TO_NODE].astype(np.int32)
+    if slack_nodes is None:
+        slack_nodes = np.where(node_pit[:, NODE_TYPE] == P)[0]
+    if pc_matrix_indices is None:
+        pc_matrix_indices = len_n + np.where(branch_pit[:, BRANCH_TYPE] == PC)[0]
+    load_vector = np.empty(len_n + len_b)
+    load_vector[len_n:] = branch_pit[:, LOAD_VEC_BRANCHES]
+    load_vector[:len_n] = node_pit[:, LOAD] * (-1)
+    load_vector[:len_n] -= _sum_by_index(fn, branch_pit[:, LOAD_VEC_NODES], len_n)
+    load_vector[:len_n] += _sum_by_index(tn, branch_pit[:, LOAD_VEC_NODES], len_n)
+    load_vector[slack_nodes] = 0
+    load_vector[pc_matrix_indices] = 0
+    return load_vector
+
+
+class HydraulicJacobianOperator(LinearOperator):
+    """
+    Jacobian of the hydraulic system as a linear operator, which evaluates products with vectors \
+    directly from the derivative columns of the branch pit (the same entries as in \
+    :func:`build_system_matrix`) without assembling a sparse matrix. The derivatives are copied \
+    at creation, so that the operator belongs to the state at which it was created.
+
+    :param branch_pit: pandapipes internal table for branching components such as pipes or valves
+    :type branch_pit: numpy.ndarray
+    :param node_pit:  pandapipes internal table for node components
+    :type node_pit: numpy.ndarray
+    """
+
+    def __init__(self, branch_pit, node_pit):
+        len_n, len_b = len(node_pit), len(branch_pit)
+        super().__init__(np.float64, (len_n + len_b, len_n + len_b))
+        self.len_n = len_n
+        self.fn = branch_pit[:, FROM_NODE].astype(np.int32)
+        self.tn = branch_pit[:, TO_NODE].astype(np.int32)
+        self.slack_nodes = np.where(node_pit[:, NODE_TYPE] == P)[0]
+        self.pc_nodes = np.where(node_pit[:, NODE_TYPE] == PC)[0]
+        self.pc_branches = np.where(branch_pit[:, BRANCH_TYPE] == PC)[0]
+        self.d_m = branch_pit[:, JAC_DERIV_DM].copy()
+        self.d_p_from = branch_pit[:, JAC_DERIV_DP].copy()
+        self.d_p_to = branch_pit[:, JAC_DERIV_DP1].copy()
+        # derivatives of the node balances, the balances of slack nodes are replaced
+        is_slack = node_pit[:, NODE_TYPE] == P
+        self.d_m_from = branch_pit[:, JAC_DERIV_DM_NODE] * (-1) * ~is_slack[self.fn]
+        self.d_m_to = branch_pit[:, JAC_DERIV_DM_NODE] * ~is_slack[self.tn]
+
+    def _matvec(self, x):
+        x = np.ravel(x)
+        len_n = self.len_n
+        x_p, x_m = x[:len_n], x[len_n:]
+        y = np.empty(self.shape[0], dtype=np.float64)
+        y[len_n:] = self.d_m * x_m + self.d_p_from * x_p[self.fn] + self.d_p_to * x_p[self.tn]
+        y[len_n + self.pc_branches] += x_p[self.pc_nodes]
+        y[:len_n] = _sum_by_index(self.fn, self.d_m_from * x_m, len_n) \
+            + _sum_by_index(self.tn, self.d_m_to * x_m, len_n)
+        y[self.slack_nodes] = x_p[self.slack_nodes]
+        return y
+
+
+def get_matrix_structure(net, branch_pit, node_pit, heat_mode):
+    """
+    Returns the sparsity structure of the system matrix. It is identified by a signature of the \
+    from and to nodes (in heat mode in flow direction), the node types and the branch types. If \
+    the option **only_update_hydraulic_matrix** (hydraulics) or **only_update_heat_matrix** \
+    (heat mode) is set, the structure is stored in net["_internal_data"] and reused as long as \
+    the signature does not change. It is rebuilt automatically otherwise, e.g. if the flow \
+    direction of a branch changes in heat mode or if the active pit is reduced differently.
+
+    :param net: The pandapipes network
+    :type net: pandapipesNet
+    :param branch_pit: pandapipes internal table for branching components such as pipes or valves
+    :type branch_pit: numpy.ndarray
+    :param node_pit:  pandapipes internal table for node components
+    :type node_pit: numpy.ndarray
+    :param heat_mode: Is it a heat network calculation: True or False
+    :type heat_mode: bool
+    :return: structure - dictionary with the signature, the csr indices and index pointer, the \
+        order of the assembled entries in the csr data ("data_order") and the auxiliary arrays to \
+        assemble the entries
+    :rtype: dict
+    """
+    fn_col, tn_col, ntyp_col, slack_type, pc_type, num_der, cache_key, option = \
+        (FROM_NODE, TO_NODE, NODE_TYPE, P, PC, 3, "matrix_structure_hydraulics",
+         "only_update_hydraulic_matrix") if not heat_mode else \
+        (FROM_NODE_T, TO_NODE_T, NODE_TYPE_T, T, PC, 2, "matrix_structure_heat_transfer",
+         "only_update_heat_matrix")
+    fn = branch_pit[:, fn_col].astype(np.int32)
+    tn = branch_pit[:, tn_col].astype(np.int32)
+    node_types = node_pit[:, ntyp_col]
+    branch_types = branch_pit[:, BRANCH_TYPE]
+
+    store = get_net_option(net, option)
+    structure = net["_internal_data"].get(cache_key, None) if store else None
+    if structure is not None and np.array_equal(structure["fn"], fn) \
+            and np.array_equal(structure["tn"], tn) \
+            and np.array_equal(structure["node_types"], node_types) \
+            and np.array_equal(structure["branch_types"], branch_types):
+        return structure
+
+    len_b = len(branch_pit)
+    len_n = len(node_pit)
+    branch_matrix_indices = np.arange(len_b) + len_n
+    slack_nodes = np.where(node_types == slack_type)[0]
+    structure = {"fn": fn, "tn": tn, "node_types": node_types.copy(),
+                 "branch_types": branch_types.copy(), "slack_nodes": slack_nodes}
+
+    if not heat_mode:
+        pc_nodes = np.where(node_types == pc_type)[0]
+        not_slack_fn_branch_mask = node_types[fn] != slack_type
+        not_slack_tn_branch_mask = node_types[tn] != slack_type
+        pc_matrix_indices = branch_matrix_indices[branch_types == pc_type]
+        len_fn1 = num_der * len_b + np.sum(not_slack_fn_branch_mask)
+        len_tn1 = len_fn1 + np.sum(not_slack_tn_branch_mask)
+        len_pc = len_tn1 + pc_nodes.shape[0]
+        full_len = len_pc + slack_nodes.shape[0]
+        structure.update({"not_slack_fn_branch_mask": not_slack_fn_branch_mask,
+                          "not_slack_tn_branch_mask": not_slack_tn_branch_mask,
+                          "pc_matrix_indices": pc_matrix_indices})
+    else:
+        # the branches sorted by their to nodes (in flow direction) and the first branch of
+        # every to node
+        branch_order = np.argsort(tn, kind="stable")
+        tn_sorted = tn[branch_order]
+        group_starts = np.flatnonzero(np.r_[True, tn_sorted[1:] != tn_sorted[:-1]]) \
+            if len_b else np.zeros(0, dtype=np.int64)
+        tn_unique = tn_sorted[group_starts]
+        len_fn1 = num_der * len_b + len(tn_unique)
+        len_tn1 = len_fn1 + len_b
+        full_len = len_tn1 + slack_nodes.shape[0]
+        structure.update({"branch_order": branch_order, "tn_group_starts": group_starts,
+                          "tn_unique": tn_unique})
+    structure.update({"len_fn1": len_fn1, "len_tn1": len_tn1, "full_len": full_len})
+
+    system_cols = np.zeros(full_len, dtype=np.int32)
+    system_rows = np.zeros(full_len, dtype=np.int32)
+
+    if not heat_mode:
+        # pdF_dv
+        system_cols[:len_b] = branch_matrix_indices
+        system_rows[:len_b] = branch_matrix_indices
+
+        # pdF_dpi
+        system_cols[len_b:2 * len_b] = fn
+        system_rows[len_b:2 * len_b] = branch_matrix_indices
+
+        # pdF_dpi1
+        system_cols[2 * len_b:3 * len_b] = tn
+        system_rows[2 * len_b:3 * len_b] = branch_matrix_indices
+
+        # jdF_dv_from_nodes
+        system_cols[3 * len_b:len_fn1] = branch_matrix_indices[not_slack_fn_branch_mask]
+        system_rows[3 * len_b:len_fn1] = fn[not_slack_fn_branch_mask]
+
+        # jdF_dv_to_nodes
+        system_cols[len_fn1:len_tn1] = branch_matrix_indices[not_slack_tn_branch_mask]
+        system_rows[len_fn1:len_tn1] = tn[not_slack_tn_branch_mask]
+
+        # pc_nodes
+        system_cols[len_tn1:len_pc] = pc_nodes
+        system_rows[len_tn1:len_pc] = pc_matrix_indices
+
+        # p_nodes
+        system_cols[len_pc:] = slack_nodes
+        system_rows[len_pc:] = slack_nodes
+    else:
+        # pdF_dTfromnode
+        system_cols[:len_b] = fn
+        system_rows[:len_b] = branch_matrix_indices
+
+        # pdF_dTout
+        system_cols[len_b:2 * len_b] = branch_matrix_indices
+        system_rows[len_b:2 * len_b] = branch_matrix_indices
+
+        # t_nodes
+        system_cols[len_tn1:] = slack_nodes
+        system_rows[len_tn1:] = np.arange(0, len(slack_nodes))
+
+        # jdF_dTnode_
+        system_cols[2 * len_b:len_fn1] = tn_unique
+        system_rows[2 * len_b:len_fn1] = len(slack_nodes) + np.arange(0, len(tn_unique))
+
+        # jdF_dTout
+        row_index = np.repeat(np.arange(len(tn_unique)), np.diff(np.r_[group_starts, len_b]))
+        system_cols[len_fn1:len_tn1] = branch_matrix_indices[branch_order]
+        system_rows[len_fn1:len_tn1] = len(slack_nodes) + row_index
+
+    # order of the entries in the csr format, entries with the same position are summed up
+    size = len_n + len_b
+    positions = system_rows.astype(np.int64) * size + system_cols
+    unique_positions, data_order = np.unique(positions, return_inverse=True)
+    duplicates = len(unique_positions) < full_len
+    if not duplicates:
+        data_order = np.argsort(positions, kind="stable")
+    rows = (unique_positions // size).astype(np.int32)
+    structure.update({
+        "indices": (unique_positions % size).astype(np.int32),
+        "indptr": np.r_[0, np.cumsum(np.bincount(rows, minlength=size))].astype(np.int32),
+        "data_order": data_order, "duplicates": duplicates})
+
+    if store:
+        net["_internal_data"][cache_key] = structure
+    return structure
+
+
+def _sum_by_sorted_groups(values, group_starts):
+    # sums of consecutive groups of values, the groups are given by their first positions
+    if not len(group_starts):
+        return np.zeros(0, dtype=np.float64)
+    return np.add.reduceat(values, group_starts)
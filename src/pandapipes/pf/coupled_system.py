@@ -0,0 +1,147 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+from scipy.sparse import csr_matrix, bmat
+
+from pandapipes.idx_branch import FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, MDOTINIT, \
+    MDOTINIT_T, TOUTINIT, JAC_DERIV_DM_T, JAC_DERIV_DT_H, JAC_DERIV_DT1_H, JAC_DERIV_DTOUT_H
+from pandapipes.idx_node import TINIT, NODE_TYPE_T, T
+from pandapipes.pf.derivative_calculation import calculate_derivatives_coupled
+from pandapipes.pf.pipeflow_setup import get_lookup
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+
+def set_thermal_flow_direction(branch_pit):
+    """
+    Sets the columns of the heat transfer calculation that depend on the flow direction: the \
+    absolute mass flow and the from and to nodes in flow direction (from_node and to_node are \
+    exchanged for negative mass flows).
+
+    :param branch_pit: The internal branch array
+    :type branch_pit: np.array
+    :return: No output
+    """
+    branch_pit[:, MDOTINIT_T] = branch_pit[:, MDOTINIT]
+    branch_pit[:, FROM_NODE_T] = branch_pit[:, FROM_NODE]
+    branch_pit[:, TO_NODE_T] = branch_pit[:, TO_NODE]
+    mask = branch_pit[:, MDOTINIT] < 0
+    branch_pit[mask, MDOTINIT_T] = -branch_pit[mask, MDOTINIT]
+    branch_pit[mask, FROM_NODE_T] = branch_pit[mask, TO_NODE]
+    branch_pit[mask, TO_NODE_T] = branch_pit[mask, FROM_NODE]
+
+
+def get_thermal_node_rows(node_pit, branch_pit):
+    """
+    Returns the row of the heat transfer system that belongs to each node: the rows of the \
+    nodes with fixed temperature come first, followed by the mixing equations of all nodes with \
+    inflow (c.f. :func:`pandapipes.pf.build_system_matrix.build_system_matrix`). The heat \
+    transfer system can only be coupled with the hydraulic system on the same active pit if \
+    every node has exactly one of these rows, i.e. if all branches carry flow and every node \
+    without fixed temperature is supplied by at least one branch.
+
+    :param node_pit: The internal node array
+    :type node_pit: np.array
+    :param branch_pit: The internal branch array with the flow direction columns set
+    :type branch_pit: np.array
+    :return: rows - the row of each node, None if the nodes cannot be assigned to the rows
+    :rtype: np.array
+    """
+    len_n = len(node_pit)
+    slack_nodes = np.where(node_pit[:, NODE_TYPE_T] == T)[0]
+    mixing_nodes = np.unique(branch_pit[:, TO_NODE_T].astype(np.int32))
+    if not len(slack_nodes) or np.any(branch_pit[:, MDOTINIT_T] == 0) \
+            or len(slack_nodes) + len(mixing_nodes) != len_n \
+            or np.any(np.isin(slack_nodes, mixing_nodes)):
+        return None
+    rows = np.empty(len_n, dtype=np.int64)
+    rows[slack_nodes] = np.arange(len(slack_nodes))
+    rows[mixing_nodes] = len(slack_nodes) + np.arange(len(mixing_nodes))
+    return rows
+
+
+def build_coupled_system(net, assemble_hydraulic_system, assemble_thermal_system, thermal_rows):
+    """
+    Assembles the jacobian of the coupled hydraulic and thermal system
+
+        | J_hh  J_ht |   | dx_h |   | -F_h |
+        |            | * |      | = |      |
+        | J_th  J_tt |   | dx_t |   | -F_t |
+
+    with the hydraulic unknowns x_h = [p, mdot] and the thermal unknowns x_t = [T, T_out], both \
+    as corrections in the direction of the new state. The diagonal blocks are the jacobians of \
+    the separate systems. The cross derivatives are assembled analytically from the derivative \
+    columns of the branch pit:
+
+      - J_ht: the dependence of the hydraulic branch equations on the temperatures by the \
+        temperature dependent density and viscosity and by components with temperature \
+        dependent mass flows (c.f. \
+        :func:`pandapipes.pf.derivative_calculation.calculate_derivatives_coupled`)
+      - J_th: the dependence of the thermal branch equations and the mixing equations of the \
+        nodes on the mass flows
+
+    The thermal equations do not depend on the pressures, as the fluid properties in the heat \
+    transfer calculation only depend on the temperatures.
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param assemble_hydraulic_system: function that returns the hydraulic jacobian and residual \
+        at the current state of the active pit
+    :type assemble_hydraulic_system: callable
+    :param assemble_thermal_system: function that returns the thermal jacobian and load vector \
+        at the current state of the active pit
+    :type assemble_thermal_system: callable
+    :param thermal_rows: The row of each node in the thermal system (c.f. \
+        :func:`get_thermal_node_rows`)
+    :type thermal_rows: np.array
+    :return: system_matrix, load_vector, residual - the coupled system and the residual of the \
+        hydraulic and thermal equations (in the sign convention of the separate systems)
+    :rtype: scipy.sparse.csr_matrix, np.array, np.array
+    """
+    options = net["_options"]
+    node_pit = net["_active_pit"]["node"]
+    branch_pit = net["_active_pit"]["branch"]
+    len_n, len_b = len(node_pit), len(branch_pit)
+
+    jacobian_h, residual_h = assemble_hydraulic_system(net)
+    jacobian_t, load_t = assemble_thermal_system(net)
+    calculate_derivatives_coupled(net, branch_pit, node_pit, options)
+    branch_lookups = get_lookup(net, "branch", "from_to_active_hydraulics")
+    for comp in net['component_list']:
+        comp.adaption_after_derivatives_coupled(net, branch_pit, node_pit, branch_lookups, options)
+
+    branch_rows = len_n + np.arange(len_b)
+    from_nodes = branch_pit[:, FROM_NODE_T].astype(np.int64)
+    to_nodes = branch_pit[:, TO_NODE_T].astype(np.int64)
+
+    # d(F_h)/d(x_t), the hydraulic residual equals F_h
+    j_ht = _assemble_block(
+        np.tile(branch_rows, 3), np.concatenate([from_nodes, to_nodes, branch_rows]),
+        np.concatenate([branch_pit[:, JAC_DERIV_DT_H], branch_pit[:, JAC_DERIV_DT1_H],
+                        branch_pit[:, JAC_DERIV_DTOUT_H]]), len_n + len_b)
+
+    # d(F_t)/d(mdot), the thermal load vector equals -F_t; the thermal equations depend on the
+    # absolute mass flow, the mixing equation of a node on the mass flows of all inflowing
+    # branches: F_t = sum(mdot_t) * T - sum(mdot_t * T_out)
+    direction = np.sign(branch_pit[:, MDOTINIT])
+    j_th = _assemble_block(
+        np.concatenate([branch_rows, thermal_rows[to_nodes]]), np.tile(branch_rows, 2),
+        np.concatenate([direction * branch_pit[:, JAC_DERIV_DM_T],
+                        direction * (node_pit[to_nodes, TINIT] - branch_pit[:, TOUTINIT])]),
+        len_n + len_b)
+
+    system_matrix = csr_matrix(bmat([[jacobian_h, j_ht], [j_th, jacobian_t]]))
+    load_vector = np.concatenate([-residual_h, load_t])
+    return system_matrix, load_vector, np.concatenate([residual_h, load_t])
+
+
+def _assemble_block(rows, cols, data, size):
+    nonzero = data != 0
+    return csr_matrix((data[nonzero], (rows[nonzero], cols[nonzero])), shape=(size, size))
@@ -3,10 +3,13 @@ import numpy as np
 from pandapipes.idx_branch import LENGTH, D, K, RE, LAMBDA, LOAD_VEC_BRANCHES, \
     JAC_DERIV_DM, JAC_DERIV_DP, JAC_DERIV_DP1, LOAD_VEC_NODES, JAC_DERIV_DM_NODE, \
     FROM_NODE, TO_NODE, FROM_NODE_T, TOUTINIT, TEXT, AREA, ALPHA, TL, QEXT, LOAD_VEC_NODES_T, \
-    LOAD_VEC_BRANCHES_T, JAC_DERIV_DT, JAC_DERIV_DTOUT, JAC_DERIV_DT_NODE, MDOTINIT, MDOTINIT_T
-from pandapipes.idx_node import TINIT as TINIT_NODE
+    LOAD_VEC_BRANCHES_T, JAC_DERIV_DT, JAC_DERIV_DTOUT, JAC_DERIV_DT_NODE, MDOTINIT, MDOTINIT_T, \
+    LOSS_COEFFICIENT as LC, JAC_DERIV_DM_T, JAC_DERIV_DT_H, JAC_DERIV_DT1_H, \
+    JAC_DERIV_DTOUT_H
+from pandapipes.idx_node import TINIT as TINIT_NODE, PINIT, PAMB, HEIGHT
 from pandapipes.properties.fluids import get_fluid
-from pandapipes.constants import NORMAL_TEMPERATURE
+from pandapipes.constants import NORMAL_TEMPERATURE, NORMAL_PRESSURE, GRAVITATION_CONSTANT, \
+    P_CONVERSION
 from pandapipes.properties.properties_toolbox import get_branch_real_density, get_branch_real_eta, get_branch_cp
 
 
@@ -101,6 +104,116 @@ def calculate_derivatives_thermal(net, branch_pit, node_pit, options):
 
     branch_pit[:, JAC_DERIV_DT_NODE] = m_init
     branch_pit[:, LOAD_VEC_NODES_T] = m_init * t_init_i1
+    branch_pit[:, JAC_DERIV_DM_T] = cp * (t_init_i1 - t_init_i - tl)
+
+
+def calculate_derivatives_coupled(net, branch_pit, node_pit, options):
+    """
+    Calculates the derivatives of the hydraulic branch equations by the temperatures, which \
+    couple the hydraulic to the thermal system in the monolithic bidirectional calculation. The \
+    temperatures affect the density in the height difference term and the viscosity in the \
+    friction factor (which only depends on the Reynolds number, i.e. on abs(m) / eta), for \
+    gases additionally the mean temperature of the pressure loss term. The derivatives of the \
+    fluid properties are taken as central differences of the property functions. Branches whose \
+    equation is not a pressure loss equation (i.e. with a pressure derivative of 0 after the \
+    adaptions of the components) are not affected, components can set their own derivatives \
+    afterwards (c.f. adaption_after_derivatives_coupled). The flow direction columns \
+    (FROM_NODE_T, TO_NODE_T) and the friction factor (LAMBDA) have to be set before.
+
+    :param net: The pandapipes network
+    :type net: pandapipesNet
+    :param branch_pit: The branch internal array
+    :type branch_pit: np.ndarray
+    :param node_pit: The node internal array
+    :type node_pit: np.ndarray
+    :param options: Options for the pipeflow
+    :type options: dict
+    :return: No Output.
+    """
+    fluid = get_fluid(net)
+    m_init = branch_pit[:, MDOTINIT]
+    m_init_abs = np.abs(m_init)
+    m_init2 = m_init * m_init_abs
+    from_nodes = branch_pit[:, FROM_NODE].astype(np.int32)
+    to_nodes = branch_pit[:, TO_NODE].astype(np.int32)
+    from_nodes_t = branch_pit[:, FROM_NODE_T].astype(np.int32)
+    t_from = node_pit[from_nodes_t, TINIT_NODE]
+    t_out = branch_pit[:, TOUTINIT]
+    t_m = (t_from + t_out) / 2
+    length, d, area = branch_pit[:, LENGTH], branch_pit[:, D], branch_pit[:, AREA]
+    generic = branch_pit[:, JAC_DERIV_DP] != 0
+    height_term = GRAVITATION_CONSTANT / P_CONVERSION \
+        * (node_pit[from_nodes, HEIGHT] - node_pit[to_nodes, HEIGHT])
+
+    # the friction factor depends on abs(m) / eta, so that d(lambda)/d(eta) equals
+    # -abs(m) / eta * d(lambda)/d(abs(m))
+    eta = fluid.get_viscosity(t_m)
+    der_lambda = calc_der_lambda(m_init_abs, eta, d, k=branch_pit[:, K],
+                                 friction_model=options["friction_model"],
+                                 lambda_pipe=branch_pit[:, LAMBDA], area=area)
+    der_lambda_eta = -np.divide(m_init_abs, eta) * der_lambda
+    der_eta = get_temperature_derivative(fluid.get_viscosity, t_m)
+    length_term = np.divide(length, d, out=np.zeros_like(length), where=generic)
+
+    der_t_from = np.zeros(len(branch_pit))
+    der_t_to = np.zeros(len(branch_pit))
+    if fluid.is_gas:
+        from pandapipes.pf.derivative_toolbox import calc_medium_pressure_with_derivative_np
+        p_from = node_pit[from_nodes, PINIT] + node_pit[from_nodes, PAMB]
+        p_to = node_pit[to_nodes, PINIT] + node_pit[to_nodes, PAMB]
+        comp_fact = fluid.get_compressibility(calc_medium_pressure_with_derivative_np(p_from,
+                                                                                      p_to)[0])
+        rho_n = fluid.get_density(NORMAL_TEMPERATURE)
+        # the pressure loss term is proportional to the mean of the temperature of the from node
+        # (not in flow direction) and the outlet temperature
+        loss_term = np.divide(NORMAL_PRESSURE * comp_fact * m_init2,
+                              NORMAL_TEMPERATURE * P_CONVERSION * rho_n * area ** 2
+                              * (p_from + p_to))
+        t_m_loss = (node_pit[from_nodes, TINIT_NODE] + t_out) / 2
+        der_t_m_loss = -loss_term * (branch_pit[:, LAMBDA] * length_term + branch_pit[:, LC]) / 2
+        der_loss_eta = -loss_term * t_m_loss * length_term * der_lambda_eta
+        # the real density is the mean of the densities at the inlet and the outlet
+        # (c.f. get_branch_real_density), which are inversely proportional to the temperature
+        p_from_t = node_pit[from_nodes_t, PINIT] + node_pit[from_nodes_t, PAMB]
+        p_to_t = node_pit[to_nodes, PINIT] + node_pit[to_nodes, PAMB]
+        rho_factor = rho_n * NORMAL_TEMPERATURE / NORMAL_PRESSURE
+        der_rho_from = -rho_factor * p_from_t / (fluid.get_compressibility(p_from_t)
+                                                 * t_from ** 2) / 2
+        der_rho_out = -rho_factor * p_to_t / (fluid.get_compressibility(p_to_t) * t_out ** 2) / 2
+        positive = m_init >= 0
+        der_t_from[positive] = der_t_m_loss[positive]
+        der_t_to[~positive] = der_t_m_loss[~positive]
+        der_t_out = der_t_m_loss
+    else:
+        rho_n = fluid.get_density(NORMAL_TEMPERATURE)
+        der_loss_eta = -np.divide(m_init2 * length_term * der_lambda_eta,
+                                  area ** 2 * rho_n * P_CONVERSION * 2)
+        der_rho_from = get_temperature_derivative(fluid.get_density, t_from) / 2
+        der_rho_out = get_temperature_derivative(fluid.get_density, t_out) / 2
+        der_t_out = np.zeros(len(branch_pit))
+
+    der_t_from += height_term * der_rho_from + der_loss_eta * der_eta / 2
+    der_t_out = der_t_out + height_term * der_rho_out + der_loss_eta * der_eta / 2
+    branch_pit[:, JAC_DERIV_DT_H] = np.where(generic, der_t_from, 0)
+    branch_pit[:, JAC_DERIV_DT1_H] = np.where(generic, der_t_to, 0)
+    branch_pit[:, JAC_DERIV_DTOUT_H] = np.where(generic, der_t_out, 0)
+
+
+def get_temperature_derivative(property_function, temperature):
+    """
+    Calculates the derivative of a fluid property by the temperature as central difference.
+
+    :param property_function: function that returns the property at given temperatures, e.g. \
+        fluid.get_density
+    :type property_function: callable
+    :param temperature: The temperatures at which the derivative is calculated
+    :type temperature: np.ndarray
+    :return: the derivatives
+    :rtype: np.ndarray
+    """
+    step = 1e-3
+    return (np.asarray(property_function(temperature + step), dtype=np.float64)
+            - np.asarray(property_function(temperature - step), dtype=np.float64)) / (2 * step)
 
 
 def get_derived_values(node_pit, from_nodes, to_nodes, use_numba):
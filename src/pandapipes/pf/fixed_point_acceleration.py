@@ -0,0 +1,104 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+from numpy import linalg
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+AITKEN_RELAXATION_BOUNDS = (0.1, 2.)
+# the plain iteration is not accelerated as long as it reduces the residual by this factor
+PLAIN_CONTRACTION = 0.9
+
+
+def accelerate_fixed_point(state, x, g, weights, method="anderson", memory=3):
+    """
+    Determines the next iterate of a fixed-point iteration x = G(x) from the current iterate x \
+    and its image g = G(x).
+
+        - "anderson": Anderson acceleration (type II) with the last **memory** differences of \
+          the residuals f = G(x) - x. The coefficients gamma minimize the weighted residual \
+          ||f_k - dF * gamma|| and the next iterate is x_k+1 = g_k - dG * gamma.
+        - "aitken": Aitken's dynamic relaxation x_k+1 = x_k + omega_k * f_k with \
+          omega_k = -omega_k-1 * (f_k-1 * (f_k - f_k-1)) / ||f_k - f_k-1||^2, limited to \
+          :data:`AITKEN_RELAXATION_BOUNDS`.
+
+    The acceleration is safeguarded by the weighted residual norm ||G(x) - x||. As long as the \
+    plain iteration reduces it at least by the factor :data:`PLAIN_CONTRACTION`, the plain step \
+    g is taken (the history is still recorded), as the alternating Newton steps converge \
+    superlinearly close to the solution. The acceleration is only applied if the plain \
+    iteration stagnates or oscillates. If an accelerated iterate does not decrease the residual \
+    compared to the previous iterate, it is rejected: the history is discarded and the plain \
+    step G(x) of the previous iterate is returned instead. Entries that are not finite (e.g. of \
+    inactive elements) are not accelerated. If the accelerated iterate is not finite, the \
+    history is discarded and g is returned.
+
+    :param state: The history of the iteration, an empty dictionary in the first iteration
+    :type state: dict
+    :param x: The current iterate
+    :type x: np.array
+    :param g: The image G(x) of the current iterate
+    :type g: np.array
+    :param weights: The weights of the entries in the residual norm (e.g. the inverse tolerances)
+    :type weights: np.array
+    :param method: "anderson" or "aitken"
+    :type method: str, default "anderson"
+    :param memory: The number of residual differences considered by the Anderson acceleration
+    :type memory: int, default 3
+    :return: x_next - The next iterate
+    :rtype: np.array
+    """
+    valid = np.isfinite(x) & np.isfinite(g)
+    residual = np.where(valid, g - x, 0.) * weights
+    image = np.where(valid, g, 0.)
+    residual_norm = linalg.norm(residual)
+    last_norm = state.get("residual_norm", np.inf)
+    if state.get("accelerated", False) and residual_norm >= last_norm:
+        logger.debug("The accelerated iterate did not decrease the residual, it is rejected and "
+                     "the history is discarded.")
+        plain_image = state["plain_image"]
+        state.clear()
+        state["residual_norm"], state["accelerated"] = last_norm, False
+        return plain_image
+    state["residual_norm"], state["accelerated"], state["plain_image"] = residual_norm, False, g
+    plain = residual_norm <= PLAIN_CONTRACTION * last_norm
+    if method == "anderson":
+        residuals = state.setdefault("residuals", [])
+        images = state.setdefault("images", [])
+        residuals.append(residual)
+        images.append(image)
+        del residuals[:-memory - 1], images[:-memory - 1]
+        if plain or len(residuals) < 2:
+            return g
+        d_residuals = np.diff(np.array(residuals).T, axis=1)
+        d_images = np.diff(np.array(images).T, axis=1)
+        gamma = linalg.lstsq(d_residuals, residual, rcond=None)[0]
+        x_next = image - d_images @ gamma
+    elif method == "aitken":
+        omega = 1.
+        if "residual" in state and not plain:
+            d_residual = residual - state["residual"]
+            denominator = d_residual.dot(d_residual)
+            if denominator > 0:
+                omega = np.clip(-state["omega"] * state["residual"].dot(d_residual)
+                                / denominator, *AITKEN_RELAXATION_BOUNDS)
+        state["residual"], state["omega"] = residual, omega
+        if plain:
+            return g
+        x_next = np.where(valid, x, 0.) + omega * residual / weights
+    else:
+        raise UserWarning("The fixed-point acceleration %s is not available. Please choose one "
+                          "of 'none', 'anderson' or 'aitken'." % method)
+    if not np.all(np.isfinite(x_next)):
+        logger.debug("The accelerated iterate is not finite, the history is discarded.")
+        state.clear()
+        state["residual_norm"], state["accelerated"] = residual_norm, False
+        return g
+    state["accelerated"] = True
+    return np.where(valid, x_next, g)
@@ -0,0 +1,160 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+from collections import deque
+
+import numpy as np
+
+# the local searches are aborted (and a full connectivity search has to be performed) if they
+# visit more than this share of all nodes (but at least LOCAL_SEARCH_MIN_NODES nodes), as each
+# visited node is about 100 times as expensive as in the vectorized full search
+LOCAL_SEARCH_SHARE = 0.01
+LOCAL_SEARCH_MIN_NODES = 100
+
+
+def create_adjacency(from_nodes, to_nodes, len_nodes):
+    """
+    Creates the adjacency of all branches (regardless of whether they are active) in compressed \
+    form: the neighbours and the connecting branches of node n are \
+    neighbours[indptr[n]:indptr[n + 1]] and branches[indptr[n]:indptr[n + 1]].
+
+    :param from_nodes: The from nodes of all branches
+    :type from_nodes: np.array
+    :param to_nodes: The to nodes of all branches
+    :type to_nodes: np.array
+    :param len_nodes: The number of nodes
+    :type len_nodes: int
+    :return: (indptr, neighbours, branches) - The adjacency of all nodes
+    :rtype: tuple(np.array)
+    """
+    nodes = np.concatenate([from_nodes, to_nodes])
+    order = np.argsort(nodes, kind="stable")
+    neighbours = np.concatenate([to_nodes, from_nodes])[order]
+    branches = np.tile(np.arange(len(from_nodes)), 2)[order]
+    indptr = np.zeros(len_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(nodes, minlength=len_nodes), out=indptr[1:])
+    return indptr, neighbours, branches
+
+
+def _active_neighbours(adjacency, active_branches, node):
+    indptr, neighbours, branches = adjacency
+    f, t = indptr[node], indptr[node + 1]
+    return neighbours[f:t][active_branches[branches[f:t]]]
+
+
+def _attach(adjacency, active_branches, nodes_connected, start, max_visited):
+    # all nodes that are reachable from the start node are connected now; they have not been
+    # connected before, as the component of the start node was not supplied
+    nodes_connected[start] = True
+    queue = deque([start])
+    n_visited = 1
+    while queue:
+        for neighbour in _active_neighbours(adjacency, active_branches, queue.popleft()):
+            if not nodes_connected[neighbour]:
+                nodes_connected[neighbour] = True
+                queue.append(neighbour)
+                n_visited += 1
+                if n_visited > max_visited:
+                    return None
+    return n_visited
+
+
+def _detach(adjacency, active_branches, nodes_connected, slack_mask, from_node, to_node,
+            max_visited):
+    # two searches start at both ends of the removed branch and are expanded alternately; if they
+    # meet, the component is unchanged; if one of them is exhausted without a slack, its nodes
+    # are not supplied anymore; if both of them reach a slack, both parts are still supplied
+    visited = [{from_node}, {to_node}]
+    queues = [deque([from_node]), deque([to_node])]
+    supplied = [bool(slack_mask[from_node]), bool(slack_mask[to_node])]
+    n_visited = 2
+    side = 0
+    while not (supplied[0] and supplied[1]):
+        if not queues[side]:
+            if not supplied[side]:
+                nodes_connected[list(visited[side])] = False
+                return n_visited
+            # this part is supplied, the other part is searched until a slack or its end is found
+            side = 1 - side
+            if not queues[side]:
+                nodes_connected[list(visited[side])] = False
+                return n_visited
+            continue
+        node = queues[side].popleft()
+        for neighbour in _active_neighbours(adjacency, active_branches, node):
+            if neighbour in visited[1 - side]:
+                return n_visited
+            if neighbour in visited[side]:
+                continue
+            visited[side].add(neighbour)
+            queues[side].append(neighbour)
+            supplied[side] |= bool(slack_mask[neighbour])
+            n_visited += 1
+            if n_visited > max_visited:
+                return None
+        if not supplied[1 - side]:
+            side = 1 - side
+    return n_visited
+
+
+def update_connectivity(adjacency, nodes_connected, old_active_branches, active_branches,
+                        from_nodes, to_nodes, slack_mask):
+    """
+    Updates the nodes that are reachable from the slack nodes after some branches were switched \
+    (e.g. by closing or opening valves or by setting pipes out of service), based on the \
+    reachable nodes before the switching. The changes are applied one after another:
+
+      - If a branch is activated that connects a supplied and an unsupplied node, the nodes \
+        that are reachable from the unsupplied node are attached. Only nodes that change their \
+        state are visited.
+      - If a branch between supplied nodes is deactivated, two local searches start at its end \
+        nodes. The connectivity is unchanged as soon as they meet or both reach a slack node. If \
+        one of them ends without reaching a slack node, the visited nodes are detached.
+
+    Only the graph search is local: the callers still evaluate the result for all nodes and \
+    branches (c.f. :func:`pandapipes.pf.pipeflow_setup.cached_connectivity_search`), so that the \
+    complete connectivity check remains linear in the size of the network.
+
+    :param adjacency: The adjacency of all branches (c.f. :func:`create_adjacency`)
+    :type adjacency: tuple(np.array)
+    :param nodes_connected: Mask of the nodes that were reachable with the old active branches
+    :type nodes_connected: np.array
+    :param old_active_branches: Mask of the previously active branches
+    :type old_active_branches: np.array
+    :param active_branches: Mask of the active branches
+    :type active_branches: np.array
+    :param from_nodes: The from nodes of all branches
+    :type from_nodes: np.array
+    :param to_nodes: The to nodes of all branches
+    :type to_nodes: np.array
+    :param slack_mask: Mask of the slack nodes
+    :type slack_mask: np.array
+    :return: (nodes_connected, n_visited) - Mask of the reachable nodes, None if the local \
+        searches visited too many nodes (c.f. LOCAL_SEARCH_SHARE), so that a full search should \
+        be performed instead, and the number of visited nodes
+    :rtype: tuple
+    """
+    nodes_connected = np.copy(nodes_connected)
+    current_active = np.copy(old_active_branches)
+    changed = np.flatnonzero(old_active_branches != active_branches)
+    max_visited = max(LOCAL_SEARCH_SHARE * len(nodes_connected), LOCAL_SEARCH_MIN_NODES)
+    n_visited = 0
+    # the deactivations are applied before the activations
+    for branch in changed[np.argsort(active_branches[changed], kind="stable")]:
+        current_active[branch] = active_branches[branch]
+        fn, tn = from_nodes[branch], to_nodes[branch]
+        if active_branches[branch]:
+            if nodes_connected[fn] == nodes_connected[tn]:
+                continue
+            visited = _attach(adjacency, current_active, nodes_connected,
+                              tn if nodes_connected[fn] else fn, max_visited - n_visited)
+        elif nodes_connected[fn] and fn != tn:
+            visited = _detach(adjacency, current_active, nodes_connected, slack_mask, fn, tn,
+                              max_visited - n_visited)
+        else:
+            continue
+        if visited is None:
+            return None, max_visited
+        n_visited += visited
+    return nodes_connected, n_visited
@@ -0,0 +1,217 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import hashlib
+
+import numpy as np
+from pandas.util import hash_pandas_object
+
+from pandapipes.component_models.abstract_models.const_flow_models import ConstFlow
+from pandapipes.component_models.ext_grid_component import ExtGrid
+from pandapipes.component_models.pressure_control_component import PressureControlComponent
+from pandapipes.idx_node import LOAD, PINIT, EXT_GRID_OCCURENCE
+from pandapipes.pf.internals_toolbox import _sum_by_index
+from pandapipes.pf.pipeflow_setup import get_lookup, get_net_option
+from pandapipes.properties.fluids import get_fluid
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+
+def update_pit_loads(net, comp, node_pit, old_values, new_values):
+    """
+    Adds the change of the mass flows of a constant flow component (e.g. sinks and sources) to \
+    the loads of the connected nodes.
+    """
+    tbl = net[comp.table_name()]
+    factor = tbl.in_service.values * tbl.scaling.values * comp.sign()
+    deltas = (np.nan_to_num(new_values) - np.nan_to_num(old_values)) * factor
+    nodes = get_lookup(net, "node", "index")[comp.get_connected_node_type().table_name()][
+        tbl.junction.values]
+    node_pit[:, LOAD] += _sum_by_index(nodes, deltas, len(node_pit))
+
+
+def update_pit_slack_pressures(net, comp, node_pit, old_values, new_values):
+    """
+    Adds the change of the pressures of external grids of type "p" or "pt" to the pressure of \
+    the connected nodes, which is the mean of all fixed pressures at a node.
+    """
+    tbl = net[comp.table_name()]
+    mask = tbl[comp.active_identifier()].values.astype(bool) \
+        & np.isin(tbl.type.values, ["p", "pt"])
+    nodes = get_lookup(net, "node", "index")[comp.get_connected_node_type().table_name()][
+        tbl.junction.values[mask]]
+    deltas = _sum_by_index(nodes, new_values[mask] - old_values[mask], len(node_pit))
+    node_pit[:, PINIT] += deltas / np.maximum(node_pit[:, EXT_GRID_OCCURENCE], 1)
+
+
+def update_pit_controlled_pressures(net, comp, node_pit, old_values, new_values):
+    """
+    Sets the pressure of the nodes that are controlled by active pressure controllers.
+    """
+    tbl = net[comp.table_name()]
+    controlled = tbl.in_service.values & tbl.control_active.values
+    nodes = get_lookup(net, "node", "index")[comp.get_connected_node_type().table_name()][
+        tbl.controlled_junction.values[controlled]]
+    node_pit[nodes, PINIT] = new_values[controlled]
+
+
+# the columns of the component tables (besides the node references, i.e. all columns ending with
+# "junction") that determine the structure of the pit and the connectivity
+STRUCTURE_COLUMNS = ["in_service", "opened", "control_active", "type"]
+
+# the columns of the component tables that can be changed without rebuilding the pit, with the
+# functions that update the node pit accordingly
+SETPOINT_COLUMNS = {
+    ConstFlow: {"mdot_kg_per_s": update_pit_loads},
+    ExtGrid: {"p_bar": update_pit_slack_pressures},
+    PressureControlComponent: {"controlled_p_bar": update_pit_controlled_pressures}
+}
+
+
+def register_setpoint_column(component, column, update_function):
+    """
+    Registers a column of a component table that can be changed between two pipeflows without \
+    rebuilding the pit (c.f. :func:`initialize_pit_incrementally`).
+
+    :param component: The component (or base class of the components) with the column
+    :type component: type
+    :param column: The name of the column
+    :type column: str
+    :param update_function: Function that updates the node pit for the changed column, called \
+        with the net, the component, the node pit and the old and new values of the column
+    :type update_function: callable
+    :return: No output
+    """
+    SETPOINT_COLUMNS.setdefault(component, dict())[column] = update_function
+
+
+def get_setpoint_update_functions(comp):
+    update_functions = dict()
+    for component, columns in SETPOINT_COLUMNS.items():
+        if issubclass(comp, component):
+            update_functions.update(columns)
+    return update_functions
+
+
+def _comparable_options(net):
+    # the callbacks and the flag of converged hydraulic results do not affect the pit
+    return {key: value for key, value in net["_options"].items()
+            if key not in ["callbacks", "hyd_flag"]}
+
+
+def get_structure_fingerprint(net):
+    """
+    Returns a hash of the columns of all component tables that determine the structure of the \
+    pit and the connectivity: the indices, the node references (all columns ending with \
+    "junction") and the columns in :data:`STRUCTURE_COLUMNS` (e.g. in_service and opened).
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :return: fingerprint - The hash of the structure
+    :rtype: bytes
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    for comp in net["component_list"]:
+        tbl = net[comp.table_name()]
+        columns = [col for col in tbl.columns
+                   if col.endswith("junction") or col in STRUCTURE_COLUMNS]
+        fingerprint.update(repr((comp.table_name(), len(tbl), columns)).encode())
+        fingerprint.update(hash_pandas_object(tbl[columns], index=True).values.tobytes())
+    return fingerprint.digest()
+
+
+def _setpoint_values(net):
+    return {(comp.table_name(), column): net[comp.table_name()][column].values.astype(np.float64)
+            for comp in net["component_list"]
+            for column in get_setpoint_update_functions(comp)
+            if column in net[comp.table_name()]}
+
+
+def invalidate_pit_structure(net):
+    """
+    Removes the structure stored by the last pipeflow with the option **incremental_pit_update** \
+    (c.f. :func:`store_pit_structure`), so that the next pipeflow creates the pit from scratch. \
+    This function has to be called after changing parameters of the components that are \
+    neither set points nor structural columns (e.g. pipe lengths or diameters, c.f. \
+    :func:`initialize_pit_incrementally`).
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :return: No output
+    """
+    net.pop("_pit_structure", None)
+
+
+def store_pit_structure(net):
+    """
+    Stores the initial pit, the lookups including the hydraulic connectivity, a hash of the \
+    structural columns (c.f. :func:`get_structure_fingerprint`) and the values of the set point \
+    columns (c.f. :data:`SETPOINT_COLUMNS`) in net["_pit_structure"], if the option \
+    **incremental_pit_update** is set. Otherwise, a stored structure is removed. The component \
+    tables are not copied.
+
+    :param net: The pandapipes net with the initialized pit and the hydraulic connectivity
+    :type net: pandapipesNet
+    :return: No output
+    """
+    if not get_net_option(net, "incremental_pit_update"):
+        invalidate_pit_structure(net)
+        return
+    net["_pit_structure"] = {
+        "fingerprint": get_structure_fingerprint(net), "setpoints": _setpoint_values(net),
+        "options": _comparable_options(net), "fluid": get_fluid(net),
+        "pit": {"node": net["_pit"]["node"].copy(), "branch": net["_pit"]["branch"].copy(),
+                "components": {name: array.copy()
+                               for name, array in net["_pit"].get("components", dict()).items()}},
+        "lookups": dict(net["_lookups"]), "updates": 0}
+
+
+def initialize_pit_incrementally(net):
+    """
+    Initializes the lookups and the pit from the structure of the last pipeflow (c.f. \
+    :func:`store_pit_structure`) if the options, the fluid and the structural columns of the \
+    component tables (c.f. :func:`get_structure_fingerprint`) did not change. The set point \
+    columns (c.f. :data:`SETPOINT_COLUMNS`, e.g. the mass flows of sinks and sources or the \
+    pressures of external grids and pressure controllers) are compared with the values of the \
+    last pipeflow and only the columns of the node pit that are affected by changed set points \
+    are updated, the lookups and the hydraulic connectivity are reused. Otherwise, nothing is \
+    done and the pit has to be created from scratch. Changes of other parameters (e.g. pipe \
+    lengths) are not detected and have to be signalled by :func:`invalidate_pit_structure`.
+
+    :param net: The pandapipes net for which the options are initialized
+    :type net: pandapipesNet
+    :return: updated - True if the pit was initialized from the stored structure
+    :rtype: bool
+    """
+    structure = net.get("_pit_structure", None)
+    if not get_net_option(net, "incremental_pit_update") or structure is None:
+        return False
+    if structure["options"] != _comparable_options(net) or structure["fluid"] is not get_fluid(net) \
+            or structure["fingerprint"] != get_structure_fingerprint(net):
+        return False
+    setpoints = _setpoint_values(net)
+    if setpoints.keys() != structure["setpoints"].keys():
+        return False
+
+    pit = structure["pit"]
+    net["_lookups"] = dict(structure["lookups"])
+    components = {comp.table_name(): comp for comp in net["component_list"]}
+    for (element, column), new_values in setpoints.items():
+        old_values = structure["setpoints"][element, column]
+        if np.array_equal(old_values, new_values, equal_nan=True):
+            continue
+        comp = components[element]
+        update_function = get_setpoint_update_functions(comp)[column]
+        update_function(net, comp, pit["node"], old_values, new_values)
+    structure["setpoints"] = setpoints
+    net["_pit"] = {"node": pit["node"].copy(), "branch": pit["branch"].copy(),
+                   "components": {name: array.copy()
+                                  for name, array in pit["components"].items()}}
+    structure["updates"] += 1
+    return True
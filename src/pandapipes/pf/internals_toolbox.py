@@ -74,6 +74,25 @@ def _sum_by_group_np(indices, *values):
     return _sum_by_group_sorted(indices, *val)
 
 
+def _sum_by_index(indices, values, length):
+    """
+    Auxiliary function to sum up values by some given indices (both as numpy arrays) with \
+    np.bincount. In contrast to :func:`_sum_by_group`, the indices are not sorted, and the sums \
+    are returned for all indices from 0 to length - 1 (0 for indices that do not appear), so \
+    that they can be addressed directly, e.g. by node index.
+
+    :param indices: non-negative integer indices of the values
+    :type indices: np.array
+    :param values: values to be summed up
+    :type values: np.array
+    :param length: number of possible indices
+    :type length: int
+    :return: sums - the sum of the values for every index
+    :rtype: np.array
+    """
+    return np.bincount(indices, weights=np.asarray(values, dtype=np.float64), minlength=length)
+
+
 def _sum_by_group(use_numba, indices, *values):
     """
     Auxiliary function to sum up values by some given indices (both as numpy arrays).
@@ -0,0 +1,1095 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+from time import perf_counter
+
+import numpy as np
+from numpy import linalg
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import csr_matrix, csc_matrix, diags, csgraph
+from scipy.sparse.linalg import spsolve, splu, spilu, gmres, bicgstab, LinearOperator
+
+from pandapipes.idx_branch import FROM_NODE, TO_NODE, TO_NODE_T
+from pandapipes.idx_node import NODE_TYPE, P, NODE_TYPE_T, T
+from pandapipes.pf.pipeflow_setup import get_net_option, get_net_options, write_internal_results
+
+try:
+    from scikits import umfpack
+
+    umfpack_installed = True
+except ImportError:
+    umfpack_installed = False
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+
+def solve_newton_step(net, system_matrix, load_vector, system_name, len_n=None,
+                      formulation="full"):
+    """
+    Solves the linearized system of equations of one Newton step. Depending on the option \
+    **jacobian_update**, the system matrix is factorized in every iteration ("always"), only every \
+    **jacobian_update_interval** iterations ("chord") or the last factorization is corrected by \
+    rank-one updates ("broyden", c.f. :func:`solve_quasi_newton`). The factorization itself is \
+    performed with the backend selected by the option **linear_solver** (c.f. \
+    :data:`LINEAR_SOLVER_BACKENDS`), either for the full system or for its Schur complement \
+    (c.f. :func:`factorize_schur_complement`).
+
+    The time needed for factorization and solution (accumulated over all iterations), the number \
+    of factorizations and the fill-in of the last factorization (number of non-zeros in the \
+    (incomplete) factors divided by the number of non-zeros of the system matrix) are written to \
+    the internal results as "linear_solver_time_<system_name>", \
+    "jacobian_factorizations_<system_name>" and "linear_solver_fill_in_<system_name>". If a \
+    backend does not provide its factors, the fill-in is NaN.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param load_vector: The right hand side (residual) of the system
+    :type load_vector: numpy.ndarray
+    :param system_name: Name of the system (e.g. "hydraulics" or "heat_transfer") under which \
+        the factorization and the solver statistics are stored
+    :type system_name: str
+    :param len_n: The number of node unknowns (the first len_n entries of the solution vector), \
+        only required for the Schur complement formulation
+    :type len_n: int, default None
+    :param formulation: "full" to factorize the whole system, "schur" to factorize the Schur \
+        complement with respect to the node unknowns, "radial" to solve the system of a radial \
+        network by tree sweeps, "loop" to solve for the loop flow corrections of a meshed network, \
+        "upwind" to solve the heat transfer system by a sweep in flow direction, "krylov" to \
+        solve the hydraulic system matrix-free with GMRES (the system matrix is a \
+        :class:`pandapipes.pf.build_system_matrix.HydraulicJacobianOperator` then and the \
+        option **jacobian_update** is not considered)
+    :type formulation: str, default "full"
+    :return: x - The solution of the linear system
+    :rtype: numpy.ndarray
+    """
+    if "_internal_data" not in net:
+        net["_internal_data"] = dict()
+    start = perf_counter()
+    jacobian_update = get_net_option(net, "jacobian_update")
+    if jacobian_update == "always" or formulation == "krylov":
+        x = factorize_newton_system(net, system_matrix, system_name, len_n,
+                                    formulation)(load_vector)
+        factorized = True
+    elif jacobian_update in ["chord", "broyden"]:
+        x, factorized = solve_quasi_newton(net, system_matrix, load_vector, system_name, len_n,
+                                           formulation, jacobian_update == "broyden")
+    else:
+        raise UserWarning("The jacobian update policy %s is not available. Please choose one of "
+                          "'always', 'chord' or 'broyden'." % jacobian_update)
+    duration = perf_counter() - start
+
+    time_key = "linear_solver_time_%s" % system_name
+    factorization_key = "jacobian_factorizations_%s" % system_name
+    internal_results = net.get("_internal_results", dict())
+    write_internal_results(net, **{
+        time_key: internal_results.get(time_key, 0.) + duration,
+        factorization_key: internal_results.get(factorization_key, 0) + int(factorized)})
+    return x
+
+
+def solve_quasi_newton(net, system_matrix, load_vector, system_name, len_n, formulation,
+                       broyden):
+    """
+    Solves the Newton system with a factorization of an earlier jacobian. The factorization is \
+    renewed if
+
+        - no factorization is available or the sparsity pattern of the system matrix changed,
+        - the factorization was used for **jacobian_update_interval** iterations,
+        - the residual stagnates, i.e. its norm is larger than **jacobian_stagnation_ratio** \
+          times the norm of the previous residual.
+
+    Otherwise, the old factorization is used as it is (chord method) or, if broyden is True, \
+    corrected by Broyden's rank-one update B+ = B + ((1 - s) * b - b+) * x^T / (x^T * x) with \
+    the last applied step x, its step length s (c.f. :func:`scale_quasi_newton_step`), the \
+    residual b before and the residual b+ after the step, which is applied to the factorization \
+    via the Sherman-Morrison formula. As the jacobian of the current iteration is passed anyway, \
+    a renewal never requires an additional assembly of the system.
+
+    The state of the quasi-Newton method is stored in net["_internal_data"], so that the last \
+    factorization is kept for repeated pipeflow calls (e.g. in time series) if the option \
+    **reuse_internal_data** is set.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the current iteration
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param load_vector: The right hand side (residual) of the system
+    :type load_vector: numpy.ndarray
+    :param system_name: Name of the system under which the state is stored
+    :type system_name: str
+    :param len_n: The number of node unknowns
+    :type len_n: int
+    :param formulation: The formulation of the system ("full", "schur", "radial", "loop" or \
+        "upwind")
+    :type formulation: str
+    :param broyden: If True, Broyden updates are applied, otherwise the chord method is used
+    :type broyden: bool
+    :return: x - The solution of the linear system, factorized - True if a new factorization \
+        was computed
+    :rtype: numpy.ndarray, bool
+    """
+    interval, stagnation_ratio, alpha = get_net_options(
+        net, "jacobian_update_interval", "jacobian_stagnation_ratio", "alpha")
+    state_key = "jacobian_update_" + system_name
+    state = net["_internal_data"].get(state_key, None)
+    residual_norm = linalg.norm(load_vector)
+
+    refresh = state is None or state["age"] >= interval \
+        or state["formulation"] != formulation or state["shape"] != system_matrix.shape \
+        or not np.array_equal(state["indptr"], system_matrix.indptr) \
+        or not np.array_equal(state["indices"], system_matrix.indices) \
+        or (state["residual_norm"] is not None
+            and residual_norm > stagnation_ratio * state["residual_norm"])
+
+    if refresh:
+        state = {"solve": factorize_newton_system(net, system_matrix, system_name, len_n,
+                                                  formulation),
+                 "formulation": formulation, "shape": system_matrix.shape,
+                 "indptr": system_matrix.indptr.copy(), "indices": system_matrix.indices.copy(),
+                 "age": 0, "updates": []}
+        net["_internal_data"][state_key] = state
+    elif broyden and state["step"] is not None:
+        step = state["step"]
+        secant = -load_vector if state["residual_rest"] is None \
+            else state["residual_rest"] - load_vector
+        u = secant / step.dot(step)
+        w = _apply_inverse(state, u)
+        denominator = 1. + step.dot(w)
+        if abs(denominator) > 1e-12:
+            state["updates"].append((w, step, denominator))
+
+    x = _apply_inverse(state, load_vector)
+    state["age"] += 1
+    # the secant condition only holds if the step is applied to all unknowns with the same step
+    # length, which the line search reports back via scale_quasi_newton_step
+    line_search = get_net_option(net, "nonlinear_method") == "linesearch"
+    state["step"] = x.copy() if alpha == 1 or line_search else None
+    state["residual_rest"] = None
+    state["residual_norm"] = residual_norm
+    return x, refresh
+
+
+def scale_quasi_newton_step(net, system_name, step_length, load_vector):
+    """
+    Scales the step stored for the Broyden update to the step length that was actually applied \
+    (e.g. by the line search) and stores the part (1 - step_length) * b of the residual b before \
+    the step that the step did not eliminate, so that the next rank-one update uses the secant \
+    pair of the applied step.
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :param system_name: Name of the system under which the state is stored
+    :type system_name: str
+    :param step_length: The step length that was applied to the unknowns
+    :type step_length: float
+    :param load_vector: The residual before the step
+    :type load_vector: numpy.ndarray
+    :return: No output
+    """
+    state = net.get("_internal_data", dict()).get("jacobian_update_" + system_name, None)
+    if state is None or state.get("step") is None or step_length == 1:
+        return
+    state["step"] = state["step"] * step_length
+    state["residual_rest"] = (1. - step_length) * load_vector
+
+
+def reset_quasi_newton(net):
+    """
+    Discards the iteration history of the quasi-Newton methods (last step and residual), so that \
+    a new Newton-Raphson loop does not use secant information of a previous calculation. The \
+    factorizations themselves are kept.
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :return: No output
+    """
+    for key, state in net.get("_internal_data", dict()).items():
+        if key.startswith("jacobian_update_"):
+            state["step"] = None
+            state["residual_rest"] = None
+            state["residual_norm"] = None
+
+
+def _apply_inverse(state, load_vector):
+    x = state["solve"](load_vector)
+    for w, v, denominator in state["updates"]:
+        x = x - w * (v.dot(x) / denominator)
+    return x
+
+
+def factorize_newton_system(net, system_matrix, system_name, len_n=None, formulation="full"):
+    """
+    Factorizes the system matrix in the given formulation.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param system_name: Name of the system
+    :type system_name: str
+    :param len_n: The number of node unknowns, only required for the Schur complement
+    :type len_n: int, default None
+    :param formulation: The formulation of the system ("full", "schur", "radial", "loop", \
+        "upwind" or "krylov")
+    :type formulation: str, default "full"
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    if formulation == "schur":
+        return factorize_schur_complement(net, system_matrix, len_n, system_name)
+    if formulation == "radial":
+        return factorize_radial(net, system_matrix, len_n, system_name)
+    if formulation == "loop":
+        return factorize_loop_flows(net, system_matrix, len_n, system_name)
+    if formulation == "upwind":
+        return factorize_upwind(net, system_matrix, len_n, system_name)
+    if formulation == "krylov":
+        return factorize_newton_krylov(net, system_matrix, system_name)
+    return factorize_linear_system(net, system_matrix, system_name)
+
+
+def solve_linear_system(net, system_matrix, load_vector, system_name):
+    """
+    Solves the linear system once with the backend selected by the option **linear_solver**.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The system matrix
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param load_vector: The right hand side of the system
+    :type load_vector: numpy.ndarray
+    :param system_name: Name of the system
+    :type system_name: str
+    :return: x - The solution of the linear system
+    :rtype: numpy.ndarray
+    """
+    return factorize_linear_system(net, system_matrix, system_name)(load_vector)
+
+
+def factorize_linear_system(net, system_matrix, system_name):
+    """
+    Factorizes the system matrix with the backend selected by the option **linear_solver** and \
+    writes the fill-in of the factorization to the internal results as \
+    "linear_solver_fill_in_<system_name>".
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The system matrix
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param system_name: Name of the system under which the factorization structure is cached
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    solver_name = get_net_option(net, "linear_solver")
+    if solver_name not in LINEAR_SOLVER_BACKENDS:
+        raise UserWarning("The linear solver %s is not available. Please choose one of %s."
+                          % (solver_name, sorted(LINEAR_SOLVER_BACKENDS.keys())))
+    solve, fill_in = LINEAR_SOLVER_BACKENDS[solver_name](net, system_matrix, system_name)
+    write_internal_results(net, **{"linear_solver_fill_in_%s" % system_name: fill_in})
+    return solve
+
+
+def factorize_schur_complement(net, system_matrix, len_n, system_name):
+    """
+    Factorizes the linearized system of equations by eliminating all branch unknowns whose rows \
+    only couple the branch variable itself to node variables (e.g. the mass flow of a pipe to the \
+    pressures at its from and to node). The rows and columns of the system are split into the \
+    kept unknowns K (all nodes and the remaining branches) and the eliminated unknowns E, whose \
+    block D = J_EE is diagonal. Only the Schur complement (J_KK - J_KE * D^-1 * J_EK) is \
+    factorized (with the backend given by the option **linear_solver**). For a right hand side b, \
+    the reduced system (J_KK - J_KE * D^-1 * J_EK) * x_K = b_K - J_KE * D^-1 * b_E is solved and \
+    the eliminated unknowns are recovered by back-substitution x_E = D^-1 * (b_E - J_EK * x_K). \
+    Branches with a (numerically) vanishing diagonal entry, e.g. pressure control components, \
+    are kept in the reduced system.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param len_n: The number of node unknowns (the first len_n entries of the solution vector)
+    :type len_n: int
+    :param system_name: Name of the system (e.g. "hydraulics"), the reduced system is stored \
+        under "<system_name>_schur"
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    system_matrix = csr_matrix(system_matrix)
+    if not system_matrix.has_canonical_format:
+        system_matrix = system_matrix.copy()
+        system_matrix.sum_duplicates()
+    len_full = system_matrix.shape[0]
+    diagonal = system_matrix.diagonal()
+
+    # only rows without entries in other branch columns can be eliminated, so that D is diagonal
+    rows = np.repeat(np.arange(len_full), np.diff(system_matrix.indptr))
+    branch_entries = np.bincount(rows[system_matrix.indices >= len_n], minlength=len_full)
+    abs_diagonal = np.abs(diagonal[len_n:])
+    tol = 1e-12 * abs_diagonal.max() if len(abs_diagonal) else 0.
+    eliminate = np.zeros(len_full, dtype=bool)
+    eliminate[len_n:] = (branch_entries[len_n:] == 1) & (abs_diagonal > tol)
+    if not np.any(eliminate):
+        return factorize_linear_system(net, system_matrix, system_name)
+    keep = ~eliminate
+
+    keep_rows = system_matrix[keep]
+    elim_rows = system_matrix[eliminate]
+    j_kk, j_ke = keep_rows[:, keep], keep_rows[:, eliminate]
+    j_ek = elim_rows[:, keep]
+    d_inv = 1. / diagonal[eliminate]
+
+    schur = csr_matrix(j_kk - j_ke @ diags(d_inv) @ j_ek)
+    solve_reduced = factorize_linear_system(net, schur, system_name + "_schur")
+
+    def solve(load_vector):
+        x = np.empty(len_full, dtype=np.float64)
+        x[keep] = solve_reduced(load_vector[keep] - j_ke @ (d_inv * load_vector[eliminate]))
+        x[eliminate] = d_inv * (load_vector[eliminate] - j_ek @ x[keep])
+        return x
+
+    return solve
+
+
+def factorize_radial(net, system_matrix, len_n, system_name):
+    """
+    Prepares the solution of the linearized hydraulic system of a radial network (a tree \
+    supplied by a single slack node) by a backward / forward sweep, which requires no \
+    factorization and has linear cost:
+
+        - backward sweep: starting at the leaves, the mass flow of the branch that connects a \
+          node to its parent node follows from the mass balance of the node, as the mass flows \
+          of all branches to its children are already known,
+        - forward sweep: starting at the slack node, the pressure of each child node follows \
+          from the equation of the branch that connects it to its parent node.
+
+    The tree (breadth first order from the slack node, parent branches and levels) only depends \
+    on the topology and is cached in net["_internal_data"] (c.f. :func:`get_spanning_tree`). If \
+    the active network is not radial or the system matrix contains entries that do not belong \
+    to the tree pattern (e.g. because of flow controlled branches), the system is factorized \
+    with the backend given by the option **linear_solver** instead.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the hydraulic system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param len_n: The number of node unknowns (the first len_n entries of the solution vector)
+    :type len_n: int
+    :param system_name: Name of the system under which the tree is cached
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    return _factorize_spanning_tree(net, system_matrix, len_n, system_name, False)
+
+
+def factorize_loop_flows(net, system_matrix, len_n, system_name):
+    """
+    Prepares the solution of the linearized hydraulic system of a (weakly) meshed network in \
+    terms of loop flow corrections. A spanning tree is built from the slack node, so that each \
+    branch that is not part of the tree (chord) closes one loop of the fundamental cycle basis. \
+    For given mass flow corrections of the chords, the corrections of all other unknowns follow \
+    from a backward / forward sweep along the tree (c.f. :func:`factorize_radial`), so that only \
+    the equations of the chords remain, which form a dense system with one unknown per loop:
+
+        (J_CC - J_CT * S(J_TC)) * x_C = b_C - J_CT * S(b)
+
+    with the chord rows and columns C, all other rows and columns T and the tree sweep S. The \
+    sweep of the chord columns S(J_TC) is computed once per Newton step (linear in the number \
+    of nodes and the number of loops), each solution only requires one sweep and the solution of \
+    the small loop system. If the active network does not have the required structure (single \
+    slack node, no pressure controlled nodes), the system is factorized with the backend given \
+    by the option **linear_solver** instead.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the hydraulic system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param len_n: The number of node unknowns (the first len_n entries of the solution vector)
+    :type len_n: int
+    :param system_name: Name of the system under which the spanning tree is cached
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    return _factorize_spanning_tree(net, system_matrix, len_n, system_name, True)
+
+
+def _factorize_spanning_tree(net, system_matrix, len_n, system_name, allow_loops):
+    tree = get_spanning_tree(net, len_n, system_name)
+    if tree is None or (len(tree["chords"]) and not allow_loops):
+        logger.debug("The %s system is not %s, it is solved with the linear solver %s."
+                     % (system_name, "connected to a single slack" if allow_loops else "radial",
+                        get_net_option(net, "linear_solver")))
+        return factorize_linear_system(net, system_matrix, system_name)
+    root, children, parents, levels = tree["root"], tree["children"], tree["parents"], \
+        tree["levels"]
+    system_matrix = csr_matrix(system_matrix)
+    len_full = system_matrix.shape[0]
+    branch_rows = tree["branches"] + len_n
+    chord_rows = tree["chords"] + len_n
+
+    # node rows: parent branch of the node itself and branches to its children
+    diag_node = _matrix_entries(system_matrix, children, branch_rows)
+    child_coeff = _matrix_entries(system_matrix, parents, branch_rows)
+    # branch rows: mass flow, pressure at the child node and at the parent node
+    diag_branch = _matrix_entries(system_matrix, branch_rows, branch_rows)
+    p_child = _matrix_entries(system_matrix, branch_rows, children)
+    p_parent = _matrix_entries(system_matrix, branch_rows, parents)
+    diag_root = system_matrix[root, root]
+
+    # apart from the chord rows and columns, the system must only contain the tree pattern
+    rows = np.concatenate([[root], children, parents, branch_rows, branch_rows, branch_rows])
+    cols = np.concatenate([[root], branch_rows, branch_rows, branch_rows, children, parents])
+    values = np.concatenate([[diag_root], diag_node, child_coeff, diag_branch, p_child,
+                             p_parent])
+    # the entries of the slack row besides the diagonal are not part of the tree pattern
+    not_root = np.concatenate([[True], rows[1:] != root])
+    pattern = csr_matrix((values[not_root], (rows[not_root], cols[not_root])),
+                         shape=system_matrix.shape)
+    tree_part = system_matrix
+    if len(chord_rows):
+        tree_mask = np.ones(len_full)
+        tree_mask[chord_rows] = 0.
+        tree_part = diags(tree_mask) @ system_matrix @ diags(tree_mask)
+    if (tree_part - pattern).count_nonzero() or diag_root == 0 \
+            or not np.all(diag_node) or not np.all(p_child):
+        logger.debug("The %s system does not have the structure required for the tree sweep, "
+                     "it is solved with the linear solver %s."
+                     % (system_name, get_net_option(net, "linear_solver")))
+        return factorize_linear_system(net, system_matrix, system_name)
+    write_internal_results(net, **{"linear_solver_fill_in_%s" % system_name: 1.})
+
+    def sweep(load_vector):
+        # works for a single right hand side and for several right hand sides (columns)
+        x = np.zeros((len_full,) + load_vector.shape[1:], dtype=np.float64)
+        flows = np.empty((len(children),) + load_vector.shape[1:], dtype=np.float64)
+        child_flows = np.zeros((len_n,) + load_vector.shape[1:], dtype=np.float64)
+        for start, end in reversed(levels):
+            lvl = slice(start, end)
+            flows[lvl] = ((load_vector[children[lvl]] - child_flows[children[lvl]]).T
+                          / diag_node[lvl]).T
+            np.add.at(child_flows, parents[lvl], (child_coeff[lvl] * flows[lvl].T).T)
+        x[branch_rows] = flows
+        x[root] = load_vector[root] / diag_root
+        for start, end in levels:
+            lvl = slice(start, end)
+            x[children[lvl]] = ((load_vector[branch_rows[lvl]].T - diag_branch[lvl] * flows[lvl].T
+                                 - p_parent[lvl] * x[parents[lvl]].T) / p_child[lvl]).T
+        return x
+
+    write_internal_results(net, **{"loops_%s" % system_name: len(chord_rows)})
+    if not len(chord_rows):
+        return sweep
+
+    chord_eqs = system_matrix[chord_rows]
+    chord_sweep = sweep(system_matrix[:, chord_rows].toarray())
+    loop_factor = lu_factor(chord_eqs[:, chord_rows].toarray() - chord_eqs @ chord_sweep)
+
+    def solve(load_vector):
+        x = sweep(load_vector)
+        x_chords = lu_solve(loop_factor, load_vector[chord_rows] - chord_eqs @ x)
+        x -= chord_sweep @ x_chords
+        x[chord_rows] = x_chords
+        return x
+
+    return solve
+
+
+def get_spanning_tree(net, len_n, system_name):
+    """
+    Determines a spanning tree of the active hydraulic network in breadth first order from the \
+    slack node. All branches that are not part of the tree (chords) close exactly one loop of \
+    the fundamental cycle basis. The result is cached in \
+    net["_internal_data"]["spanning_tree_<system_name>"] and only renewed if the branch \
+    connectivity or the slack node changes.
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :param len_n: The number of active nodes
+    :type len_n: int
+    :param system_name: Name of the system under which the tree is cached
+    :type system_name: str
+    :return: tree - dictionary with the slack node ("root"), all other nodes in breadth first \
+        order ("children"), their parent nodes ("parents"), the branches to their parents \
+        ("branches"), the (start, end) positions of the tree levels in these arrays ("levels") \
+        and the remaining branches ("chords"); None if the network is not connected to a \
+        single slack node
+    :rtype: dict
+    """
+    node_pit = net["_active_pit"]["node"]
+    branch_pit = net["_active_pit"]["branch"]
+    from_nodes = branch_pit[:, FROM_NODE].astype(np.int32)
+    to_nodes = branch_pit[:, TO_NODE].astype(np.int32)
+    slacks = np.where(node_pit[:, NODE_TYPE] == P)[0]
+
+    cache_key = "spanning_tree_" + system_name
+    cached = net["_internal_data"].get(cache_key, None)
+    if cached is not None and np.array_equal(cached["from_nodes"], from_nodes) \
+            and np.array_equal(cached["to_nodes"], to_nodes) \
+            and np.array_equal(cached["slacks"], slacks):
+        return cached["tree"]
+
+    tree = None
+    len_b = len(from_nodes)
+    if len(slacks) == 1 and len_b >= len_n - 1:
+        root = slacks[0]
+        # only one of several parallel branches can be part of the tree, self loops are chords
+        low, high = np.minimum(from_nodes, to_nodes), np.maximum(from_nodes, to_nodes)
+        _, candidates = np.unique(low.astype(np.int64) * len_n + high, return_index=True)
+        candidates = candidates[low[candidates] != high[candidates]]
+        # branch indices are stored shifted by one, as zeros are not kept in the sparse graph
+        graph = csr_matrix((candidates + 1, (from_nodes[candidates], to_nodes[candidates])),
+                           shape=(len_n, len_n))
+        graph = graph + graph.T
+        order, predecessors = csgraph.breadth_first_order(graph, root, directed=True,
+                                                          return_predecessors=True)
+        if len(order) == len_n:
+            children = order[1:]
+            parents = predecessors[children]
+            branches = _matrix_entries(graph, parents, children).astype(np.int64) - 1
+            depth = csgraph.shortest_path(graph, indices=root, unweighted=True)
+            # the breadth first order visits all nodes of one level before the next level
+            level_bounds = np.flatnonzero(np.diff(depth[children])) + 1
+            starts = np.concatenate([[0], level_bounds])
+            ends = np.concatenate([level_bounds, [len(children)]])
+            in_tree = np.zeros(len_b, dtype=bool)
+            in_tree[branches] = True
+            tree = {"root": root, "children": children, "parents": parents,
+                    "branches": branches, "levels": list(zip(starts, ends)),
+                    "chords": np.flatnonzero(~in_tree)}
+
+    net["_internal_data"][cache_key] = {"from_nodes": from_nodes, "to_nodes": to_nodes,
+                                        "slacks": slacks, "tree": tree}
+    return tree
+
+
+def factorize_upwind(net, system_matrix, len_n, system_name):
+    """
+    Prepares the solution of the linearized heat transfer system by a sweep in flow direction. \
+    Each equation of the heat transfer system belongs to one unknown: the equations of the \
+    slack nodes to their temperature, the mixing equations to the temperature of the node into \
+    which the branches flow (TO_NODE_T) and the branch equations to the outlet temperature of the \
+    branch. An unknown only depends on the unknowns upstream, so that the system is \
+    block triangular in flow direction (c.f. :func:`get_block_triangular_structure`): \
+    temperatures and outlet temperatures are computed level by level from the slack nodes \
+    downstream, and only circulating loops (strongly connected parts of the flow graph) are \
+    solved as coupled sparse systems. If the equations cannot be assigned to the unknowns in \
+    this way, the system is factorized with the backend given by the option **linear_solver**.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the heat transfer system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param len_n: The number of node unknowns (the first len_n entries of the solution vector)
+    :type len_n: int
+    :param system_name: Name of the system under which the structure is cached
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    node_pit = net["_active_pit"]["node"]
+    branch_pit = net["_active_pit"]["branch"]
+    if len_n is None:
+        len_n = len(node_pit)
+    slack_nodes = np.where(node_pit[:, NODE_TYPE_T] == T)[0]
+    mixing_nodes = np.unique(branch_pit[:, TO_NODE_T].astype(np.int32))
+    # the rows of the system are ordered as slack nodes, mixing nodes and branches
+    pivots = np.concatenate([slack_nodes, mixing_nodes,
+                             np.arange(len_n, system_matrix.shape[0])])
+    row_of_unknown = np.full(system_matrix.shape[0], -1, dtype=np.int64)
+    row_of_unknown[pivots] = np.arange(len(pivots))
+    if len(pivots) != system_matrix.shape[0] or np.any(row_of_unknown < 0):
+        logger.debug("The equations of the %s system cannot be assigned to its unknowns, it is "
+                     "solved with the linear solver %s."
+                     % (system_name, get_net_option(net, "linear_solver")))
+        return factorize_linear_system(net, system_matrix, system_name)
+    permuted = csr_matrix(system_matrix)[row_of_unknown]
+    solve_permuted = factorize_block_triangular(net, permuted, system_name)
+    return lambda load_vector: solve_permuted(load_vector[row_of_unknown])
+
+
+def factorize_block_triangular(net, system_matrix, system_name):
+    """
+    Prepares the solution of a system whose diagonal entries belong to the unknowns of the \
+    respective rows by block forward substitution. The strongly connected components of the \
+    dependency graph (row i depends on unknown j if the entry (i, j) is not zero) are solved in \
+    topological order, level by level. All components of one level are independent of each \
+    other; single unknowns are computed by a division, components with several unknowns (loops) \
+    are factorized with SuperLU.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The system matrix with the pivots on the diagonal
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param system_name: Name of the system under which the structure is cached
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    system_matrix = csr_matrix(system_matrix)
+    if not system_matrix.has_canonical_format:
+        system_matrix = system_matrix.copy()
+        system_matrix.sum_duplicates()
+    levels = get_block_triangular_structure(net, system_matrix, system_name)
+    diagonal = system_matrix.diagonal()
+
+    steps = []
+    for unknowns, singles, blocks in levels:
+        if np.any(diagonal[singles] == 0):
+            logger.debug("The %s system has a zero pivot, it is solved with the linear solver %s."
+                         % (system_name, get_net_option(net, "linear_solver")))
+            return factorize_linear_system(net, system_matrix, system_name)
+        block_factors = [(block, splu(csc_matrix(system_matrix[block][:, block])))
+                         for block in blocks]
+        steps.append((unknowns, system_matrix[unknowns], singles, diagonal[singles],
+                      block_factors))
+    write_internal_results(net, **{
+        "linear_solver_fill_in_%s" % system_name: 1.,
+        "loops_%s" % system_name: sum(len(step[4]) for step in steps)})
+
+    def solve(load_vector):
+        x = np.zeros(system_matrix.shape[0], dtype=np.float64)
+        for unknowns, rows, singles, diag, block_factors in steps:
+            # the unknowns of the current level are still zero, so that only the contributions
+            # of the upstream levels are subtracted
+            x[unknowns] = load_vector[unknowns] - rows @ x
+            x[singles] /= diag
+            for block, factor in block_factors:
+                x[block] = factor.solve(x[block])
+        return x
+
+    return solve
+
+
+def get_block_triangular_structure(net, system_matrix, system_name):
+    """
+    Determines the strongly connected components of the dependency graph of the system matrix \
+    and sorts them into levels, so that each component only depends on components of lower \
+    levels. The result is cached in \
+    net["_internal_data"]["block_triangular_structure_<system_name>"] and only renewed if the \
+    sparsity pattern changes.
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :param system_matrix: The system matrix in canonical csr format
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param system_name: Name of the system under which the structure is cached
+    :type system_name: str
+    :return: levels - list of the unknowns of each level, the unknowns that form a component on \
+        their own and the unknowns of the larger components
+    :rtype: list
+    """
+    cache_key = "block_triangular_structure_" + system_name
+    cached = net["_internal_data"].get(cache_key, None)
+    if cached is not None and np.array_equal(cached["indptr"], system_matrix.indptr) \
+            and np.array_equal(cached["indices"], system_matrix.indices):
+        return cached["levels"]
+
+    size = system_matrix.shape[0]
+    rows = np.repeat(np.arange(size), np.diff(system_matrix.indptr))
+    cols = system_matrix.indices
+    n_comp, labels = csgraph.connected_components(
+        csr_matrix((np.ones(len(cols)), (cols, rows)), shape=(size, size)), directed=True,
+        connection="strong")
+
+    # edges of the condensed (acyclic) graph from upstream to downstream components
+    external = labels[cols] != labels[rows]
+    edges = np.unique(labels[cols[external]].astype(np.int64) * n_comp
+                      + labels[rows[external]])
+    sources, targets = edges // n_comp, edges % n_comp
+    comp_level = _topological_levels(n_comp, sources, targets)
+
+    comp_size = np.bincount(labels, minlength=n_comp)
+    order = np.lexsort([labels, comp_level[labels]])
+    unknown_levels = comp_level[labels[order]]
+    bounds = np.flatnonzero(np.diff(unknown_levels)) + 1
+    levels = []
+    for unknowns in np.split(order, bounds):
+        single = comp_size[labels[unknowns]] == 1
+        block_labels = labels[unknowns[~single]]
+        block_bounds = np.flatnonzero(np.diff(block_labels)) + 1
+        blocks = np.split(unknowns[~single], block_bounds) if len(block_labels) else []
+        levels.append((unknowns, unknowns[single], blocks))
+
+    net["_internal_data"][cache_key] = {"indptr": system_matrix.indptr.copy(),
+                                        "indices": system_matrix.indices.copy(),
+                                        "levels": levels}
+    return levels
+
+
+def factorize_newton_krylov(net, operator, system_name):
+    """
+    Prepares the matrix-free solution of the hydraulic system with GMRES. The products with the \
+    jacobian are evaluated by the given operator from the derivative columns of the pit, so that \
+    no global system matrix is assembled and no complete factorization with its fill-in is \
+    computed. The preconditioner eliminates the mass flows of all branches with a non-vanishing \
+    diagonal entry (c.f. :func:`factorize_schur_complement`) and approximates the inverse of the \
+    remaining node (and pressure control) system, which only has as many entries as the pit, \
+    according to the option **krylov_preconditioner**:
+
+        - "ilu": incomplete LU factorization with the options **ilu_drop_tol** and \
+          **ilu_fill_factor**, so that the memory of the factors is bounded by a multiple of \
+          the pit size
+        - "block_jacobi": exact factorization of the diagonal blocks of the node system, which \
+          is ordered by the reverse Cuthill-McKee algorithm and split into blocks of \
+          **krylov_block_size** unknowns
+
+    The number of GMRES iterations is accumulated in the internal results as \
+    "krylov_iterations_<system_name>".
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param operator: The jacobian of the hydraulic system as a linear operator
+    :type operator: pandapipes.pf.build_system_matrix.HydraulicJacobianOperator
+    :param system_name: Name of the system
+    :type system_name: str
+    :return: solve - function that returns the solution for a given right hand side
+    :rtype: callable
+    """
+    tol, max_iter, restart, preconditioner_type = get_net_options(
+        net, "krylov_tol", "krylov_max_iter", "krylov_restart", "krylov_preconditioner")
+    if preconditioner_type not in ["ilu", "block_jacobi"]:
+        raise UserWarning("The krylov preconditioner %s is not available. Please choose one of "
+                          "'ilu' or 'block_jacobi'." % preconditioner_type)
+    preconditioner, fill_in = _node_system_preconditioner(net, operator, preconditioner_type)
+    write_internal_results(net, **{"linear_solver_fill_in_%s" % system_name: fill_in})
+    iterations_key = "krylov_iterations_%s" % system_name
+
+    def solve(load_vector):
+        counter = [0]
+
+        def count(_):
+            counter[0] += 1
+
+        try:
+            x, info = gmres(operator, load_vector, M=preconditioner, rtol=tol, atol=0.,
+                            maxiter=max_iter, restart=restart, callback=count,
+                            callback_type="pr_norm")
+        except TypeError:
+            # scipy < 1.12 does not know the keyword rtol
+            x, info = gmres(operator, load_vector, M=preconditioner, tol=tol, atol=0.,
+                            maxiter=max_iter, restart=restart, callback=count,
+                            callback_type="pr_norm")
+        if info != 0:
+            logger.warning("The iterative linear solver did not reach the tolerance %s within "
+                           "%d iterations." % (tol, max_iter))
+        write_internal_results(net, **{iterations_key: net.get("_internal_results", dict()).get(
+            iterations_key, 0) + counter[0]})
+        return x
+
+    return solve
+
+
+def _node_system_preconditioner(net, operator, preconditioner_type):
+    len_n = operator.len_n
+    fn, tn, d_m = operator.fn, operator.tn, operator.d_m
+    abs_d_m = np.abs(d_m)
+    tol = 1e-12 * abs_d_m.max() if len(abs_d_m) else 0.
+    eliminate = abs_d_m > tol
+    eliminate[operator.pc_branches] = False
+    kept = np.flatnonzero(~eliminate)
+    elim = np.flatnonzero(eliminate)
+    size = len_n + len(kept)
+    kept_rows = len_n + np.arange(len(kept))
+    row_of_branch = np.full(len(d_m), -1, dtype=np.int64)
+    row_of_branch[kept] = kept_rows
+
+    # reduced system of the nodes and the kept branches
+    w = 1. / d_m[elim]
+    fn_e, tn_e = fn[elim], tn[elim]
+    from_e, to_e = operator.d_m_from[elim], operator.d_m_to[elim]
+    p_from_e, p_to_e = operator.d_p_from[elim], operator.d_p_to[elim]
+    pc_rows = row_of_branch[operator.pc_branches]
+    rows = np.concatenate([
+        operator.slack_nodes, kept_rows, kept_rows, kept_rows, pc_rows, fn[kept], tn[kept],
+        fn_e, fn_e, tn_e, tn_e])
+    cols = np.concatenate([
+        operator.slack_nodes, kept_rows, fn[kept], tn[kept], operator.pc_nodes, kept_rows,
+        kept_rows, fn_e, tn_e, fn_e, tn_e])
+    data = np.concatenate([
+        np.ones(len(operator.slack_nodes)), d_m[kept], operator.d_p_from[kept],
+        operator.d_p_to[kept], np.ones(len(pc_rows)), operator.d_m_from[kept],
+        operator.d_m_to[kept], -from_e * w * p_from_e, -from_e * w * p_to_e,
+        -to_e * w * p_from_e, -to_e * w * p_to_e])
+    reduced = csc_matrix((data, (rows, cols)), shape=(size, size))
+
+    fill_in, solve_reduced = np.nan, None
+    if preconditioner_type == "ilu":
+        drop_tol, fill_factor = get_net_options(net, "ilu_drop_tol", "ilu_fill_factor")
+        try:
+            ilu = spilu(reduced, drop_tol=drop_tol, fill_factor=fill_factor)
+            solve_reduced, fill_in = ilu.solve, _fill_in(reduced, ilu.L, ilu.U)
+        except RuntimeError:
+            logger.warning("The ILU preconditioner could not be computed, a block-Jacobi "
+                           "preconditioner is used instead.")
+    if solve_reduced is None:
+        # the kept branches (e.g. pressure control) are solved in one block with their nodes,
+        # the controlled nodes and the neighbors of the controlled nodes
+        pc_neighbors = csr_matrix(reduced)[operator.pc_nodes].indices
+        coupled = np.unique(np.concatenate([kept_rows, fn[kept], tn[kept], operator.pc_nodes,
+                                            pc_neighbors]))
+        solve_reduced, fill_in = _block_jacobi(
+            reduced, get_net_option(net, "krylov_block_size"), coupled)
+
+    def apply(load_vector):
+        load_vector = np.ravel(load_vector)
+        b_e = load_vector[len_n + elim] * w
+        rhs = np.empty(size, dtype=np.float64)
+        rhs[:len_n] = load_vector[:len_n] - np.bincount(fn_e, from_e * b_e, minlength=len_n) \
+            - np.bincount(tn_e, to_e * b_e, minlength=len_n)
+        rhs[len_n:] = load_vector[len_n + kept]
+        x_reduced = solve_reduced(rhs)
+        x = np.empty(len(load_vector), dtype=np.float64)
+        x[:len_n] = x_reduced[:len_n]
+        x[len_n + kept] = x_reduced[len_n:]
+        x[len_n + elim] = b_e - w * (p_from_e * x[fn_e] + p_to_e * x[tn_e])
+        return x
+
+    return LinearOperator(operator.shape, apply), fill_in
+
+
+def _block_jacobi(matrix, block_size, coupled=None):
+    # neighboring unknowns are grouped into the same block by a bandwidth reducing ordering, the
+    # factorization of the block diagonal part only has fill-in within the blocks; the coupled
+    # unknowns (e.g. rows without diagonal entry, which are singular in a block without their
+    # columns) form an additional block
+    size = matrix.shape[0]
+    order = csgraph.reverse_cuthill_mckee(csr_matrix(matrix), symmetric_mode=False)
+    block = np.empty(size, dtype=np.int64)
+    block[order] = np.arange(size) // max(int(block_size), 1)
+    if coupled is not None and len(coupled):
+        block[coupled] = block.max() + 1
+    matrix = matrix.tocoo()
+    in_block = (block[matrix.row] == block[matrix.col]) & (matrix.data != 0)
+    # rows without any entry in their block are replaced by the identity
+    empty_rows = np.flatnonzero(np.bincount(matrix.row[in_block], minlength=size) == 0)
+    block_matrix = csc_matrix((np.concatenate([matrix.data[in_block], np.ones(len(empty_rows))]),
+                               (np.concatenate([matrix.row[in_block], empty_rows]),
+                                np.concatenate([matrix.col[in_block], empty_rows]))),
+                              shape=matrix.shape)
+    try:
+        lu = splu(block_matrix)
+    except RuntimeError:
+        logger.warning("The block-Jacobi preconditioner could not be computed, the diagonal is "
+                       "used instead.")
+        diagonal = matrix.tocsr().diagonal()
+        inverse_diagonal = 1. / np.where(diagonal == 0, 1., diagonal)
+        return lambda rhs: rhs * inverse_diagonal, np.nan
+    return lu.solve, _fill_in(matrix, lu.L, lu.U)
+
+
+def _topological_levels(size, sources, targets):
+    # Kahn's algorithm, processing all nodes without remaining predecessors at once
+    graph = csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(size, size))
+    in_degree = np.bincount(targets, minlength=size)
+    level = np.zeros(size, dtype=np.int64)
+    frontier = np.flatnonzero(in_degree == 0)
+    current = 0
+    while len(frontier):
+        level[frontier] = current
+        starts, counts = graph.indptr[frontier], np.diff(graph.indptr)[frontier]
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        successors = graph.indices[offsets + np.arange(np.sum(counts))]
+        successors, reduction = np.unique(successors, return_counts=True)
+        in_degree[successors] -= reduction
+        frontier = successors[in_degree[successors] == 0]
+        current += 1
+    return level
+
+
+def _matrix_entries(matrix, rows, cols):
+    if not len(rows):
+        return np.empty(0, dtype=matrix.dtype)
+    return np.asarray(matrix[rows, cols]).ravel()
+
+
+def register_linear_solver(name, backend):
+    """
+    Registers a linear solver backend that can afterwards be selected via the option \
+    **linear_solver**.
+
+    :param name: The name under which the backend is registered
+    :type name: str
+    :param backend: Function with the signature (net, system_matrix, system_name) that returns \
+        a function solving the system for a given right hand side and the fill-in of the \
+        factorization (or NaN)
+    :type backend: callable
+    :return: No output
+    """
+    LINEAR_SOLVER_BACKENDS[name] = backend
+
+
+def _fill_in(system_matrix, l_factor, u_factor):
+    return (l_factor.nnz + u_factor.nnz) / max(system_matrix.nnz, 1)
+
+
+def _solve_directly(system_matrix):
+    # singular matrices are treated as in the default solver (warning and NaN results); the matrix
+    # is copied, as its data might be updated in place in the following iterations
+    system_matrix = system_matrix.copy()
+    return lambda load_vector: spsolve(system_matrix, load_vector)
+
+
+def factorize_spsolve(net, system_matrix, system_name):
+    """
+    Default backend based on scipy's spsolve. If the option **reuse_factorization** is set, the \
+    cached ordering is used (c.f. :func:`factorize_superlu`).
+    """
+    if get_net_option(net, "reuse_factorization"):
+        return factorize_superlu(net, system_matrix, system_name)
+    return _solve_directly(system_matrix), np.nan
+
+
+def factorize_superlu(net, system_matrix, system_name):
+    """
+    Direct solution with SuperLU and the column ordering given by the option **permc_spec**. If \
+    the option **reuse_factorization** is set, the fill-reducing ordering of the sparse LU \
+    factorization is only determined once per sparsity pattern and reused for the numerical \
+    factorization in all subsequent iterations (c.f. :func:`get_factorization_structure`).
+    """
+    reuse_factorization, permc_spec = get_net_options(net, "reuse_factorization", "permc_spec")
+    if not reuse_factorization:
+        try:
+            lu = splu(system_matrix.tocsc(), permc_spec=permc_spec)
+        except RuntimeError:
+            return _solve_directly(system_matrix), np.nan
+        return lu.solve, _fill_in(system_matrix, lu.L, lu.U)
+
+    if not system_matrix.has_canonical_format:
+        system_matrix = system_matrix.copy()
+        system_matrix.sum_duplicates()
+    structure = get_factorization_structure(net, system_matrix, system_name, permc_spec)
+    permuted_matrix = csc_matrix(
+        (system_matrix.data[structure["data_map"]], structure["indices"], structure["indptr"]),
+        shape=system_matrix.shape)
+    try:
+        lu = splu(permuted_matrix, permc_spec="NATURAL")
+    except RuntimeError:
+        return _solve_directly(system_matrix), np.nan
+    col_order = structure["col_order"]
+
+    def solve(load_vector):
+        x = np.empty(len(load_vector), dtype=np.float64)
+        x[col_order] = lu.solve(load_vector)
+        return x
+
+    return solve, _fill_in(system_matrix, lu.L, lu.U)
+
+
+def factorize_umfpack(net, system_matrix, system_name):
+    """
+    Direct solution with UMFPACK (requires the package scikit-umfpack).
+    """
+    if not umfpack_installed:
+        raise UserWarning("The linear solver 'umfpack' requires the package scikit-umfpack, "
+                          "which is not installed.")
+    lu = umfpack.splu(system_matrix.tocsc())
+    return lu.solve, _fill_in(system_matrix, lu.L, lu.U)
+
+
+def _factorize_krylov(net, system_matrix, krylov_method):
+    tol, max_iter, drop_tol, fill_factor = get_net_options(
+        net, "krylov_tol", "krylov_max_iter", "ilu_drop_tol", "ilu_fill_factor")
+    system_matrix = system_matrix.tocsc()
+    try:
+        ilu = spilu(system_matrix, drop_tol=drop_tol, fill_factor=fill_factor)
+    except RuntimeError:
+        logger.warning("The ILU preconditioner could not be computed, the system is solved "
+                       "directly instead.")
+        return _solve_directly(system_matrix), np.nan
+    preconditioner = LinearOperator(system_matrix.shape, ilu.solve)
+
+    def solve(load_vector):
+        try:
+            x, info = krylov_method(system_matrix, load_vector, M=preconditioner, rtol=tol,
+                                    atol=0., maxiter=max_iter)
+        except TypeError:
+            # scipy < 1.12 does not know the keyword rtol
+            x, info = krylov_method(system_matrix, load_vector, M=preconditioner, tol=tol,
+                                    atol=0., maxiter=max_iter)
+        if info != 0:
+            logger.warning("The iterative linear solver did not reach the tolerance %s within "
+                           "%d iterations." % (tol, max_iter))
+        return x
+
+    return solve, _fill_in(system_matrix, ilu.L, ilu.U)
+
+
+def factorize_gmres(net, system_matrix, system_name):
+    """
+    Iterative solution with GMRES, preconditioned with an incomplete LU factorization.
+    """
+    return _factorize_krylov(net, system_matrix, gmres)
+
+
+def factorize_bicgstab(net, system_matrix, system_name):
+    """
+    Iterative solution with BiCGSTAB, preconditioned with an incomplete LU factorization.
+    """
+    return _factorize_krylov(net, system_matrix, bicgstab)
+
+
+LINEAR_SOLVER_BACKENDS = {"spsolve": factorize_spsolve, "superlu": factorize_superlu,
+                          "umfpack": factorize_umfpack, "gmres": factorize_gmres,
+                          "bicgstab": factorize_bicgstab}
+
+
+def get_factorization_structure(net, system_matrix, system_name, permc_spec="COLAMD"):
+    """
+    Returns the cached factorization structure for the given system matrix. The structure consists \
+    of the fill-reducing column ordering of the matrix and the index arrays of the \
+    column-permuted matrix in CSC format together with a map from the CSR data of the system \
+    matrix to the permuted CSC data. Thus, in every iteration only the numerical values have to be \
+    rearranged before the numerical factorization. The structure is recomputed only if the \
+    sparsity pattern of the system matrix changes. It is stored in net["_internal_data"], so that \
+    it is kept for repeated pipeflow calls if the option **reuse_internal_data** is set.
+
+    :param net: The pandapipes net for which the system shall be solved
+    :type net: pandapipesNet
+    :param system_matrix: The jacobian of the system
+    :type system_matrix: scipy.sparse.csr_matrix
+    :param system_name: Name of the system under which the structure is cached
+    :type system_name: str
+    :param permc_spec: The column ordering used by SuperLU to determine the structure
+    :type permc_spec: str, default "COLAMD"
+    :return: structure - dictionary with the cached ordering and index arrays
+    :rtype: dict
+    """
+    if "_internal_data" not in net:
+        net["_internal_data"] = dict()
+    cache_name = "factorization_" + system_name
+    structure = net["_internal_data"].get(cache_name, None)
+    if structure is not None and structure["shape"] == system_matrix.shape \
+            and structure["permc_spec"] == permc_spec \
+            and np.array_equal(structure["csr_indptr"], system_matrix.indptr) \
+            and np.array_equal(structure["csr_indices"], system_matrix.indices):
+        return structure
+
+    logger.debug("Determining the fill-reducing ordering for the %s system." % system_name)
+    lu = splu(system_matrix.tocsc(), permc_spec=permc_spec)
+    col_order = np.argsort(lu.perm_c)
+
+    # the CSR entries are numbered consecutively, so that the data of the permuted CSC matrix
+    # directly yields the position of each entry in the data of the original system matrix
+    numbering = csr_matrix((np.arange(system_matrix.nnz, dtype=np.float64),
+                            system_matrix.indices, system_matrix.indptr),
+                           shape=system_matrix.shape)
+    permuted = numbering.tocsc()[:, col_order]
+    permuted.sort_indices()
+
+    structure = {"shape": system_matrix.shape, "permc_spec": permc_spec,
+                 "csr_indptr": system_matrix.indptr.copy(),
+                 "csr_indices": system_matrix.indices.copy(), "col_order": col_order,
+                 "indices": permuted.indices, "indptr": permuted.indptr,
+                 "data_map": permuted.data.astype(np.int64)}
+    net["_internal_data"][cache_name] = structure
+    return structure
@@ -0,0 +1,502 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+from numpy import linalg
+
+from pandapipes.component_models.abstract_models.const_flow_models import ConstFlow
+from pandapipes.component_models.component_toolbox import get_component_array
+from pandapipes.component_models.ext_grid_component import ExtGrid
+from pandapipes.component_models.heat_consumer_component import HeatConsumer
+from pandapipes.idx_branch import FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, \
+    ELEMENT_IDX as ELEMENT_IDX_BR
+from pandapipes.idx_node import PINIT, LOAD, EXT_GRID_OCCURENCE, ELEMENT_IDX as ELEMENT_IDX_ND
+from pandapipes.pf.internals_toolbox import _sum_by_index
+from pandapipes.pf.linear_solver import reset_quasi_newton
+from pandapipes.pf.pipeflow_setup import get_net_options, init_options, get_lookup, \
+    create_lookups, initialize_pit, reduce_pit, init_all_result_tables, \
+    identify_active_nodes_branches, get_previous_state, initialize_pit_from_previous_state, \
+    set_user_pf_options, PipeflowNotConverged
+from pandapipes.pf.result_extraction import extract_all_results, extract_results_active_pit
+from pandapipes.pipeflow import solve_hydraulics, reset_line_search
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+# the maximum number of pit rows of the nets with stacked scenarios for the result extraction, as
+# larger stacks do not speed up the vectorized extraction any further, but require more memory
+STACKED_EXTRACTION_ROWS = 200000
+
+
+def pipeflow_batch(net, scenarios, batch_size=None, **kwargs):
+    """
+    Performs the hydraulic calculation for many scenarios of setpoints on the same network. The \
+    lookups, the pit, the connectivity check and the active pit are only created once. The active \
+    pits of all scenarios (of one batch) are stacked into one system with one copy per scenario, \
+    so that the derivatives of all scenarios are evaluated in one vectorized call, and the block \
+    diagonal system matrix has one sparsity pattern and fill-reducing ordering that is reused in \
+    all iterations (the options **only_update_hydraulic_matrix** and **reuse_factorization** are \
+    set). The Newton-Raphson iteration is performed until all scenarios of a batch have \
+    converged, the convergence criteria are evaluated for each scenario separately. Scenarios \
+    that did not converge in a batch are solved again one by one, so that a scenario whose \
+    system cannot be solved does not prevent the convergence of the others.
+
+    The scenarios are given as arrays of shape (K, n) for K scenarios and the n rows of a table:
+
+        - "sink", "source" (and other tables of constant flow components): mdot_kg_per_s
+        - "ext_grid": p_bar of the external grids with type "p" or "pt"
+
+    Scenario values of elements that are out of service or not connected to an external grid \
+    are ignored. The hydraulic formulations "auto", "radial" and "loop" are replaced by "full", \
+    the damping of the nonlinear method "automatic" is not adapted. Heat consumers are not \
+    supported.
+
+    :param net: The pandapipes net for which to perform the pipeflows
+    :type net: pandapipesNet
+    :param scenarios: The setpoints of all scenarios as arrays of shape (K, n) per table name
+    :type scenarios: dict
+    :param batch_size: The maximum number of scenarios that are stacked into one system, all \
+        scenarios if None
+    :type batch_size: int, default None
+    :param kwargs: Options controlling the solver behaviour (c.f. :func:`init_options`)
+    :return: results - The converged state of each scenario as array of shape (K,) with the key \
+        "converged" and the results as arrays of shape (K, n) per result table and column, e.g. \
+        results["res_junction"]["p_bar"]. Results of scenarios that did not converge are NaN. \
+        The result tables of the net contain the results of the last converged scenario.
+    :rtype: dict
+
+    :Example:
+        >>> results = pipeflow_batch(net, {"sink": mdot_sinks})
+        >>> results["res_junction"]["p_bar"]
+
+    """
+    if kwargs.get("mode", "hydraulics") != "hydraulics":
+        raise UserWarning("The batched pipeflow is only available for the mode 'hydraulics'.")
+    if HeatConsumer in net["component_list"] and len(net[HeatConsumer.table_name()]):
+        raise UserWarning("The batched pipeflow is not available for nets with heat consumers.")
+    previous_state = get_previous_state(net)
+    init_options(net, {"net": net, "kwargs": kwargs})
+    net.converged = False
+    init_all_result_tables(net)
+    create_lookups(net)
+    initialize_pit(net)
+    initialize_pit_from_previous_state(net, previous_state)
+    identify_active_nodes_branches(net)
+    reduce_pit(net, mode="hydraulics")
+
+    loads, pressures = get_scenario_node_states(net, scenarios)
+    n_scenarios = len(loads)
+    batch_size = n_scenarios if batch_size is None else max(1, int(batch_size))
+    internal_data = dict()
+    converged = np.zeros(n_scenarios, dtype=bool)
+    states = []
+    for start in range(0, n_scenarios, batch_size):
+        batch = slice(start, min(start + batch_size, n_scenarios))
+        converged[batch], batch_states = solve_scenarios(net, loads[batch], pressures[batch],
+                                                         internal_data)
+        states.extend(batch_states)
+
+    results = extract_batch_results(net, scenarios, states, converged)
+    net.converged = bool(np.all(converged))
+    if np.any(converged):
+        set_user_pf_options(net, hyd_flag=True)
+    else:
+        raise PipeflowNotConverged("The hydraulic calculation did not converge to a solution in "
+                                   "any of the %d scenarios." % n_scenarios)
+    if not net.converged:
+        logger.warning("The hydraulic calculation did not converge in %d of %d scenarios."
+                       % (np.sum(~converged), n_scenarios))
+    return results
+
+
+def get_setpoint_column(comp):
+    """
+    Returns the column of the setpoints of a component that can be varied in scenarios: the mass \
+    flow of constant flow components and the pressure of external grids.
+
+    :param comp: The component
+    :type comp: type
+    :return: column - The name of the setpoint column, None if the component has no setpoints
+    :rtype: str
+    """
+    if issubclass(comp, ConstFlow):
+        return "mdot_kg_per_s"
+    if issubclass(comp, ExtGrid):
+        return "p_bar"
+    return None
+
+
+def get_setpoint_mapping(net, tables):
+    """
+    Determines how the setpoints of the given tables enter the active node pit of the hydraulic \
+    calculation. Only elements that are connected to an active node are considered, as well as \
+    only in-service external grids of type "p" or "pt".
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param tables: The names of the tables with setpoints
+    :type tables: iterable
+    :return: mapping - For each table the setpoint column, the number of rows of the table, the \
+        considered rows, their active nodes, the factors of the setpoints and whether the \
+        setpoints are loads (LOAD) or pressures (PINIT)
+    :rtype: dict
+    """
+    active_nodes = get_lookup(net, "node", "active_hydraulics")
+    active_position = np.where(active_nodes, np.cumsum(active_nodes) - 1, -1)
+    components = {comp.table_name(): comp for comp in net["component_list"]}
+    mapping = dict()
+    for table in tables:
+        comp = components.get(table, None)
+        column = None if comp is None else get_setpoint_column(comp)
+        if column is None:
+            raise UserWarning("Scenarios are only available for constant flow components and "
+                              "external grids, not for the table %s." % table)
+        tbl = net[table]
+        junction_lookup = get_lookup(net, "node", "index")[
+            comp.get_connected_node_type().table_name()]
+        nodes = active_position[junction_lookup[tbl.junction.values]]
+        is_load = issubclass(comp, ConstFlow)
+        if is_load:
+            factor = tbl.in_service.values * tbl.scaling.values * comp.sign()
+            rows = np.where(nodes >= 0)[0]
+        else:
+            factor = np.ones(len(tbl))
+            rows = np.where((nodes >= 0) & tbl[comp.active_identifier()].values.astype(bool)
+                            & np.isin(tbl.type.values, ["p", "pt"]))[0]
+        mapping[table] = (column, len(tbl), rows, nodes[rows], factor[rows], is_load)
+    return mapping
+
+
+def get_scenario_node_states(net, scenarios, node_pit=None, base_setpoints=None, mapping=None):
+    """
+    Determines the loads and the pressures of the active nodes in all scenarios from the \
+    differences of the scenario setpoints to the setpoints in the net, in the same way as the \
+    node entries of the pit are created by the components (loads are summed up, pressures of \
+    several external grids at one node are averaged).
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param scenarios: The setpoints of all scenarios as arrays of shape (K, n) per table name
+    :type scenarios: dict
+    :param node_pit: The active node pit that belongs to the base setpoints, the active node pit \
+        of the net if None
+    :type node_pit: numpy.ndarray, default None
+    :param base_setpoints: The setpoints per table name that belong to the node pit, the values \
+        in the tables of the net if None
+    :type base_setpoints: dict, default None
+    :param mapping: The mapping of the setpoints to the active nodes (c.f. \
+        :func:`get_setpoint_mapping`), determined for the tables of the scenarios if None
+    :type mapping: dict, default None
+    :return: loads, pressures - The LOAD and PINIT columns of the active node pit of all \
+        scenarios, each of shape (K, number of active nodes)
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+    node_pit = net["_active_pit"]["node"] if node_pit is None else node_pit
+    base_setpoints = dict() if base_setpoints is None else base_setpoints
+    mapping = get_setpoint_mapping(net, scenarios) if mapping is None else mapping
+    len_n = len(node_pit)
+    n_scenarios = {np.shape(values)[0] for values in scenarios.values()}
+    if len(n_scenarios) != 1:
+        raise UserWarning("All scenario arrays have to be given for the same number of scenarios.")
+    n_scenarios = n_scenarios.pop()
+
+    load_deltas = np.zeros(n_scenarios * len_n)
+    pressure_deltas = np.zeros(n_scenarios * len_n)
+    for table, values in scenarios.items():
+        column, length, rows, nodes, factor, is_load = mapping[table]
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[1] != length:
+            raise UserWarning("The scenarios of table %s have %d instead of %d columns."
+                              % (table, values.shape[1], length))
+        base = base_setpoints[table] if table in base_setpoints else net[table][column].values
+        deltas = (np.nan_to_num(values[:, rows]) - np.nan_to_num(base[rows])) * factor
+        indices = (np.arange(n_scenarios)[:, np.newaxis] * len_n + nodes).ravel()
+        target = load_deltas if is_load else pressure_deltas
+        target += _sum_by_index(indices, deltas.ravel(), n_scenarios * len_n)
+
+    occurrences = np.maximum(node_pit[:, EXT_GRID_OCCURENCE], 1)
+    loads = node_pit[:, LOAD] + load_deltas.reshape(n_scenarios, len_n)
+    pressures = node_pit[:, PINIT] + pressure_deltas.reshape(n_scenarios, len_n) / occurrences
+    return loads, pressures
+
+
+def create_batch_net(net, loads, pressures, internal_data):
+    """
+    Creates a shallow copy of the net with an active pit that contains one copy of the active \
+    pit of the net per scenario. The branches are ordered by table and scenario, so that the \
+    rows of each component table are contiguous and the lookups of the components (the from_to \
+    lookup of the active branches and the component arrays) can be scaled accordingly.
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param loads: The LOAD column of the active node pit of all scenarios
+    :type loads: numpy.ndarray
+    :param pressures: The PINIT column of the active node pit of all scenarios
+    :type pressures: numpy.ndarray
+    :param internal_data: The internal data that is shared by all batches
+    :type internal_data: dict
+    :return: batch_net, node_rows, branch_rows - The copy of the net and the rows of the \
+        stacked node and branch pit for each scenario, each of shape (K, number of rows)
+    :rtype: pandapipesNet, numpy.ndarray, numpy.ndarray
+    """
+    node_pit = net["_active_pit"]["node"]
+    branch_pit = net["_active_pit"]["branch"]
+    n_scenarios, len_n, len_b = len(loads), len(node_pit), len(branch_pit)
+    from_to = get_lookup(net, "branch", "from_to_active_hydraulics")
+
+    # position of each branch row in the stacked pit: the tables keep their order and within a
+    # table, the rows of all scenarios follow each other
+    table_start, table_size = np.zeros(len_b, dtype=np.int64), np.ones(len_b, dtype=np.int64)
+    for f, t in from_to.values():
+        table_start[f:t], table_size[f:t] = f, t - f
+    scenarios = np.arange(n_scenarios)[:, np.newaxis]
+    branch_rows = table_start * (n_scenarios - 1) + scenarios * table_size + np.arange(len_b)
+    node_rows = scenarios * len_n + np.arange(len_n)
+
+    batch_node_pit = np.tile(node_pit, (n_scenarios, 1))
+    batch_node_pit[:, LOAD] = loads.ravel()
+    batch_node_pit[:, PINIT] = pressures.ravel()
+    batch_branch_pit = np.empty((n_scenarios * len_b, branch_pit.shape[1]))
+    batch_branch_pit[branch_rows.ravel()] = np.tile(branch_pit, (n_scenarios, 1))
+    for col in [FROM_NODE, TO_NODE]:
+        batch_branch_pit[branch_rows, col] = branch_pit[:, col] + scenarios * len_n
+
+    batch_net = copy.copy(net)
+    batch_net["_options"] = dict(net["_options"])
+    batch_net["_options"].update({"only_update_hydraulic_matrix": True,
+                                  "reuse_factorization": True, "load_continuation": False})
+    if batch_net["_options"]["hydraulic_formulation"] in ["auto", "radial", "loop"]:
+        batch_net["_options"]["hydraulic_formulation"] = "full"
+    batch_net["_lookups"] = dict(net["_lookups"])
+    batch_from_to = {tbl: (f * n_scenarios, t * n_scenarios) for tbl, (f, t) in from_to.items()}
+    batch_net["_lookups"]["branch_from_to_active_hydraulics"] = batch_from_to
+    batch_net["_lookups"]["branch_from_to"] = batch_from_to
+    batch_net["_lookups"]["branch_active_hydraulics"] = np.ones(n_scenarios * len_b, dtype=bool)
+    batch_net["_pit"] = dict(net["_pit"])
+    batch_net["_pit"]["components"] = {
+        tbl: np.tile(get_component_array(net, tbl), (n_scenarios, 1))
+        for tbl in net["_pit"].get("components", dict()) if tbl in from_to}
+    batch_net["_active_pit"] = {"node": batch_node_pit, "branch": batch_branch_pit}
+    batch_net["_internal_data"] = internal_data
+    return batch_net, node_rows, branch_rows
+
+
+def solve_scenarios(net, loads, pressures, internal_data):
+    """
+    Solves a batch of scenarios in one stacked system (c.f. :func:`create_batch_net` and \
+    :func:`solve_batch`). As the stacked system fails as a whole if the system of one scenario \
+    cannot be solved (e.g. because it is singular or not finite), the scenarios that did not \
+    converge in a batch of several scenarios are solved again one by one, so that they do not \
+    affect the convergence of the other scenarios.
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param loads: The LOAD column of the active node pit of all scenarios
+    :type loads: numpy.ndarray
+    :param pressures: The PINIT column of the active node pit of all scenarios
+    :type pressures: numpy.ndarray
+    :param internal_data: The internal data that is shared by all batches, with one entry per \
+        number of stacked scenarios (i.e. per sparsity pattern)
+    :type internal_data: dict
+    :return: converged, states - The convergence state and the node and branch pit of each \
+        scenario
+    :rtype: numpy.ndarray, list
+    """
+    n_scenarios = len(loads)
+    batch_net, node_rows, branch_rows = create_batch_net(
+        net, loads, pressures, internal_data.setdefault(n_scenarios, dict()))
+    converged = solve_batch(batch_net, node_rows, branch_rows)
+    states = [(batch_net["_active_pit"]["node"][nodes],
+               batch_net["_active_pit"]["branch"][branches])
+              for nodes, branches in zip(node_rows, branch_rows)]
+    if n_scenarios > 1 and not np.all(converged):
+        logger.debug("%d of %d scenarios did not converge in the batch, they are solved one by "
+                     "one." % (np.sum(~converged), n_scenarios))
+        for k in np.flatnonzero(~converged):
+            single_converged, single_states = solve_scenarios(
+                net, loads[[k]], pressures[[k]], internal_data)
+            converged[k], states[k] = single_converged[0], single_states[0]
+    return converged, states
+
+
+def solve_batch(batch_net, node_rows, branch_rows):
+    """
+    Performs the Newton-Raphson iterations on the stacked active pit of a batch of scenarios \
+    until all scenarios have converged or the maximum number of iterations is reached.
+
+    :param batch_net: The net with the stacked active pit (c.f. :func:`create_batch_net`)
+    :type batch_net: pandapipesNet
+    :param node_rows: The rows of the stacked node pit for each scenario
+    :type node_rows: numpy.ndarray
+    :param branch_rows: The rows of the stacked branch pit for each scenario
+    :type branch_rows: numpy.ndarray
+    :return: converged - The convergence state of each scenario
+    :rtype: numpy.ndarray
+    """
+    max_iter, tol_m, tol_p, tol_res = get_net_options(
+        batch_net, "max_iter_hyd", "tol_m", "tol_p", "tol_res")
+    len_n, len_b = node_rows.shape[1], branch_rows.shape[1]
+    residual_rows = np.hstack([node_rows, node_rows.size + branch_rows])
+    converged = np.zeros(len(node_rows), dtype=bool)
+    reset_quasi_newton(batch_net)
+    reset_line_search(batch_net)
+    niter = 0
+    while not np.all(converged) and niter < max_iter:
+        try:
+            (m_new, m_old, p_new, p_old), residual = solve_hydraulics(batch_net)
+        except (ValueError, FloatingPointError, linalg.LinAlgError) as e:
+            logger.debug("The hydraulic calculation of a batch failed: %s" % e)
+            return np.zeros(len(node_rows), dtype=bool)
+        error_m = linalg.norm((m_new - m_old)[branch_rows], axis=1) / len_b if len_b else 0
+        error_p = linalg.norm((p_new - p_old)[node_rows], axis=1) / len_n
+        residual_norm = linalg.norm(residual[residual_rows], axis=1) / (len_n + len_b)
+        converged = (error_m <= tol_m) & (error_p <= tol_p) & (residual_norm <= tol_res)
+        niter += 1
+    logger.debug("batch of %d scenarios: %d converged after %d iterations"
+                 % (len(node_rows), np.sum(converged), niter))
+    return converged
+
+
+def create_stacked_net(net, scenarios, states, selected):
+    """
+    Creates a shallow copy of the net whose component tables contain one copy of each table per \
+    selected scenario (with the setpoints of the scenario) and whose pit contains the pit of the \
+    net with the states of the scenarios, so that the results of all selected scenarios can be \
+    extracted by the components in one vectorized call. The indices of the copies and their node \
+    references (all columns ending with "junction") are shifted by the scenario number times the \
+    maximum index of the table (or of the junction table) plus one.
+
+    :param net: The pandapipes net with the pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param scenarios: The setpoints of all scenarios as arrays of shape (K, n) per table name
+    :type scenarios: dict
+    :param states: The node and branch pit of each scenario
+    :type states: list
+    :param selected: The numbers of the scenarios that are stacked
+    :type selected: numpy.ndarray
+    :return: stacked_net - The copy of the net with the stacked tables and pit
+    :rtype: pandapipesNet
+    """
+    n_stacked = len(selected)
+    copies = np.arange(n_stacked)[:, np.newaxis]
+    offsets = {comp.table_name(): net[comp.table_name()].index.max() + 1
+               if len(net[comp.table_name()]) else 0 for comp in net["component_list"]}
+    stacked_net = copy.copy(net)
+    for comp in net["component_list"]:
+        table = net[comp.table_name()]
+        stacked = table.iloc[np.tile(np.arange(len(table)), n_stacked)]
+        stacked.index = (table.index.values + offsets[comp.table_name()] * copies).ravel()
+        for col in table.columns:
+            if col.endswith("junction"):
+                stacked[col] = (table[col].values + offsets["junction"] * copies).ravel()
+        if comp.table_name() in scenarios:
+            stacked[get_setpoint_column(comp)] = scenarios[comp.table_name()][selected].ravel()
+        stacked_net[comp.table_name()] = stacked
+    create_lookups(stacked_net)
+
+    # the rows of the tables follow each other in the pit, within a table the copies are stacked;
+    # the inactive rows of all scenarios are taken from the pit of the net, the active rows from
+    # the states, the element indices are shifted like the indices of the tables (the internal
+    # nodes are numbered consecutively)
+    rows, full_pits, blocks = dict(), dict(), dict()
+    for pit_type, i in [("node", 0), ("branch", 1)]:
+        net_pit = net["_pit"][pit_type]
+        rows[pit_type] = np.zeros((n_stacked, len(net_pit)), dtype=np.int64)
+        shift = np.zeros(len(net_pit))
+        stacked_from_to = get_lookup(stacked_net, pit_type, "from_to")
+        blocks[pit_type] = sorted(from_to for from_to in get_lookup(
+            net, pit_type, "from_to").values() if from_to is not None)
+        for table, from_to in get_lookup(net, pit_type, "from_to").items():
+            if from_to is None:
+                continue
+            f, t = from_to
+            rows[pit_type][:, f:t] = stacked_from_to[table][0] + copies * (t - f) \
+                + np.arange(t - f)
+            shift[f:t] = offsets.get(table, t - f)
+        states_pit = np.stack([states[k][i] for k in selected])
+        active_rows = get_lookup(net, pit_type, "rows_active_hydraulics")
+        if active_rows is None:
+            full_pit = states_pit
+        else:
+            full_pit = np.repeat(net_pit[np.newaxis], n_stacked, axis=0)
+            full_pit[:, active_rows] = states_pit
+        element_idx = ELEMENT_IDX_ND if pit_type == "node" else ELEMENT_IDX_BR
+        full_pit[:, :, element_idx] = net_pit[:, element_idx] + shift * copies
+        full_pits[pit_type] = full_pit
+        active = np.zeros(n_stacked * len(net_pit), dtype=bool)
+        active[rows[pit_type]] = get_lookup(net, pit_type, "active_hydraulics")
+        stacked_net["_lookups"]["%s_active_hydraulics" % pit_type] = active
+    branch_pit = net["_pit"]["branch"]
+    for col in [FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T]:
+        full_pits["branch"][:, :, col] = rows["node"][:, branch_pit[:, col].astype(np.int64)]
+    pit = {pit_type: np.concatenate(
+        [full_pits[pit_type][:, f:t].reshape(-1, full_pits[pit_type].shape[2])
+         for f, t in blocks[pit_type]]) for pit_type in ["node", "branch"]}
+    pit["components"] = {tbl: np.tile(array, (n_stacked, 1))
+                         for tbl, array in net["_pit"].get("components", dict()).items()}
+    stacked_net["_pit"] = pit
+    init_all_result_tables(stacked_net)
+    return stacked_net
+
+
+def extract_batch_results(net, scenarios, states, converged):
+    """
+    Extracts the results of the converged scenarios from nets with one copy of the component \
+    tables per scenario (c.f. :func:`create_stacked_net`), into whose pit the states of the \
+    scenarios are written, so that the components extract the results of many scenarios in one \
+    vectorized call. The results are collected in arrays of shape (K, n) per result table and \
+    column. To limit the memory, at most STACKED_EXTRACTION_ROWS pit rows are stacked at once. \
+    The result tables of the net contain the results of the last converged scenario.
+
+    :param net: The pandapipes net with the active pit of the hydraulic calculation
+    :type net: pandapipesNet
+    :param scenarios: The setpoints of all scenarios as arrays of shape (K, n) per table name
+    :type scenarios: dict
+    :param states: The node and branch pit of each scenario
+    :type states: list
+    :param converged: The convergence state of each scenario
+    :type converged: numpy.ndarray
+    :return: results - The convergence state and the results of all scenarios
+    :rtype: dict
+    """
+    results = {"converged": converged}
+    selected = np.flatnonzero(converged)
+    if not len(selected):
+        return results
+    # the state of the last converged scenario is kept in the pit of the net
+    net["_active_pit"]["node"][:] = states[selected[-1]][0]
+    kept_cols = [FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T]
+    branch_cols = np.setdiff1d(np.arange(net["_active_pit"]["branch"].shape[1]), kept_cols)
+    net["_active_pit"]["branch"][:, branch_cols] = states[selected[-1]][1][:, branch_cols]
+    extract_results_active_pit(net, mode="hydraulics")
+
+    pit_rows = get_lookup(net, "node", "length") + get_lookup(net, "branch", "length")
+    chunk_size = max(1, STACKED_EXTRACTION_ROWS // max(pit_rows, 1))
+    for start in range(0, len(selected), chunk_size):
+        chunk = selected[start:start + chunk_size]
+        stacked_net = create_stacked_net(net, scenarios, states, chunk)
+        extract_all_results(stacked_net, "hydraulics")
+
+        for comp in net["component_list"]:
+            table = "res_" + comp.table_name()
+            if table not in stacked_net:
+                continue
+            res = stacked_net[table]
+            n_rows = len(net[comp.table_name()])
+            values = res.values.reshape(len(chunk), n_rows, res.shape[1])
+            if table not in results:
+                results[table] = {col: np.full((len(converged), n_rows), np.nan)
+                                  for col in res.columns}
+            for i, col in enumerate(res.columns):
+                results[table][col][chunk] = values[:, :, i]
+            if start + chunk_size >= len(selected):
+                net[table] = res.iloc[len(res) - n_rows:].copy()
+                net[table].index = net[comp.table_name()].index
+    return results
@@ -0,0 +1,169 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+from functools import partial
+
+import numpy as np
+
+from pandapipes.idx_branch import MDOTINIT
+from pandapipes.idx_node import PINIT, LOAD, NODE_TYPE, P
+from pandapipes.pf.incremental_pit import get_structure_fingerprint
+from pandapipes.pf.pipeflow_batch import get_setpoint_column, get_setpoint_mapping, \
+    get_scenario_node_states
+from pandapipes.pf.pipeflow_setup import get_net_option, get_net_options, init_options, \
+    create_lookups, initialize_pit, reduce_pit, init_all_result_tables, \
+    identify_active_nodes_branches, get_previous_state, initialize_pit_from_previous_state, \
+    set_user_pf_options, PipeflowNotConverged
+from pandapipes.pf.result_extraction import extract_all_results, extract_results_active_pit
+from pandapipes.pipeflow import newton_raphson, solve_hydraulics, load_continuation
+
+try:
+    import pandaplan.core.pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+def compile_pipeflow(net, **kwargs):
+    """
+    Prepares the hydraulic calculation of a net for repeated solves with changing set points \
+    (c.f. :class:`PipeflowModel`).
+
+    :param net: The pandapipes net for which to compile the pipeflow
+    :type net: pandapipesNet
+    :param kwargs: Options controlling the solver behaviour (c.f. :func:`init_options`)
+    :return: model - The compiled pipeflow model
+    :rtype: PipeflowModel
+
+    :Example:
+        >>> model = compile_pipeflow(net)
+        >>> model.solve(sink=[0.1, 0.2], ext_grid=[5.])
+        >>> net.res_junction
+
+    """
+    return PipeflowModel(net, **kwargs)
+
+
+class PipeflowModel:
+    """
+    A hydraulic pipeflow with frozen topology and options. The options, the lookups, the pit, \
+    the connectivity check and the active pit are created once when the model is compiled. The \
+    sparsity structure of the system matrix and the fill-reducing ordering of the factorization \
+    are stored in the internal data of the model and reused in all solves (the options \
+    **only_update_hydraulic_matrix** and **reuse_factorization** are set). Each solve only \
+    updates the loads and the pressures of the active node pit from the given set points (c.f. \
+    :func:`pandapipes.pf.pipeflow_batch.get_scenario_node_states`) and performs the \
+    Newton-Raphson iterations and the result extraction.
+
+    The set points of constant flow components (e.g. sinks and sources, mdot_kg_per_s) and \
+    external grids (p_bar) can be changed, they are also written to the tables of the net. All \
+    other changes of the net require a new model. Changes of the structure (the indices, node \
+    references, in-service, open and control states and types of all component tables, c.f. \
+    :func:`pandapipes.pf.incremental_pit.get_structure_fingerprint`) are detected by each solve and raise an error. If the \
+    option **init** is "flat", every solve starts from the initial state of the pit, otherwise \
+    from the results of the last converged solve. Islands cannot be solved separately (option \
+    **solve_islands**).
+    """
+
+    def __init__(self, net, **kwargs):
+        if kwargs.get("mode", "hydraulics") != "hydraulics":
+            raise UserWarning("The compiled pipeflow is only available for the mode "
+                              "'hydraulics'.")
+        previous_state = get_previous_state(net)
+        init_options(net, {"net": net, "kwargs": kwargs})
+        if get_net_option(net, "solve_islands"):
+            raise UserWarning("The compiled pipeflow is not available with the option "
+                              "'solve_islands'.")
+        net["_options"].update({"only_update_hydraulic_matrix": True, "reuse_factorization": True})
+        init_all_result_tables(net)
+        create_lookups(net)
+        initialize_pit(net)
+        initialize_pit_from_previous_state(net, previous_state)
+        identify_active_nodes_branches(net)
+        reduce_pit(net, mode="hydraulics")
+
+        self.net = net
+        self._structure = {key: net[key] for key in ["_options", "_lookups", "_pit", "_active_pit"]}
+        self._structure["_internal_data"] = dict()
+        self._initial_state = (net["_active_pit"]["node"].copy(),
+                               net["_active_pit"]["branch"][:, MDOTINIT].copy())
+        self._fingerprint = get_structure_fingerprint(net)
+        self._setpoint_columns = {comp.table_name(): get_setpoint_column(comp)
+                                  for comp in net["component_list"]
+                                  if get_setpoint_column(comp) is not None}
+        self._base_setpoints = {table: net[table][col].values.copy()
+                                for table, col in self._setpoint_columns.items()}
+        self.setpoints = {table: values.copy() for table, values in self._base_setpoints.items()}
+        self._setpoint_mapping = get_setpoint_mapping(net, self._setpoint_columns)
+        self._warm_start = False
+
+    def solve(self, extract_results=True, **setpoints):
+        """
+        Performs the hydraulic calculation for the given set points. Set points that are not \
+        given keep the value of the last solve.
+
+        :param extract_results: If True, the results are written to the result tables of the \
+            net, otherwise only the internal structure is updated and the results can be \
+            extracted later with :meth:`extract_results`
+        :type extract_results: bool, default True
+        :param setpoints: The new set points as arrays with one value per row of the table, \
+            given by the table name (e.g. sink=[0.1, 0.2], ext_grid=[5.])
+        :return: No output
+        """
+        net = self.net
+        if get_structure_fingerprint(net) != self._fingerprint:
+            raise UserWarning("The structure of the net changed since the pipeflow was compiled. "
+                              "Please compile the pipeflow again.")
+        for table, values in setpoints.items():
+            if table not in self.setpoints:
+                raise UserWarning("Set points are only available for constant flow components "
+                                  "and external grids, not for the table %s." % table)
+            values = np.array(values, dtype=np.float64).ravel()
+            if len(values) != len(self.setpoints[table]):
+                raise UserWarning("%d set points were given for the %d elements of the table %s."
+                                  % (len(values), len(self.setpoints[table]), table))
+            self.setpoints[table] = values
+        net.update(self._structure)
+        net.converged = False
+
+        initial_node_pit, initial_mdot = self._initial_state
+        loads, pressures = get_scenario_node_states(
+            net, {table: values[np.newaxis] for table, values in self.setpoints.items()},
+            initial_node_pit, self._base_setpoints, self._setpoint_mapping)
+        node_pit = net["_active_pit"]["node"]
+        branch_pit = net["_active_pit"]["branch"]
+        if get_net_option(net, "init") == "flat" or not self._warm_start:
+            node_pit[:, PINIT] = initial_node_pit[:, PINIT]
+            branch_pit[:, MDOTINIT] = initial_mdot
+        node_pit[:, LOAD] = loads[0]
+        fixed = node_pit[:, NODE_TYPE] == P
+        node_pit[fixed, PINIT] = pressures[0, fixed]
+
+        vars = ['mdot', 'p']
+        tol_m, tol_p = get_net_options(net, 'tol_m', 'tol_p')
+        solve = partial(newton_raphson, net, solve_hydraulics, 'hydraulics', vars, [tol_m, tol_p],
+                        ['branch', 'node'], 'max_iter_hyd')
+        if get_net_option(net, "load_continuation"):
+            load_continuation(net, solve)
+        else:
+            solve()
+        self._warm_start = net.converged
+        if not net.converged:
+            raise PipeflowNotConverged("The hydraulic calculation did not converge to a solution.")
+        set_user_pf_options(net, hyd_flag=True)
+        if extract_results:
+            self.extract_results()
+
+    def extract_results(self):
+        """
+        Writes the set points and the results of the last solve to the tables of the net.
+
+        :return: No output
+        """
+        net = self.net
+        for table, values in self.setpoints.items():
+            net[table][self._setpoint_columns[table]] = values
+        net.update(self._structure)
+        extract_results_active_pit(net, mode="hydraulics")
+        extract_all_results(net, "hydraulics")
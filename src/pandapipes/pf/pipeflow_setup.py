@@ -3,6 +3,7 @@
 # Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
 
 import copy
+import hashlib
 import inspect
 
 import numpy as np
@@ -10,10 +11,12 @@ from pandapower.auxiliary import ppException
 from scipy.sparse import coo_matrix, csgraph
 
 from pandapipes.idx_branch import FROM_NODE, TO_NODE, branch_cols, \
-    ACTIVE as ACTIVE_BR, MDOTINIT, FROM_NODE_T, TO_NODE_T
-from pandapipes.idx_node import NODE_TYPE, P, NODE_TYPE_T, node_cols, T, ACTIVE as ACTIVE_ND, \
-    TABLE_IDX as TABLE_IDX_ND, ELEMENT_IDX as ELEMENT_IDX_ND
-from pandapipes.pf.internals_toolbox import _sum_by_group
+    ACTIVE as ACTIVE_BR, MDOTINIT, FROM_NODE_T, TO_NODE_T, TOUTINIT, \
+    ELEMENT_IDX as ELEMENT_IDX_BR
+from pandapipes.idx_node import NODE_TYPE, P, PC, NODE_TYPE_T, node_cols, T, ACTIVE as ACTIVE_ND, \
+    TABLE_IDX as TABLE_IDX_ND, ELEMENT_IDX as ELEMENT_IDX_ND, PINIT, TINIT
+from pandapipes.pf.incremental_connectivity import create_adjacency, update_connectivity
+from pandapipes.pf.internals_toolbox import _sum_by_index
 from pandapipes.properties.fluids import get_fluid
 
 try:
@@ -39,8 +42,23 @@ default_options = {"friction_model": "nikuradse", "tol_p": 1e-5, "tol_m": 1e-5,
                    "nonlinear_method": "constant", "mode": "hydraulics",
                    "ambient_temperature": 293.15, "check_connectivity": True,
                    "max_iter_colebrook": 10, "only_update_hydraulic_matrix": False,
+                   "only_update_heat_matrix": False,
                    "reuse_internal_data": False, "use_numba": True,
-                   "quit_on_inconsistency_connectivity": False, "calc_compression_power": True}
+                   "quit_on_inconsistency_connectivity": False, "calc_compression_power": True,
+                   "reuse_factorization": False, "linear_solver": "spsolve",
+                   "permc_spec": "COLAMD", "krylov_tol": 1e-10, "krylov_max_iter": 1000,
+                   "ilu_drop_tol": 1e-5, "ilu_fill_factor": 10, "hydraulic_formulation": "auto",
+                   "krylov_preconditioner": "ilu", "krylov_block_size": 2000,
+                   "krylov_restart": 50,
+                   "heat_formulation": "full", "jacobian_update": "always",
+                   "jacobian_update_interval": 5,
+                   "jacobian_stagnation_ratio": 0.5, "linesearch_max_backtracks": 10,
+                   "linesearch_armijo": 1e-4, "linesearch_memory": 3, "init": "flat",
+                   "solve_islands": False, "island_workers": 1, "load_continuation": False,
+                   "continuation_initial_step": 0.25, "continuation_max_solves": 10,
+                   "bidirectional_coupling": "alternating", "bidirectional_acceleration": "none",
+                   "acceleration_memory": 3, "callbacks": None, "incremental_pit_update": False,
+                   "connectivity_cache": False, "incremental_connectivity": False}
 
 
 def get_net_option(net, option_name):
@@ -87,10 +105,60 @@ def set_net_option(net, option_name, option_value):
     net["_options"][option_name] = option_value
 
 
-def warn_high_index(element_name, element_length, max_element_index):
-    if (element_length > 100 and max_element_index > 1000 * element_length) \
-            or (element_length <= 100 and max_element_index > 50000):
-        logger.warning("High index in %s table!!!" % element_name)
+class IndexLookup:
+    """
+    Lookup from the indices of a component table (e.g. junction indices) to the positions in the \
+    pit. It is indexed like an array (lookup[indices]), indices that are not in the table raise \
+    a KeyError. If the indices are compact, a dense array over all indices up to the maximum \
+    index is used. Otherwise (e.g. for large identifiers from external systems), the positions \
+    are found by a binary search in the sorted indices, so that the memory only depends on the \
+    number of elements and not on the index values.
+
+    :param indices: The indices of the table elements
+    :type indices: np.array
+    :param positions: The positions of the table elements in the pit
+    :type positions: np.array
+    """
+
+    # a dense array is used if it is at most DENSE_RATIO times as long as the table or shorter than
+    # DENSE_MIN_LENGTH
+    DENSE_RATIO = 2
+    DENSE_MIN_LENGTH = 1000
+
+    def __init__(self, indices, positions):
+        indices = np.asarray(indices, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int32)
+        order = np.argsort(indices, kind="stable")
+        self.indices = indices[order]
+        self.positions = positions[order]
+        self._dense = None
+        if len(indices) and self.indices[0] >= 0 and self.indices[-1] < max(
+                self.DENSE_RATIO * len(indices), self.DENSE_MIN_LENGTH):
+            self._dense = -np.ones(self.indices[-1] + 1, dtype=np.int32)
+            self._dense[self.indices] = self.positions
+
+    @property
+    def is_dense(self):
+        return self._dense is not None
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        key = np.asarray(key, dtype=np.int64)
+        if self._dense is not None:
+            positions = self._dense[np.clip(key, 0, len(self._dense) - 1)]
+            missing = (positions < 0) | (key < 0) | (key >= len(self._dense))
+        elif not len(self.indices):
+            positions = np.full(key.shape, -1, dtype=np.int32)
+            missing = np.ones(key.shape, dtype=bool)
+        else:
+            loc = np.minimum(np.searchsorted(self.indices, key), len(self.indices) - 1)
+            positions = self.positions[loc]
+            missing = self.indices[loc] != key
+        if np.any(missing):
+            raise KeyError("The indices %s are not in the lookup" % np.unique(key[missing]))
+        return positions[()]
 
 
 def add_table_lookup(table_lookup, table_name, table_number):
@@ -167,7 +235,8 @@ def get_lookup(net, pit_type="node", lookup_type="index"):
     lookup_type = lookup_type.lower()
     all_lookup_types = ["index", "table", "from_to", "active_hydraulics", "active_heat_transfer",
                         "length", "from_to_active_hydraulics", "from_to_active_heat_transfer",
-                        "index_active_hydraulics", "index_active_heat_transfer"]
+                        "index_active_hydraulics", "index_active_heat_transfer",
+                        "rows_active_hydraulics", "rows_active_heat_transfer"]
     if lookup_type not in all_lookup_types:
         type_names = "', '".join(all_lookup_types)
         logger.error("No lookup type '%s' exists. Please choose one of '%s'."
@@ -243,17 +312,134 @@ def init_options(net, local_parameters):
 
         - **nonlinear_method** (str): "constant" - The option of how the damping factor **alpha** \
                 is determined in each iteration. It can be "constant" (i.e. **alpha** is always the\
-                 same in each iteration) or "automatic", in which case **alpha** is adapted \
-                 automatically with respect to the convergence behaviour.
+                 same in each iteration), "automatic", in which case **alpha** is adapted \
+                 automatically with respect to the convergence behaviour, or "linesearch", in \
+                 which case the step length for all unknowns is determined by a backtracking line \
+                 search with the Armijo condition on the norm of the residual.
+
+        - **linesearch_max_backtracks** (int): 10 - The maximum number of step length reductions\
+                in the line search.
+
+        - **linesearch_armijo** (float): 1e-4 - The parameter of the Armijo condition\
+                (sufficient decrease of the residual norm) in the line search.
+
+        - **linesearch_memory** (int): 3 - The number of previous iterations whose maximum\
+                residual norm is the reference of the (non-monotone) Armijo condition.
+
+        - **init** (str): "flat" - The initialization of the unknowns. "flat" starts from the\
+                junction values (pn_bar, tfluid_k) and a fixed initial mass flow, "results" starts\
+                from the results of the last pipeflow (taken from the last internal structure or,\
+                if not available, from the result tables) and "auto" uses the results only if the\
+                last pipeflow converged.
 
         - **mode** (str): "hydraulics" - Define the calculation mode: what shall be calculated - \
                 solely hydraulics ('hydraulics'), solely heat transfer('heat') or both combined sequentially \
                 ('sequential') or bidirectionally ('bidirectional').
 
-        - **only_update_hydraulic_matrix** (bool): False - If True, the system matrix is not \
-                created in every iteration, but only the data is updated according to a lookup that\
-                is identified in the first iteration. This speeds up calculation, but has not yet\
-                been tested extensively.
+        - **bidirectional_coupling** (str): "alternating" - The coupling of hydraulics and heat\
+                transfer in the bidirectional mode. "alternating" performs one hydraulic and one\
+                thermal Newton step in each iteration, "monolithic" (experimental) solves one\
+                coupled Newton system including the analytic cross derivatives (temperature\
+                dependence of density, viscosity and heat capacity in the hydraulic equations and\
+                mass flow dependence of the thermal equations) on a common active pit. It\
+                converges where the alternating scheme oscillates (e.g. for heat consumers with\
+                fixed return temperature), but does not need fewer iterations on weakly coupled\
+                networks.
+
+        - **bidirectional_acceleration** (str): "none" - The acceleration of the outer iteration\
+                of the "alternating" bidirectional coupling, which is treated as a fixed-point\
+                iteration over the mass flows, pressures and temperatures. "anderson" uses\
+                Anderson acceleration with the last **acceleration_memory** iterates, "aitken"\
+                uses Aitken's dynamic relaxation. The acceleration is only applied if the plain\
+                iteration stagnates or oscillates, accelerated iterates that do not decrease the\
+                residual are rejected. The inner Newton steps are not changed.
+
+        - **acceleration_memory** (int): 3 - The number of previous iterates considered by the\
+                Anderson acceleration of the bidirectional coupling.
+
+        - **only_update_hydraulic_matrix** (bool): False - If True, the sparsity structure of the\
+                hydraulic system matrix is stored in the internal data and only the data of the\
+                matrix is updated in the following iterations. The structure is rebuilt\
+                automatically if the topology of the active pit or the node and branch types\
+                change.
+
+        - **only_update_heat_matrix** (bool): False - Same as **only_update_hydraulic_matrix**\
+                for the system matrix of the heat transfer calculation. The structure is also\
+                rebuilt automatically if the flow direction of a branch changes.
+
+        - **reuse_factorization** (bool): False - If True, the fill-reducing ordering of the sparse\
+                LU factorization is only determined once for each sparsity pattern of the system\
+                matrix. In the following iterations, only the numerical factorization is\
+                performed. If **reuse_internal_data** is also set, the ordering is kept for\
+                repeated pipeflow calls on the same net.
+
+        - **linear_solver** (str): "spsolve" - The backend used to solve the linear system in\
+                each Newton step. Possible solvers are "spsolve" (scipy's default), "superlu"\
+                (SuperLU with the ordering given by **permc_spec**), "umfpack" (requires\
+                scikit-umfpack), "gmres" and "bicgstab" (iterative solvers with an ILU\
+                preconditioner). The accumulated solution time and the fill-in of the\
+                factorization are stored in the internal results.
+
+        - **permc_spec** (str): "COLAMD" - The column ordering of the "superlu" solver\
+                ("NATURAL", "MMD_ATA", "MMD_AT_PLUS_A" or "COLAMD").
+
+        - **krylov_tol** (float): 1e-10 - The relative tolerance of the iterative linear solvers.
+
+        - **krylov_max_iter** (int): 1000 - The maximum number of iterations of the iterative\
+                linear solvers.
+
+        - **ilu_drop_tol** (float): 1e-5 - The drop tolerance of the ILU preconditioner.
+
+        - **ilu_fill_factor** (float): 10 - The maximum fill factor of the ILU preconditioner.
+
+        - **hydraulic_formulation** (str): "auto" - The formulation of the linear hydraulic system\
+                in each Newton step. "full" solves for all node pressures and branch mass flows\
+                together, "schur" eliminates the branch mass flows analytically, solves the much\
+                smaller node pressure system (Schur complement) and recovers the mass flows by\
+                back-substitution. "radial" solves the system of a radial network (a tree supplied\
+                by a single external grid) by a backward / forward sweep at linear cost and falls\
+                back to "full" for other networks. "loop" solves for the mass flow corrections of\
+                the loops of a spanning tree only (one unknown per independent loop) and recovers\
+                all other unknowns by tree sweeps, which is suited for weakly meshed networks with\
+                a single external grid. "krylov" solves the system matrix-free with GMRES: the\
+                products with the jacobian are evaluated from the derivatives in the pit without\
+                assembling a system matrix, so that the memory scales with the pit instead of the\
+                fill-in of a factorization (c.f. **krylov_preconditioner**). "auto" selects\
+                "radial" if the connectivity check identified the network as radial and "full"\
+                otherwise.
+
+        - **krylov_preconditioner** (str): "ilu" - The preconditioner of the "krylov" hydraulic\
+                formulation, which eliminates the branch mass flows and approximates the inverse\
+                of the remaining node system by an incomplete LU factorization ("ilu", c.f.\
+                **ilu_drop_tol** and **ilu_fill_factor**) or by the exact factorization of its\
+                diagonal blocks ("block_jacobi", c.f. **krylov_block_size**).
+
+        - **krylov_block_size** (int): 2000 - The number of unknowns per block of the\
+                "block_jacobi" preconditioner.
+
+        - **krylov_restart** (int): 50 - The number of GMRES iterations between restarts in the\
+                "krylov" hydraulic formulation, i.e. the number of stored Krylov vectors.
+
+        - **heat_formulation** (str): "full" - The formulation of the linear heat transfer\
+                system in each Newton step. "full" factorizes the whole system. "upwind"\
+                (experimental) computes the node and outlet temperatures in flow direction level\
+                by level, starting at the nodes with fixed temperature, and only solves\
+                circulating loops as coupled sparse systems.
+
+        - **jacobian_update** (str): "always" - The policy for the factorization of the jacobian.\
+                "always" factorizes the jacobian in every Newton iteration, "chord" reuses the\
+                factorization for several iterations and "broyden" corrects it by Broyden's\
+                rank-one updates. In both quasi-Newton modes, the factorization is renewed after\
+                **jacobian_update_interval** iterations and whenever the residual stagnates.\
+                Combined with **reuse_internal_data**, the last factorization is kept for the\
+                next pipeflow (e.g. in time series).
+
+        - **jacobian_update_interval** (int): 5 - The maximum number of iterations for which a\
+                factorization of the jacobian is reused in the quasi-Newton modes.
+
+        - **jacobian_stagnation_ratio** (float): 0.5 - If the norm of the residual is larger\
+                than this ratio times the norm of the previous residual, the factorization of\
+                the jacobian is renewed in the quasi-Newton modes.
 
         - **check_connectivity** (bool): True - If True, a connectivity check is performed at the\
                 beginning of the pipeflow and parts of the net that are not connected to external\
@@ -264,6 +450,65 @@ def init_options(net, local_parameters):
                 that out of service nodes are connected to in service branches. If that is the case\
                 and the flag is set to False, the connected nodes are activated.
 
+        - **solve_islands** (bool): False - If True, the hydraulic calculation is performed\
+                separately for each island (part of the net that is supplied by its own external\
+                grids) identified in the connectivity check. Each island has its own convergence\
+                status (c.f. the internal results "islands_converged_hydraulics"), the results of\
+                islands that do not converge are their last iterate with a warning, and an error\
+                is only raised if no island converges. Requires **check_connectivity**, not\
+                available in the bidirectional mode.
+
+        - **island_workers** (int): 1 - The number of threads that solve the islands in parallel\
+                if **solve_islands** is set. With 1, the islands are solved one after another.
+
+        - **load_continuation** (bool): False - If True, the hydraulic calculation ramps the node\
+                loads and the pressure lifts of pumps and compressors from 0 up to the target in\
+                adaptive steps, each starting from the converged state of the previous one. Steps\
+                that do not converge are repeated with half the step size. With\
+                **solve_islands**, each island has its own continuation. Not applied to the\
+                bidirectional mode.
+
+        - **continuation_initial_step** (float): 0.25 - The first increment of the load factor\
+                in the load continuation, i.e. the first (partial) load level that is solved.\
+                With 1, the target is tried directly and the load is only ramped up if it fails.
+
+        - **continuation_max_solves** (int): 10 - The maximum number of Newton-Raphson solves\
+                (including the repeated steps) of the load continuation.
+
+        - **callbacks** (list): None - Functions that are called after each iteration of the\
+                Newton-Raphson solver with the net and the iteration number, residual norm,\
+                errors per variable, damping factor, convergence state and timings as keyword\
+                arguments (c.f. :func:`pandapipes.pipeflow.call_iteration_callbacks`). A callback\
+                can terminate the solver by returning True. The callbacks are not copied.
+
+        - **incremental_pit_update** (bool): False - If True, the pit, the lookups and the\
+                hydraulic connectivity are stored and reused in the next pipeflow if only set\
+                points changed (the mass flows of sinks and sources, the pressures of external\
+                grids and the controlled pressures of pressure controllers). The set points are\
+                compared with the values of the last pipeflow and only the affected columns of\
+                the pit are updated. Changed options or changed structural columns (indices, node\
+                references, in service and open states, types) lead to a complete rebuild.\
+                Changes of other parameters (e.g. pipe lengths) are not detected and have to be\
+                signalled by :func:`pandapipes.pf.incremental_pit.invalidate_pit_structure`.
+
+        - **connectivity_cache** (bool): False - If True, the result of the connectivity check\
+                is stored in the net and the graph search is only repeated if the branches, the\
+                active nodes and branches or the slack nodes changed (c.f.\
+                :func:`cached_connectivity_search`). The number of cache hits and misses of each\
+                pipeflow is stored in the internal results as "connectivity_cache_hits" and\
+                "connectivity_cache_misses". The cache is not saved with the net, and the\
+                information on nodes that are out of service or not connected to a slack is not\
+                logged again for results taken from the cache.
+
+        - **incremental_connectivity** (bool): False - If True and only some branches were\
+                switched (e.g. valves or pipes in service) since the last connectivity check, the\
+                connected nodes are updated by local searches around the switched branches\
+                instead of a search of the whole network (c.f.\
+                :func:`pandapipes.pf.incremental_connectivity.update_connectivity`). Only the\
+                graph search is local, the check of the cache and the evaluation of the result\
+                remain linear in the size of the network. Requires **connectivity_cache**. The number of incremental updates is stored in the\
+                internal results as "connectivity_incremental_updates".
+
         - **use_numba** (bool): True - If True, use numba for more efficient internal calculations
 
     :param net: The pandapipesNet for which the options are initialized
@@ -291,9 +536,14 @@ def init_options(net, local_parameters):
 
     # the third layer is the user defined pipeflow options
     if "user_pf_options" in net and len(net.user_pf_options) > 0:
-        opts = _iteration_check(net.user_pf_options)
+        user_options = dict(net.user_pf_options)
+        # the callbacks might hold a state (e.g. recorded iterates) and must not be copied
+        user_callbacks = user_options.pop("callbacks", None)
+        opts = _iteration_check(user_options)
         opts = _check_mode(opts)
         net["_options"].update(opts)
+        if user_callbacks is not None:
+            net["_options"]["callbacks"] = list(user_callbacks)
 
 
     # the last layer is the layer of passeed parameters by the user, it is defined as the local
@@ -305,12 +555,19 @@ def init_options(net, local_parameters):
             continue
         params[k] = v
 
-    opts = _iteration_check(local_parameters["kwargs"])
+    kwargs = dict(local_parameters["kwargs"])
+    callbacks = kwargs.pop("callbacks", None)
+    opts = _iteration_check(kwargs)
     opts = _check_mode(opts)
     params.update(opts)
     net["_options"].update(params)
+    if callbacks is not None:
+        net["_options"]["callbacks"] = list(callbacks)
     net["_options"]["fluid"] = get_fluid(net).name
-    if not net["_options"]["only_update_hydraulic_matrix"]:
+    if not net["_options"]["only_update_hydraulic_matrix"] \
+            and not net["_options"]["only_update_heat_matrix"] \
+            and not net["_options"]["reuse_factorization"] \
+            and net["_options"]["jacobian_update"] == "always":
         net["_options"]["reuse_internal_data"] = False
 
     if not numba_installed:
@@ -405,6 +662,144 @@ def initialize_pit(net):
                        "Without any nodes, you are not able to conduct a pipeflow!")
         return
 
+def get_previous_state(net):
+    """
+    Collects the internal structure and the calculation settings of the last pipeflow of the \
+    given net. This has to be done before the options, lookups and the pit are initialized for \
+    the new pipeflow, as they are replaced.
+
+    :param net: The pandapipes net
+    :type net: pandapipesNet
+    :return: previous_state - dictionary with the last pit, lookups, calculation mode and \
+        convergence flag
+    :rtype: dict
+    """
+    previous_state = {"pit": net.get("_pit", None), "lookups": net.get("_lookups", None),
+                      "mode": net.get("_options", dict()).get("mode", None),
+                      "converged": bool(net.get("converged", False)), "results": dict()}
+    if previous_state["pit"] is None or previous_state["lookups"] is None:
+        # the result tables are reset before the pit is initialized, so they are copied
+        for key in net.keys():
+            if key.startswith("res_") and hasattr(net[key], "columns"):
+                columns = [c for c in ["p_bar", "t_k", "mdot_from_kg_per_s", "t_to_k"]
+                           if c in net[key].columns]
+                if len(columns) and len(net[key]):
+                    previous_state["results"][key[4:]] = net[key][columns].copy()
+    return previous_state
+
+
+def initialize_pit_from_previous_state(net, previous_state):
+    """
+    Overwrites the initial values of the pit (PINIT, TINIT, MDOTINIT and TOUTINIT) with the \
+    results of the last pipeflow, depending on the option **init**. The results are taken from \
+    the pit of the last pipeflow if available (c.f. :func:`get_previous_state`), otherwise from \
+    the result tables. Values of nodes with fixed pressure or temperature (e.g. external grids or \
+    pressure controllers) are not overwritten, so that changed set points are respected. \
+    Temperatures are only taken over if the last pipeflow included the heat transfer calculation.
+
+    :param net: The pandapipes net with the initialized pit
+    :type net: pandapipesNet
+    :param previous_state: The state of the last pipeflow (c.f. :func:`get_previous_state`)
+    :type previous_state: dict
+    :return: No output
+    """
+    init = get_net_option(net, "init")
+    if init == "flat":
+        return
+    if init not in ["results", "auto"]:
+        raise UserWarning("The initialization %s is not available. Please choose one of 'flat', "
+                          "'results' or 'auto'." % init)
+    if init == "auto" and not previous_state["converged"]:
+        return
+    consider_heat = previous_state["mode"] in ["heat", "sequential", "bidirectional", "all"]
+    if previous_state["pit"] is not None and previous_state["lookups"] is not None:
+        _init_from_previous_pit(net, previous_state["pit"], previous_state["lookups"],
+                                consider_heat)
+    elif not _init_from_result_tables(net, previous_state["results"], consider_heat) \
+            and init == "results":
+        logger.warning("No results of a previous pipeflow are available, the pipeflow starts "
+                       "from the flat initial values.")
+
+
+def _matching_rows(net, new_pit, new_ft, old_pit, old_ft, table, element_col):
+    new_f, new_t = new_ft[table]
+    old_f, old_t = old_ft[table]
+    new_elements = new_pit[new_f:new_t, element_col]
+    old_elements = old_pit[old_f:old_t, element_col]
+    if np.array_equal(new_elements, old_elements):
+        return np.arange(new_f, new_t), np.arange(old_f, old_t)
+    # rows can only be assigned via the element index if every element has exactly one row
+    if table not in net or len(np.unique(new_elements)) != len(new_elements) \
+            or len(np.unique(old_elements)) != len(old_elements):
+        return None, None
+    common, new_pos, old_pos = np.intersect1d(new_elements, old_elements, return_indices=True)
+    return new_pos + new_f, old_pos + old_f
+
+
+def _copy_initial_values(new_pit, new_rows, old_pit, old_rows, column, fixed_mask=None):
+    values = old_pit[old_rows, column]
+    use = np.isfinite(values)
+    if fixed_mask is not None:
+        use &= ~fixed_mask[new_rows]
+    new_pit[new_rows[use], column] = values[use]
+
+
+def _init_from_previous_pit(net, old_pit, old_lookups, consider_heat):
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    fixed_p = np.isin(node_pit[:, NODE_TYPE], [P, PC])
+    fixed_t = node_pit[:, NODE_TYPE_T] == T
+    for pit_type, pit, old_ft, new_ft, element_col in [
+            ("node", node_pit, old_lookups["node_from_to"], net["_lookups"]["node_from_to"],
+             ELEMENT_IDX_ND),
+            ("branch", branch_pit, old_lookups["branch_from_to"],
+             net["_lookups"]["branch_from_to"], ELEMENT_IDX_BR)]:
+        for table, ft in new_ft.items():
+            if ft is None or old_ft.get(table, None) is None:
+                continue
+            new_rows, old_rows = _matching_rows(net, pit, new_ft, old_pit[pit_type], old_ft,
+                                                table, element_col)
+            if new_rows is None:
+                continue
+            if pit_type == "node":
+                _copy_initial_values(pit, new_rows, old_pit["node"], old_rows, PINIT, fixed_p)
+                if consider_heat:
+                    _copy_initial_values(pit, new_rows, old_pit["node"], old_rows, TINIT,
+                                         fixed_t)
+            else:
+                _copy_initial_values(pit, new_rows, old_pit["branch"], old_rows, MDOTINIT)
+                if consider_heat:
+                    _copy_initial_values(pit, new_rows, old_pit["branch"], old_rows, TOUTINIT)
+
+
+def _init_from_result_tables(net, results, consider_heat):
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    fixed_p = np.isin(node_pit[:, NODE_TYPE], [P, PC])
+    fixed_t = node_pit[:, NODE_TYPE_T] == T
+    initialized = False
+    for pit, ft_lookup, element_col, columns in [
+            (node_pit, net["_lookups"]["node_from_to"], ELEMENT_IDX_ND,
+             [("p_bar", PINIT, fixed_p, True), ("t_k", TINIT, fixed_t, consider_heat)]),
+            (branch_pit, net["_lookups"]["branch_from_to"], ELEMENT_IDX_BR,
+             [("mdot_from_kg_per_s", MDOTINIT, None, True),
+              ("t_to_k", TOUTINIT, None, consider_heat)])]:
+        for table, ft in ft_lookup.items():
+            res_table = results.get(table, None)
+            if ft is None or res_table is None:
+                continue
+            rows = np.arange(*ft)
+            for res_col, pit_col, fixed_mask, use in columns:
+                if not use or res_col not in res_table.columns:
+                    continue
+                values = res_table[res_col].reindex(pit[rows, element_col]).values \
+                    .astype(np.float64)
+                valid = np.isfinite(values)
+                if fixed_mask is not None:
+                    valid &= ~fixed_mask[rows]
+                pit[rows[valid], pit_col] = values[valid]
+                initialized |= np.any(valid)
+    return initialized
+
+
 def create_empty_pit(net):
     """
     Creates an empty internal structure which is called pit (pandapipes internal tables). The\
@@ -457,8 +852,10 @@ def create_lookups(net):
       - branch_table: Dictionary to determine indices for branch component tables (e.g.\
                       {"pipe": 0, "valve": 1}). Can be arbitrary and strongly depends on the\
                       component order given by `get_component_list`.
-      - node_index: Lookup from component index (e.g. junction 2) to pit index (e.g. 0) for nodes.
-      - branch_index: Lookup from component index (e.g. pipe 1) to pit index (e.g. 5) for branches.
+      - node_index: Lookup from component index (e.g. junction 2) to pit index (e.g. 0) for nodes\
+                    (c.f. :class:`IndexLookup`).
+      - branch_index: Lookup from component index (e.g. pipe 1) to pit index (e.g. 5) for branches\
+                      (c.f. :class:`IndexLookup`).
       - internal_nodes_lookup: Lookup for internal nodes of branch components that makes result\
                                extraction a lot easier.
 
@@ -499,7 +896,10 @@ def identify_active_nodes_branches(net, hydraulic=True):
         by the fluid and a simple rule to make sure that active nodes are connected to at least one\
         traversed branch\
     The result of this connectivity search is stored in the lookups (e.g. as \
-    net["_lookups"]["node_active_hydraulics"])
+    net["_lookups"]["node_active_hydraulics"]). In case of hydraulics, the lookup \
+    net["_lookups"]["radial_hydraulics"] additionally states whether the active network is radial \
+    (c.f. :func:`perform_connectivity_search`). Without connectivity check, the network is never \
+    considered radial, as the active nodes are not guaranteed to be supplied.
 
     :param net: the pandapipes net for which to identify the connectivity
     :type net: pandapipes.pandapipesNet
@@ -524,6 +924,7 @@ def identify_active_nodes_branches(net, hydraulic=True):
             # if connectivity check is switched off, still consider oos elements
             nodes_connected = node_pit[:, ACTIVE_ND].astype(np.bool_)
             branches_connected = branch_pit[:, ACTIVE_BR].astype(np.bool_)
+            net["_lookups"]["radial_hydraulics"] = False
     else:
         # connectivity check for heat simulation (needs to consider branches with 0 velocity as
         # well)
@@ -533,21 +934,20 @@ def identify_active_nodes_branches(net, hydraulic=True):
                                                                      mode="heat_transfer")
         else:
             # if no full connectivity check is performed, all nodes that are not connected to the
-            # rest of the network wrt. flow can be identified by a more performant sum_by_group_call
-            # check for branches that are not traversed (for temperature calculation, this means
-            # that they are "out of service")
+            # rest of the network wrt. flow can be identified by a more performant count of the
+            # adjacent branches with flow (branches that are not traversed are "out of service"
+            # for the temperature calculation)
             branches_connected = get_lookup(net, "branch", "active_hydraulics") \
                                  & branches_connected_flow(branch_pit)
-            fn = branch_pit[:, FROM_NODE].astype(np.int32)
-            tn = branch_pit[:, TO_NODE].astype(np.int32)
-            fn_tn, flow = _sum_by_group(
-                get_net_option(net, "use_numba"), np.concatenate([fn, tn]),
-                np.concatenate([branches_connected, branches_connected]).astype(np.int32)
-            )
+            fn_tn = np.concatenate([branch_pit[:, FROM_NODE], branch_pit[:, TO_NODE]]) \
+                .astype(np.int32)
+            len_n = len(node_pit)
+            adjacent = np.bincount(fn_tn, minlength=len_n) > 0
+            flow = _sum_by_index(fn_tn, np.tile(branches_connected, 2), len_n)
             nodes_connected = np.copy(get_lookup(net, "node", "active_hydraulics"))
             # set nodes oos that are not connected to any branches with flow > 0 (0.1 is arbitrary
             # here, any value between 0 and 1 should work, excluding 0 and 1)
-            nodes_connected[fn_tn] = nodes_connected[fn_tn] & (flow > 0.1)
+            nodes_connected[adjacent] = nodes_connected[adjacent] & (flow[adjacent] > 0.1)
     mode = "hydraulics" if hydraulic else "heat_transfer"
     if np.all(~nodes_connected):
         mode = 'hydraulic' if hydraulic else 'heat transfer'
@@ -613,12 +1013,175 @@ def check_connectivity(net, branch_pit, node_pit, mode="hydraulics"):
                              & get_lookup(net, "node", "active_hydraulics")
         slacks = np.where((node_pit[:, NODE_TYPE_T] == T) & active_node_lookup)[0]
 
-    return perform_connectivity_search(net, node_pit, branch_pit, slacks, active_node_lookup,
-                                       active_branch_lookup, mode=mode)
+    if not get_net_option(net, "connectivity_cache"):
+        return perform_connectivity_search(net, node_pit, branch_pit, slacks, active_node_lookup,
+                                           active_branch_lookup, mode=mode)
+    return cached_connectivity_search(net, node_pit, branch_pit, slacks, active_node_lookup,
+                                      active_branch_lookup, mode=mode)
+
+
+def get_connectivity_fingerprint(net, node_pit, branch_pit, slack_nodes, active_node_lookup,
+                                 mode="hydraulics"):
+    """
+    Returns a hash of the inputs of the connectivity search (c.f. \
+    :func:`perform_connectivity_search`) except for the active branches, i.e. the from and to \
+    nodes of all branches, the active nodes, the slack nodes, the pressure controlled nodes and \
+    the options that influence the search. The active branches are compared directly, so that \
+    switched branches can be identified.
+
+    :param net: The pandapipesNet for which to perform the search
+    :type net: pandapipesNet
+    :param node_pit: Internal array with node entries
+    :type node_pit: np.array
+    :param branch_pit: Internal array with branch entries
+    :type branch_pit: np.array
+    :param slack_nodes: The indices of the slack nodes from which the search starts
+    :type slack_nodes: np.array
+    :param active_node_lookup: Mask of the nodes that are in service
+    :type active_node_lookup: np.array
+    :param mode: The mode of the calculation ("hydraulics" or "heat_transfer")
+    :type mode: str, default "hydraulics"
+    :return: fingerprint - The hash of the inputs
+    :rtype: bytes
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    options = tuple(get_net_options(net, "solve_islands", "quit_on_inconsistency_connectivity"))
+    fingerprint.update(repr((mode, len(node_pit), len(branch_pit), options)).encode())
+    pc_nodes = np.flatnonzero(node_pit[:, NODE_TYPE] == PC) if mode == "hydraulics" \
+        else np.array([], dtype=np.int64)
+    for array in [branch_pit[:, FROM_NODE].astype(np.int32),
+                  branch_pit[:, TO_NODE].astype(np.int32), np.packbits(active_node_lookup),
+                  np.asarray(slack_nodes, dtype=np.int64),
+                  pc_nodes.astype(np.int64)]:
+        fingerprint.update(array.tobytes())
+    return fingerprint.digest()
+
+
+def cached_connectivity_search(net, node_pit, branch_pit, slack_nodes, active_node_lookup,
+                               active_branch_lookup, mode="hydraulics"):
+    """
+    Performs the connectivity search (c.f. :func:`perform_connectivity_search`) only if its \
+    inputs changed since the last search of the same mode (c.f. \
+    :func:`get_connectivity_fingerprint`). The last result of each mode is kept in \
+    net["_connectivity_cache"] over several pipeflows together with the number of cache hits and \
+    misses. If the result is taken from the cache, the information on nodes that are set out of \
+    service or back in service is not logged again.
+
+    If only some branches were switched since the last search and the option \
+    **incremental_connectivity** is set, the reachable nodes are updated locally around the \
+    switched branches instead of searching the whole network (c.f. \
+    :func:`pandapipes.pf.incremental_connectivity.update_connectivity`). The number of nodes \
+    visited by the local searches is counted in the cache. Only the graph search is local: the \
+    fingerprint and the evaluation of the reachable nodes (c.f. :func:`evaluate_connectivity`) \
+    are still linear in the size of the network.
+
+    :param net: The pandapipesNet for which to perform the search
+    :type net: pandapipesNet
+    :param node_pit: Internal array with node entries
+    :type node_pit: np.array
+    :param branch_pit: Internal array with branch entries
+    :type branch_pit: np.array
+    :param slack_nodes: The indices of the slack nodes from which the search starts
+    :type slack_nodes: np.array
+    :param active_node_lookup: Mask of the nodes that are in service
+    :type active_node_lookup: np.array
+    :param active_branch_lookup: Mask of the branches that are in service
+    :type active_branch_lookup: np.array
+    :param mode: The mode of the calculation ("hydraulics" or "heat_transfer")
+    :type mode: str, default "hydraulics"
+    :return: (nodes_connected, branches_connected) - masks of the reachable nodes and branches
+    :rtype: tuple(np.array)
+    """
+    if "_connectivity_cache" not in net:
+        net["_connectivity_cache"] = {"hits": 0, "misses": 0, "incremental": 0, "visited": 0}
+    cache = net["_connectivity_cache"]
+    fingerprint = get_connectivity_fingerprint(net, node_pit, branch_pit, slack_nodes,
+                                               active_node_lookup, mode)
+    entry = cache.get(mode, None)
+    if entry is not None and entry["fingerprint"] == fingerprint \
+            and np.array_equal(entry["active_branches"], active_branch_lookup):
+        cache["hits"] += 1
+        net["_lookups"].update(entry["lookups"])
+        return np.copy(entry["nodes_connected"]), np.copy(entry["branches_connected"])
+
+    cache["misses"] += 1
+    from_nodes = branch_pit[:, FROM_NODE].astype(np.int32)
+    to_nodes = branch_pit[:, TO_NODE].astype(np.int32)
+    nodes_connected, adjacency = None, None
+    # the adjacency is kept as long as the topology does not change
+    if entry is not None and entry["fingerprint"] == fingerprint \
+            and get_net_option(net, "incremental_connectivity"):
+        adjacency = entry["adjacency"]
+        if adjacency is None:
+            adjacency = create_adjacency(from_nodes, to_nodes, len(node_pit))
+        slack_mask = np.zeros(len(node_pit), dtype=bool)
+        slack_mask[slack_nodes] = True
+        nodes_connected, n_visited = update_connectivity(
+            adjacency, entry["nodes_connected"], entry["active_branches"], active_branch_lookup,
+            from_nodes, to_nodes, slack_mask)
+        cache["visited"] += n_visited
+    if nodes_connected is not None:
+        cache["incremental"] += 1
+        nodes_connected, branches_connected = evaluate_connectivity(
+            net, node_pit, from_nodes, to_nodes, slack_nodes, nodes_connected,
+            active_node_lookup, active_branch_lookup, mode)
+    else:
+        nodes_connected, branches_connected = perform_connectivity_search(
+            net, node_pit, branch_pit, slack_nodes, active_node_lookup, active_branch_lookup,
+            mode=mode)
+    lookups = {key: net["_lookups"][key] for key in [
+        "radial_" + mode, "node_island_" + mode, "branch_island_" + mode,
+        "radial_islands_" + mode] if key in net["_lookups"]}
+    cache[mode] = {"fingerprint": fingerprint, "active_branches": np.copy(active_branch_lookup),
+                   "nodes_connected": np.copy(nodes_connected),
+                   "branches_connected": np.copy(branches_connected), "lookups": lookups,
+                   "adjacency": adjacency}
+    return nodes_connected, branches_connected
+
+
+def get_connectivity_cache_statistics(net):
+    """
+    Returns the number of connectivity searches that were taken from the cache (hits), that \
+    were performed (misses) and that were performed as incremental updates since the \
+    connectivity cache of the net was created (c.f. :func:`cached_connectivity_search`).
+
+    :param net: The pandapipesNet
+    :type net: pandapipesNet
+    :return: (hits, misses, incremental) - The number of cache hits, misses and incremental \
+        updates
+    :rtype: tuple(int)
+    """
+    cache = net.get("_connectivity_cache", dict())
+    return cache.get("hits", 0), cache.get("misses", 0), cache.get("incremental", 0)
 
 
 def perform_connectivity_search(net, node_pit, branch_pit, slack_nodes,
                                 active_node_lookup, active_branch_lookup, mode="hydraulics"):
+    """
+    Performs a breadth first search from a virtual node connected to all slack nodes and returns \
+    the nodes and branches that are reachable. In case of hydraulics, it is also stored in \
+    net["_lookups"]["radial_hydraulics"] whether the reachable network is a tree supplied by a \
+    single slack node without pressure controlled nodes, so that the hydraulic formulation \
+    "auto" can select the radial sweep (c.f. \
+    :func:`pandapipes.pf.linear_solver.factorize_radial`).
+
+    :param net: The pandapipesNet for which to perform the search
+    :type net: pandapipesNet
+    :param node_pit: Internal array with node entries
+    :type node_pit: np.array
+    :param branch_pit: Internal array with branch entries
+    :type branch_pit: np.array
+    :param slack_nodes: The indices of the slack nodes from which the search starts
+    :type slack_nodes: np.array
+    :param active_node_lookup: Mask of the nodes that are in service
+    :type active_node_lookup: np.array
+    :param active_branch_lookup: Mask of the branches that are in service
+    :type active_branch_lookup: np.array
+    :param mode: The mode of the calculation ("hydraulics" or "heat_transfer")
+    :type mode: str, default "hydraulics"
+    :return: (nodes_connected, branches_connected) - masks of the reachable nodes and branches
+    :rtype: tuple(np.array)
+    """
     len_nodes = len(node_pit)
     from_nodes = branch_pit[:, FROM_NODE].astype(np.int32)
     to_nodes = branch_pit[:, TO_NODE].astype(np.int32)
@@ -643,12 +1206,58 @@ def perform_connectivity_search(net, node_pit, branch_pit, slack_nodes,
     nodes_connected = np.zeros(len(active_node_lookup), dtype=bool)
     nodes_connected[reachable_nodes] = True
 
+    return evaluate_connectivity(net, node_pit, from_nodes, to_nodes, slack_nodes,
+                                 nodes_connected, active_node_lookup, active_branch_lookup, mode)
+
+
+def evaluate_connectivity(net, node_pit, from_nodes, to_nodes, slack_nodes, nodes_connected,
+                          active_node_lookup, active_branch_lookup, mode="hydraulics"):
+    """
+    Determines the connected branches from the nodes that are reachable from the slack nodes, \
+    stores the radial flag and the islands in the lookups (in case of hydraulics) and reports \
+    the nodes whose state differs from their in service state (c.f. \
+    :func:`perform_connectivity_search`).
+
+    :param net: The pandapipesNet for which the search was performed
+    :type net: pandapipesNet
+    :param node_pit: Internal array with node entries
+    :type node_pit: np.array
+    :param from_nodes: The from nodes of all branches
+    :type from_nodes: np.array
+    :param to_nodes: The to nodes of all branches
+    :type to_nodes: np.array
+    :param slack_nodes: The indices of the slack nodes from which the search started
+    :type slack_nodes: np.array
+    :param nodes_connected: Mask of the reachable nodes
+    :type nodes_connected: np.array
+    :param active_node_lookup: Mask of the nodes that are in service
+    :type active_node_lookup: np.array
+    :param active_branch_lookup: Mask of the branches that are in service
+    :type active_branch_lookup: np.array
+    :param mode: The mode of the calculation ("hydraulics" or "heat_transfer")
+    :type mode: str, default "hydraulics"
+    :return: (nodes_connected, branches_connected) - masks of the reachable nodes and branches
+    :rtype: tuple(np.array)
+    """
+    active_from_nodes = from_nodes[active_branch_lookup]
+    active_to_nodes = to_nodes[active_branch_lookup]
     if not np.all(nodes_connected[active_from_nodes] == nodes_connected[active_to_nodes]):
         raise ValueError(
             "An error occured in the %s connectivity check. Please contact the pandapipes "
             "development team!" % mode)
     branches_connected = active_branch_lookup & nodes_connected[from_nodes]
 
+    if mode == "hydraulics":
+        # the supplied network is radial (a tree) if it is fed by exactly one slack node and every
+        # other connected node is reached by exactly one branch
+        net["_lookups"]["radial_" + mode] = bool(
+            np.sum(nodes_connected[slack_nodes]) == 1
+            and np.sum(branches_connected) == np.sum(nodes_connected) - 1
+            and not np.any(node_pit[nodes_connected, NODE_TYPE] == PC))
+        if get_net_option(net, "solve_islands"):
+            identify_islands(net, node_pit, from_nodes, to_nodes, slack_nodes, nodes_connected,
+                             branches_connected, mode)
+
     oos_nodes = np.where(~nodes_connected & active_node_lookup)[0]
     is_nodes = np.where(nodes_connected & ~active_node_lookup)[0]
 
@@ -673,6 +1282,59 @@ def perform_connectivity_search(net, node_pit, branch_pit, slack_nodes,
     return nodes_connected, branches_connected
 
 
+def identify_islands(net, node_pit, from_nodes, to_nodes, slack_nodes, nodes_connected,
+                     branches_connected, mode="hydraulics"):
+    """
+    Identifies the islands of the connected network, i.e. the connected components of the graph \
+    of all connected nodes and branches, each of which is supplied by at least one slack node. \
+    The island of each node and branch (-1 if not connected) is stored in the lookups (e.g. as \
+    net["_lookups"]["node_island_hydraulics"]) together with a flag for each island whether it \
+    is radial (net["_lookups"]["radial_islands_hydraulics"]).
+
+    :param net: The pandapipesNet for which to identify the islands
+    :type net: pandapipesNet
+    :param node_pit: Internal array with node entries
+    :type node_pit: np.array
+    :param from_nodes: The from nodes of all branches
+    :type from_nodes: np.array
+    :param to_nodes: The to nodes of all branches
+    :type to_nodes: np.array
+    :param slack_nodes: The indices of the slack nodes
+    :type slack_nodes: np.array
+    :param nodes_connected: Mask of the connected nodes
+    :type nodes_connected: np.array
+    :param branches_connected: Mask of the connected branches
+    :type branches_connected: np.array
+    :param mode: The mode of the calculation
+    :type mode: str, default "hydraulics"
+    :return: No output
+    """
+    len_nodes = len(node_pit)
+    adj_matrix = coo_matrix((np.ones(np.sum(branches_connected)),
+                             (from_nodes[branches_connected], to_nodes[branches_connected])),
+                            shape=(len_nodes, len_nodes))
+    _, labels = csgraph.connected_components(adj_matrix, directed=False)
+    node_islands = np.full(len_nodes, -1, dtype=np.int64)
+    # number the islands consecutively in the order of their first node
+    _, first, inverse = np.unique(labels[nodes_connected], return_index=True,
+                                  return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    node_islands[nodes_connected] = order[inverse]
+    branch_islands = np.where(branches_connected, node_islands[from_nodes], -1)
+
+    n_islands = len(first)
+    n_nodes = np.bincount(node_islands[nodes_connected], minlength=n_islands)
+    n_branches = np.bincount(branch_islands[branches_connected], minlength=n_islands)
+    slacks = slack_nodes[nodes_connected[slack_nodes]]
+    n_slacks = np.bincount(node_islands[slacks], minlength=n_islands)
+    n_pc = np.bincount(node_islands[nodes_connected & (node_pit[:, NODE_TYPE] == PC)],
+                       minlength=n_islands)
+    net["_lookups"]["node_island_" + mode] = node_islands
+    net["_lookups"]["branch_island_" + mode] = branch_islands
+    net["_lookups"]["radial_islands_" + mode] = (n_slacks == 1) & (n_branches == n_nodes - 1) \
+        & (n_pc == 0)
+
+
 def get_table_index_list(net, pit_array, pit_indices, pit_type="node"):
     """
     Auxiliary function to get a list of tables and the table indices that belong to a number of pit
@@ -703,12 +1365,15 @@ def reduce_pit(net, mode="hydraulics"):
     lookup). A specialty that needs to be considered is that from_nodes and to_nodes change to new
     indices.
 
+    If all nodes or all branches are active, the respective active pit is the general pit itself, \
+    so that no copy is created and no results have to be transferred back (only the node indices \
+    in flow direction of the branches are kept to be restored afterwards). Otherwise, the active \
+    rows are gathered by the row indices that are stored in the lookups (e.g. \
+    "node_rows_active_hydraulics") and also used to transfer the results back (c.f. \
+    :func:`pandapipes.pf.result_extraction.extract_results_active_pit`).
+
     :param net: The pandapipesNet for which the pit shall be reduced
     :type net: pandapipesNet
-    :param node_pit: The internal structure node array
-    :type node_pit: np.array
-    :param branch_pit: The internal structure branch array
-    :type branch_pit: np.array
     :param mode: the mode of the calculation (either "hydraulics" or "heat_transfer") for storing /\
         retrieving correct lookups
     :type mode: str, default "hydraulics"
@@ -724,50 +1389,60 @@ def reduce_pit(net, mode="hydraulics"):
     nodes_connected = get_lookup(net, "node", "active_" + mode)
     branches_connected = get_lookup(net, "branch", "active_" + mode)
     if np.all(nodes_connected):
-        net["_lookups"]["node_from_to_active_" + mode] = copy.deepcopy(
-            get_lookup(net, "node", "from_to"))
-        net["_lookups"]["node_index_active_" + mode] = copy.deepcopy(
-            get_lookup(net, "node", "index"))
-        active_pit["node"] = np.copy(node_pit)
+        net["_lookups"]["node_from_to_active_" + mode] = dict(get_lookup(net, "node", "from_to"))
+        net["_lookups"]["node_index_active_" + mode] = dict(get_lookup(net, "node", "index"))
+        net["_lookups"]["node_rows_active_" + mode] = None
+        active_pit["node"] = node_pit
     else:
-        active_pit["node"] = np.copy(node_pit[nodes_connected, :])
+        node_rows = np.flatnonzero(nodes_connected)
+        active_pit["node"] = np.take(node_pit, node_rows, axis=0)
         reduced_node_lookup = np.cumsum(nodes_connected) - 1
         node_idx_lookup = get_lookup(net, "node", "index")
         net["_lookups"]["node_index_active_" + mode] = {
-            tbl: reduced_node_lookup[idx_lookup[idx_lookup != -1]]
+            tbl: reduced_node_lookup[idx_lookup.positions]
             for tbl, idx_lookup in node_idx_lookup.items()}
+        net["_lookups"]["node_rows_active_" + mode] = node_rows
         els["node"] = nodes_connected
-    if np.all(branches_connected):
-        net["_lookups"]["branch_from_to_active_" + mode] = copy.deepcopy(
+    if np.all(branches_connected) and reduced_node_lookup is None:
+        net["_lookups"]["branch_from_to_active_" + mode] = dict(
             get_lookup(net, "branch", "from_to"))
-        active_pit["branch"] = np.copy(branch_pit)
-        net["_lookups"]["branch_index_active_" + mode] = copy.deepcopy(
-            get_lookup(net, "branch", "index"))
+        net["_lookups"]["branch_index_active_" + mode] = dict(get_lookup(net, "branch", "index"))
+        net["_lookups"]["branch_rows_active_" + mode] = None
+        # the heat transfer calculation exchanges the node indices in flow direction in the active
+        # pit, the general pit keeps the original ones (c.f. extract_results_active_pit)
+        net["_lookups"]["branch_nodes_t_active_" + mode] = \
+            branch_pit[:, [FROM_NODE_T, TO_NODE_T]].copy()
+        active_pit["branch"] = branch_pit
     else:
-        active_pit["branch"] = np.copy(branch_pit[branches_connected, :])
+        # if nodes are inactive, the branch pit is copied even if all branches are active, as the
+        # node indices of the branches change
+        branch_rows = np.flatnonzero(branches_connected)
+        active_pit["branch"] = np.take(branch_pit, branch_rows, axis=0)
         branch_idx_lookup = get_lookup(net, "branch", "index")
         if len(branch_idx_lookup):
             reduced_branch_lookup = np.cumsum(branches_connected) - 1
             net["_lookups"]["branch_index_active_" + mode] = {
-                tbl: reduced_branch_lookup[idx_lookup[idx_lookup != -1]]
+                tbl: reduced_branch_lookup[idx_lookup.positions]
                 for tbl, idx_lookup in branch_idx_lookup.items()}
         else:
             net["_lookups"]["branch_index_active_" + mode] = dict()
+        net["_lookups"]["branch_rows_active_" + mode] = branch_rows
         els["branch"] = branches_connected
     if reduced_node_lookup is not None:
-        active_pit["branch"][:, FROM_NODE] = reduced_node_lookup[
-            branch_pit[branches_connected, FROM_NODE].astype(np.int32)]
-        active_pit["branch"][:, FROM_NODE_T] = active_pit["branch"][:, FROM_NODE]
-        active_pit["branch"][:, TO_NODE] = reduced_node_lookup[
-            branch_pit[branches_connected, TO_NODE].astype(np.int32)]
-        active_pit["branch"][:, TO_NODE_T] = active_pit["branch"][:, TO_NODE]
+        active_branch_pit = active_pit["branch"]
+        active_branch_pit[:, FROM_NODE] = reduced_node_lookup[
+            active_branch_pit[:, FROM_NODE].astype(np.int32)]
+        active_branch_pit[:, FROM_NODE_T] = active_branch_pit[:, FROM_NODE]
+        active_branch_pit[:, TO_NODE] = reduced_node_lookup[
+            active_branch_pit[:, TO_NODE].astype(np.int32)]
+        active_branch_pit[:, TO_NODE_T] = active_branch_pit[:, TO_NODE]
     net["_active_pit"] = active_pit
 
     for el, connected_els in els.items():
         ft_lookup = get_lookup(net, el, "from_to")
         aux_lookup = {table: (ft[0], ft[1], np.sum(connected_els[ft[0]: ft[1]]))
                       for table, ft in ft_lookup.items() if ft is not None}
-        from_to_active_lookup = copy.deepcopy(ft_lookup)
+        from_to_active_lookup = dict(ft_lookup)
         count = 0
         for table, (_, _, len_new) in sorted(aux_lookup.items(), key=lambda x: x[1][0]):
             from_to_active_lookup[table] = (count, count + len_new)
@@ -266,7 +266,10 @@ def extract_branch_results_without_internals(net, branch_results, required_resul
 def extract_results_active_pit(net, mode="hydraulics"):
     """
     Extract the pipeflow results from the internal pit structure ("_active_pit") to the general pit
-    structure.
+    structure. If the active pit is the general pit itself (c.f. :func:`reduce_pit`), only the node
+    indices of the branches in flow direction, which the heat transfer calculation exchanges, are
+    restored. Otherwise, only the active rows are written back (except for the results of the other
+    calculation mode and the node indices of the branches).
 
     :param net: The pandapipes net that the internal structure belongs to
     :type net: pandapipesNet
@@ -275,30 +278,35 @@ def extract_results_active_pit(net, mode="hydraulics"):
     :return: No output
 
     """
-    nodes_connected = get_lookup(net, "node", "active_" + mode)
-    branches_connected = get_lookup(net, "branch", "active_" + mode)
     result_node_col = PINIT if mode == "hydraulics" else TINIT_NODE
     not_affected_node_col = TINIT_NODE if mode == "hydraulics" else PINIT
-    copied_node_cols = np.array([i for i in range(net["_pit"]["node"].shape[1])
-                                 if i not in [not_affected_node_col]])
-    rows_nodes = np.arange(net["_pit"]["node"].shape[0])[nodes_connected]
-
     result_branch_col = MDOTINIT if mode == "hydraulics" else TOUTINIT
     not_affected_branch_col = TOUTINIT if mode == "hydraulics" else MDOTINIT
-    copied_branch_cols = np.array([i for i in range(net["_pit"]["branch"].shape[1])
-                                   if i not in [FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T,
-                                                not_affected_branch_col]])
-    rows_branches = np.arange(net["_pit"]["branch"].shape[0])[branches_connected]
-
-    amb = get_net_option(net, 'ambient_temperature')
-
-    net["_pit"]["node"][~nodes_connected, result_node_col] = np.NaN if mode == "hydraulics" else amb
-    net["_pit"]["node"][rows_nodes[:, np.newaxis], copied_node_cols[np.newaxis, :]] = \
-        net["_active_pit"]["node"][:, copied_node_cols]
-    net["_pit"]["branch"][~branches_connected, result_branch_col] = np.NaN if mode == "hydraulics" else \
-        net["_pit"]["branch"][~branches_connected, TEXT]
-    net["_pit"]["branch"][rows_branches[:, np.newaxis], copied_branch_cols[np.newaxis, :]] = \
-        net["_active_pit"]["branch"][:, copied_branch_cols]
+
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    rows_nodes = get_lookup(net, "node", "rows_active_" + mode)
+    if rows_nodes is not None:
+        nodes_connected = get_lookup(net, "node", "active_" + mode)
+        _write_active_rows(node_pit, net["_active_pit"]["node"], rows_nodes,
+                           [not_affected_node_col])
+        node_pit[~nodes_connected, result_node_col] = np.NaN if mode == "hydraulics" \
+            else get_net_option(net, 'ambient_temperature')
+    rows_branches = get_lookup(net, "branch", "rows_active_" + mode)
+    if rows_branches is not None:
+        branches_connected = get_lookup(net, "branch", "active_" + mode)
+        _write_active_rows(branch_pit, net["_active_pit"]["branch"], rows_branches,
+                           [FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, not_affected_branch_col])
+        branch_pit[~branches_connected, result_branch_col] = np.NaN if mode == "hydraulics" \
+            else branch_pit[~branches_connected, TEXT]
+    elif "branch_nodes_t_active_" + mode in net["_lookups"]:
+        branch_pit[:, [FROM_NODE_T, TO_NODE_T]] = net["_lookups"]["branch_nodes_t_active_" + mode]
+
+
+def _write_active_rows(pit, active_pit, rows, kept_cols):
+    # whole rows are written at once, the columns that are not affected are restored afterwards
+    kept = pit[rows[:, np.newaxis], kept_cols]
+    pit[rows] = active_pit
+    pit[rows[:, np.newaxis], kept_cols] = kept
 
 
 def consider_heat(mode, results=None):
@@ -2,17 +2,31 @@
 # and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
 # Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
 
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+
 import numpy as np
 from numpy import linalg
-from scipy.sparse.linalg import spsolve
 
-from pandapipes.idx_branch import FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, MDOTINIT, TOUTINIT, MDOTINIT_T
-from pandapipes.idx_node import PINIT, TINIT
-from pandapipes.pf.build_system_matrix import build_system_matrix
+from pandapipes.idx_branch import FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, MDOTINIT, TOUTINIT, PL, \
+    LOAD_VEC_BRANCHES
+from pandapipes.idx_node import PINIT, TINIT, LOAD
+from pandapipes.pf.build_system_matrix import build_system_matrix, build_hydraulic_load_vector, \
+    HydraulicJacobianOperator
+from pandapipes.pf.coupled_system import set_thermal_flow_direction, get_thermal_node_rows, \
+    build_coupled_system
 from pandapipes.pf.derivative_calculation import calculate_derivatives_hydraulic, calculate_derivatives_thermal
+from pandapipes.pf.fixed_point_acceleration import accelerate_fixed_point
+from pandapipes.pf.incremental_pit import initialize_pit_incrementally, store_pit_structure
+from pandapipes.pf.linear_solver import solve_newton_step, reset_quasi_newton, \
+    scale_quasi_newton_step
 from pandapipes.pf.pipeflow_setup import get_net_option, get_net_options, set_net_option, init_options, \
     create_internal_results, write_internal_results, get_lookup, create_lookups, initialize_pit, reduce_pit, \
-    set_user_pf_options, init_all_result_tables, identify_active_nodes_branches, PipeflowNotConverged
+    set_user_pf_options, init_all_result_tables, identify_active_nodes_branches, PipeflowNotConverged, \
+    get_previous_state, initialize_pit_from_previous_state, get_table_index_list, \
+    get_connectivity_cache_statistics
 from pandapipes.pf.result_extraction import extract_all_results, extract_results_active_pit
 
 try:
@@ -59,6 +73,9 @@ def pipeflow(net, sol_vec=None, **kwargs):
     # Inputs & initialization of variables
     # ------------------------------------------------------------------------------------------
 
+    # the internal structure of the last pipeflow is replaced during the initialization
+    previous_state = get_previous_state(net)
+
     # Init physical constants and options
     init_options(net, local_params)
 
@@ -66,18 +83,24 @@ def pipeflow(net, sol_vec=None, **kwargs):
     net.converged = False
     init_all_result_tables(net)
 
-    create_lookups(net)
-    initialize_pit(net)
+    cache_statistics = get_connectivity_cache_statistics(net)
+
+    # if only set points changed since the last pipeflow, the lookups, the pit and the
+    # connectivity are reused and only the affected columns of the pit are updated
+    if not initialize_pit_incrementally(net):
+        create_lookups(net)
+        initialize_pit(net)
+        # cannot be moved to calculate_hydraulics as the active node/branch hydraulics lookup is also required to
+        # determine the active node/branch heat transfer lookup
+        identify_active_nodes_branches(net)
+        store_pit_structure(net)
+    initialize_pit_from_previous_state(net, previous_state)
 
     calculation_mode = get_net_option(net, "mode")
     calculate_hydraulics = calculation_mode in ["hydraulics", 'sequential']
     calculate_heat = calculation_mode in ["heat", 'sequential']
     calculate_bidrect = calculation_mode == "bidirectional"
 
-    # cannot be moved to calculate_hydraulics as the active node/branch hydraulics lookup is also required to
-    # determine the active node/branch heat transfer lookup
-    identify_active_nodes_branches(net)
-
     if calculation_mode == 'heat':
         use_given_hydraulic_results(net, sol_vec)
 
@@ -91,6 +114,11 @@ def pipeflow(net, sol_vec=None, **kwargs):
         if calculate_heat:
             heat_transfer(net)
 
+    hits, misses, incremental = np.subtract(get_connectivity_cache_statistics(net),
+                                            cache_statistics)
+    write_internal_results(net, connectivity_cache_hits=hits, connectivity_cache_misses=misses,
+                           connectivity_incremental_updates=incremental)
+
     extract_all_results(net, calculation_mode)
 
 
@@ -112,7 +140,12 @@ def newton_raphson(net, funct, mode, vars, tols, pit_names, iter_name):
     # This branch is used to stop the solver after a specified error tolerance is reached
     errors = {var: [] for var in vars}
     create_internal_results(net)
+    reset_quasi_newton(net)
+    reset_line_search(net)
     residual_norm = None
+    callbacks = get_net_option(net, "callbacks")
+    terminated = False
+    start = iteration_start = perf_counter() if callbacks else None
     # This loop is left as soon as the solver converged
     while not net.converged and niter < max_iter:
         logger.debug("niter %d" % niter)
@@ -130,23 +163,98 @@ def newton_raphson(net, funct, mode, vars, tols, pit_names, iter_name):
             errors[var].append(linalg.norm(dval) / len(dval) if len(dval) else 0)
         finalize_iteration(net, niter, residual_norm, nonlinear_method, errors=errors, tols=tols, tol_res=tol_res,
                            vals_old=vals_old, vars=vars, pit_names=pit_names)
+        if callbacks:
+            now = perf_counter()
+            timings = {"iteration": now - iteration_start, "total": now - start}
+            iteration_start = now
+            terminated = call_iteration_callbacks(net, callbacks, mode, niter, residual_norm, errors,
+                                                  timings)
         niter += 1
+        if terminated and not net.converged:
+            logger.debug("The %s calculation was terminated by a callback." % mode)
+            break
     write_internal_results(net, **errors)
     kwargs = dict()
     kwargs['residual_norm_%s' % mode] = residual_norm
     kwargs['iterations_%s' % mode] = niter
+    kwargs['terminated_%s' % mode] = terminated and not net.converged
     write_internal_results(net, **kwargs)
     log_final_results(net, mode, niter, residual_norm, vars, tols)
 
 
+def call_iteration_callbacks(net, callbacks, mode, niter, residual_norm, errors, timings):
+    """
+    Calls the callbacks given in the option "callbacks" after an iteration of the Newton-Raphson \
+    solver. Each callback is called with the net and the keyword arguments
+
+        - **mode** (str): the calculation mode of the solver ("hydraulics", "heat" or \
+          "bidirectional")
+        - **niter** (int): the number of the iteration, starting with 0
+        - **residual_norm** (float): the norm of the residual of the iteration
+        - **errors** (dict): the error of the iteration for each variable
+        - **alpha** (float): the damping factor for the next iteration
+        - **converged** (bool): the convergence state after the iteration
+        - **timings** (dict): the duration of the iteration ("iteration") and the time since the \
+          start of the solver ("total") in seconds
+
+    A callback can request the termination of the solver by returning True. All callbacks are \
+    called in each iteration, even if one of them requests the termination. If the solver has not \
+    converged in this iteration, it stops, sets the internal result "terminated_<mode>" and the \
+    calculation raises a PipeflowNotConverged error.
+
+    :param net: The pandapipesNet that is calculated
+    :type net: pandapipesNet
+    :param callbacks: The callbacks to call
+    :type callbacks: list
+    :param mode: The calculation mode of the solver
+    :type mode: str
+    :param niter: The number of the iteration
+    :type niter: int
+    :param residual_norm: The norm of the residual
+    :type residual_norm: float
+    :param errors: The errors of all iterations for each variable
+    :type errors: dict
+    :param timings: The durations of the iteration and of the solver so far
+    :type timings: dict
+    :return: terminate - True, if at least one callback requested the termination
+    :rtype: bool
+    """
+    kwargs = dict(mode=mode, niter=niter, residual_norm=residual_norm,
+                  errors={var: error[-1] for var, error in errors.items()},
+                  alpha=get_net_option(net, "alpha"), converged=net.converged, timings=timings)
+    terminate = False
+    for callback in callbacks:
+        terminate |= bool(callback(net, **kwargs))
+    return terminate
+
+
 def bidirectional(net):
     net.converged = False
     if not get_net_option(net, "reuse_internal_data") or "_internal_data" not in net:
         net["_internal_data"] = dict()
     vars = ['mdot', 'p', 'TOUT', 'T']
     tol_m, tol_p, tol_T = get_net_options(net, 'tol_m', 'tol_p', 'tol_T')
-    newton_raphson(net, solve_bidirectional, 'bidirectional', vars, [tol_m, tol_p, tol_T, tol_T],
+    coupling = get_net_option(net, "bidirectional_coupling")
+    if coupling == "monolithic":
+        net["_internal_data"]["coupled_active_pit"] = False
+        net["_internal_data"].pop("iterations_bidirectional", None)
+        funct = solve_coupled
+    elif coupling == "alternating":
+        funct = solve_bidirectional
+        acceleration = get_net_option(net, "bidirectional_acceleration")
+        if acceleration in ["anderson", "aitken"]:
+            net["_internal_data"].pop("acceleration_bidirectional", None)
+            funct = solve_bidirectional_accelerated
+        elif acceleration != "none":
+            raise UserWarning("The bidirectional acceleration %s is not available. Please choose "
+                              "one of 'none', 'anderson' or 'aitken'." % acceleration)
+    else:
+        raise UserWarning("The bidirectional coupling %s is not available. Please choose one of "
+                          "'alternating' or 'monolithic'." % coupling)
+    newton_raphson(net, funct, 'bidirectional', vars, [tol_m, tol_p, tol_T, tol_T],
                    ['branch', 'node', 'branch', 'node'], 'max_iter_bidirect')
+    if net["_internal_data"].pop("coupled_active_pit", False):
+        extract_coupled_results(net)
     if net.converged:
         set_user_pf_options(net, hyd_flag=True)
     if not get_net_option(net, "reuse_internal_data"):
@@ -159,12 +267,20 @@ def hydraulics(net):
     # Start of nonlinear loop
     # ---------------------------------------------------------------------------------------------
     net.converged = False
+    if get_net_option(net, "solve_islands") and "node_island_hydraulics" in net["_lookups"] \
+            and len(net["_lookups"]["radial_islands_hydraulics"]) > 1:
+        hydraulic_islands(net)
+        return
     reduce_pit(net, mode="hydraulics")
     if not get_net_option(net, "reuse_internal_data") or "_internal_data" not in net:
         net["_internal_data"] = dict()
     vars = ['mdot', 'p']
     tol_p, tol_m = get_net_options(net, 'tol_m', 'tol_p')
-    newton_raphson(net, solve_hydraulics, 'hydraulics', vars, [tol_m, tol_p], ['branch', 'node'], 'max_iter_hyd')
+    if get_net_option(net, "load_continuation"):
+        load_continuation(net, partial(newton_raphson, net, solve_hydraulics, 'hydraulics', vars,
+                                       [tol_m, tol_p], ['branch', 'node'], 'max_iter_hyd'))
+    else:
+        newton_raphson(net, solve_hydraulics, 'hydraulics', vars, [tol_m, tol_p], ['branch', 'node'], 'max_iter_hyd')
     if net.converged:
         set_user_pf_options(net, hyd_flag=True)
 
@@ -176,18 +292,202 @@ def hydraulics(net):
     extract_results_active_pit(net, mode="hydraulics")
 
 
+def load_continuation(net, solve):
+    """
+    Solves the hydraulic system by a continuation in the load level. The node loads (sinks, \
+    sources and mass circulation pumps) and the pressure lifts of pumps and compressors are \
+    scaled by a load factor that is increased from 0 (the initial state) to 1 (the target) in \
+    adaptive steps. Each step starts from the converged state of the previous one. If a step \
+    does not converge, the last converged state is restored and the step size is halved, after \
+    a converged step it is doubled. The first step size is given by the option \
+    **continuation_initial_step** (0.25 by default, with 1 the target is tried directly), the \
+    number of Newton-Raphson solves is limited by **continuation_max_solves**. The sequence of \
+    steps only depends on the convergence of the solves, so that the result is deterministic. \
+    The converged load factors, the number of solves and the total number of iterations are \
+    stored in the internal results as "continuation_factors_hydraulics", \
+    "continuation_solves_hydraulics" and "continuation_iterations_hydraulics".
+
+    :param net: The pandapipesNet for which to perform the hydraulic calculation
+    :type net: pandapipesNet
+    :param solve: function that performs the Newton-Raphson iterations on the active pit and \
+        sets net.converged
+    :type solve: callable
+    :return: No output
+    """
+    node_pit = net["_active_pit"]["node"]
+    branch_pit = net["_active_pit"]["branch"]
+    step, max_solves, alpha = get_net_options(net, "continuation_initial_step",
+                                              "continuation_max_solves", "alpha")
+    target_loads = node_pit[:, LOAD].copy()
+    state = node_pit[:, PINIT].copy(), branch_pit[:, MDOTINIT].copy()
+    factor, factors, solves, iterations = 0., [], 0, 0
+    try:
+        while factor < 1 and solves < max_solves:
+            load_factor = min(1., factor + step)
+            node_pit[:, LOAD] = target_loads * load_factor
+            net["_internal_data"]["load_factor"] = load_factor
+            # the damping factor might have been changed by the automatic nonlinear method
+            set_net_option(net, "alpha", alpha)
+            net.converged = False
+            solve()
+            solves += 1
+            iterations += net["_internal_results"]["iterations_hydraulics"]
+            if net["_internal_results"]["terminated_hydraulics"]:
+                break
+            if net.converged and np.all(np.isfinite(node_pit[:, PINIT])) \
+                    and np.all(np.isfinite(branch_pit[:, MDOTINIT])):
+                factor = load_factor
+                factors.append(factor)
+                state = node_pit[:, PINIT].copy(), branch_pit[:, MDOTINIT].copy()
+                step *= 2
+            else:
+                logger.debug("load continuation: step to load factor %s did not converge"
+                             % load_factor)
+                node_pit[:, PINIT], branch_pit[:, MDOTINIT] = state
+                step /= 2
+    finally:
+        node_pit[:, LOAD] = target_loads
+        net["_internal_data"].pop("load_factor", None)
+        set_net_option(net, "alpha", alpha)
+    net.converged = factor == 1
+    if not net.converged:
+        logger.warning("The load continuation reached a load factor of %s after %d solves."
+                       % (factor, solves))
+    write_internal_results(net, continuation_factors_hydraulics=np.array(factors),
+                           continuation_solves_hydraulics=solves,
+                           continuation_iterations_hydraulics=iterations)
+
+
+def hydraulic_islands(net):
+    """
+    Performs the hydraulic calculation separately for each island identified in the connectivity \
+    check (c.f. :func:`pandapipes.pf.pipeflow_setup.identify_islands`). For each island, a \
+    shallow copy of the net with its own lookups, active pit and internal data is solved, \
+    optionally by a thread pool with **island_workers** threads. If the option \
+    **load_continuation** is set, each island is solved by its own load continuation (c.f. \
+    :func:`load_continuation`). Afterwards, the states of all islands are merged into the active \
+    pit of the net, including the last iterate of islands that did not converge (a warning is \
+    logged for them). The convergence status, the number of iterations and the residual norm of \
+    each island are stored in the internal results as "islands_converged_hydraulics", \
+    "islands_iterations_hydraulics" and "islands_residual_norm_hydraulics" (with load \
+    continuation additionally the reached load factors as "islands_load_factor_hydraulics").
+
+    :param net: The pandapipesNet for which to perform the hydraulic calculation
+    :type net: pandapipesNet
+    :return: No output
+    """
+    node_islands = net["_lookups"]["node_island_hydraulics"]
+    branch_islands = net["_lookups"]["branch_island_hydraulics"]
+    radial_islands = net["_lookups"]["radial_islands_hydraulics"]
+    reuse_internal_data = get_net_option(net, "reuse_internal_data")
+    if not reuse_internal_data or "_internal_data" not in net:
+        net["_internal_data"] = dict()
+
+    island_nets = []
+    for island, radial in enumerate(radial_islands):
+        island_net = copy.copy(net)
+        island_net["_options"] = dict(net["_options"])
+        island_net["_lookups"] = dict(net["_lookups"])
+        island_net["_lookups"]["node_active_hydraulics"] = node_islands == island
+        island_net["_lookups"]["branch_active_hydraulics"] = branch_islands == island
+        island_net["_lookups"]["radial_hydraulics"] = bool(radial)
+        island_net["_internal_data"] = net["_internal_data"].setdefault(
+            "island_%d_hydraulics" % island, dict())
+        island_nets.append(island_net)
+
+    island_workers = get_net_option(net, "island_workers")
+    if island_workers > 1:
+        with ThreadPoolExecutor(max_workers=island_workers) as executor:
+            list(executor.map(_solve_hydraulic_island, island_nets))
+    else:
+        for island_net in island_nets:
+            _solve_hydraulic_island(island_net)
+
+    converged = np.array([island_net.converged for island_net in island_nets], dtype=bool)
+    if not np.any(converged):
+        if not reuse_internal_data:
+            net.pop("_internal_data", None)
+        raise PipeflowNotConverged("The hydraulic calculation did not converge to a solution in "
+                                   "any of the %d islands." % len(island_nets))
+    if not np.all(converged):
+        nodes_failed = np.where(np.isin(node_islands, np.where(~converged)[0]))[0]
+        msg = "\n".join("In table %s: %s" % (tbl, nds) for tbl, nds in
+                        get_table_index_list(net, net["_pit"]["node"], nodes_failed))
+        logger.warning("The hydraulic calculation did not converge in %d of %d islands. The "
+                       "results of the following nodes are the last iterate of their island:\n%s"
+                       % (np.sum(~converged), len(island_nets), msg))
+
+    # merge the states of all islands into the active pit
+    reduce_pit(net, mode="hydraulics")
+    node_pos = np.cumsum(net["_lookups"]["node_active_hydraulics"]) - 1
+    branch_pos = np.cumsum(net["_lookups"]["branch_active_hydraulics"]) - 1
+    branch_cols = np.setdiff1d(np.arange(net["_active_pit"]["branch"].shape[1]),
+                               [FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T])
+    for island_net in island_nets:
+        island_nodes = island_net["_lookups"]["node_active_hydraulics"]
+        island_branches = island_net["_lookups"]["branch_active_hydraulics"]
+        net["_active_pit"]["node"][node_pos[island_nodes]] = island_net["_active_pit"]["node"]
+        net["_active_pit"]["branch"][branch_pos[island_branches][:, np.newaxis], branch_cols] = \
+            island_net["_active_pit"]["branch"][:, branch_cols]
+
+    island_results = [island_net["_internal_results"] for island_net in island_nets]
+    residual_norms = np.array([res.get("residual_norm_hydraulics", np.NaN)
+                               for res in island_results], dtype=np.float64)
+    internal_results = {
+        "iterations_hydraulics": max(res.get("iterations_hydraulics", 0) for res in island_results),
+        "residual_norm_hydraulics": np.max(residual_norms[converged]),
+        "islands_converged_hydraulics": converged,
+        "islands_iterations_hydraulics": np.array(
+            [res.get("continuation_iterations_hydraulics", res.get("iterations_hydraulics", 0))
+             for res in island_results]),
+        "islands_residual_norm_hydraulics": residual_norms}
+    if get_net_option(net, "load_continuation"):
+        internal_results["islands_load_factor_hydraulics"] = np.array(
+            [factors[-1] if len(factors) else 0. for factors in
+             (res.get("continuation_factors_hydraulics", []) for res in island_results)])
+    write_internal_results(net, **internal_results)
+    net.converged = True
+    set_user_pf_options(net, hyd_flag=bool(np.all(converged)))
+    if not reuse_internal_data:
+        net.pop("_internal_data", None)
+    extract_results_active_pit(net, mode="hydraulics")
+
+
+def _solve_hydraulic_island(net):
+    net.converged = False
+    reduce_pit(net, mode="hydraulics")
+    vars = ['mdot', 'p']
+    tol_p, tol_m = get_net_options(net, 'tol_m', 'tol_p')
+    solve = partial(newton_raphson, net, solve_hydraulics, 'hydraulics', vars, [tol_m, tol_p],
+                    ['branch', 'node'], 'max_iter_hyd')
+    try:
+        if get_net_option(net, "load_continuation"):
+            load_continuation(net, solve)
+        else:
+            solve()
+    except (ValueError, FloatingPointError, linalg.LinAlgError) as e:
+        logger.debug("The hydraulic calculation of an island failed: %s" % e)
+        net.converged = False
+
+
 def heat_transfer(net):
     # Start of nonlinear loop
     # ---------------------------------------------------------------------------------------------
     net.converged = False
     identify_active_nodes_branches(net, False)
     reduce_pit(net, mode="heat_transfer")
+    if not get_net_option(net, "reuse_internal_data") or "_internal_data" not in net:
+        net["_internal_data"] = dict()
     if net.fluid.is_gas:
         logger.info("Caution! Temperature calculation does currently not affect hydraulic "
                     "properties!")
     vars = ['Tout', 'T']
     tol_T = next(get_net_options(net, 'tol_T'))
     newton_raphson(net, solve_temperature, 'heat', vars, [tol_T, tol_T], ['branch', 'node'], 'max_iter_therm')
+
+    if not get_net_option(net, "reuse_internal_data"):
+        net.pop("_internal_data", None)
+
     if not net.converged:
         raise PipeflowNotConverged("The heat transfer calculation did not converge to a "
                                    "solution.")
@@ -207,6 +507,125 @@ def solve_bidirectional(net):
     return res, residual
 
 
+def solve_bidirectional_accelerated(net):
+    """
+    Performs one alternating step of the bidirectional calculation (c.f. \
+    :func:`solve_bidirectional`) as one evaluation x -> G(x) of a fixed-point iteration over the \
+    stacked state of mass flows, pressures, node temperatures and outlet temperatures. The next \
+    iterate is accelerated with the method given in the option "bidirectional_acceleration" (c.f. \
+    :func:`pandapipes.pf.fixed_point_acceleration.accelerate_fixed_point`) and written to the pit \
+    at the beginning of the next step, so that the pit holds G(x) after the last step.
+
+    :param net: The pandapipesNet for which to perform the step
+    :type net: pandapipesNet
+    :return: The new and old values of the unknowns and the residual
+    """
+    method, memory, tol_m, tol_p, tol_T = get_net_options(
+        net, "bidirectional_acceleration", "acceleration_memory", "tol_m", "tol_p", "tol_T")
+    state = net["_internal_data"].setdefault("acceleration_bidirectional", dict())
+    if "next_iterate" in state:
+        set_fixed_point_state(net, state.pop("next_iterate"))
+    x = get_fixed_point_state(net)
+    res, residual = solve_bidirectional(net)
+    g = get_fixed_point_state(net)
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    weights = np.repeat([1 / tol_m, 1 / tol_p, 1 / tol_T, 1 / tol_T],
+                        [len(branch_pit), len(node_pit), len(node_pit), len(branch_pit)])
+    state["next_iterate"] = accelerate_fixed_point(state, x, g, weights, method, memory)
+    return res, residual
+
+
+def get_fixed_point_state(net):
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    return np.concatenate([branch_pit[:, MDOTINIT], node_pit[:, PINIT], node_pit[:, TINIT],
+                           branch_pit[:, TOUTINIT]])
+
+
+def set_fixed_point_state(net, state):
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    len_n, len_b = len(node_pit), len(branch_pit)
+    branch_pit[:, MDOTINIT], node_pit[:, PINIT], node_pit[:, TINIT], branch_pit[:, TOUTINIT] = \
+        np.split(state, np.cumsum([len_b, len_n, len_n]))
+
+
+def solve_coupled(net):
+    """
+    Performs one Newton step of the monolithic coupled hydraulic and thermal system (c.f. \
+    :func:`pandapipes.pf.coupled_system.build_coupled_system`). Both systems are assembled on the \
+    active pit of the hydraulic calculation, which is only reduced once and kept for all \
+    iterations. The first iteration is an alternating step (c.f. :func:`solve_bidirectional`), \
+    so that the thermal equations are not linearized around the initial guess of the mass flows. \
+    If the heat transfer system cannot be set up on the common pit (e.g. because a branch has no \
+    flow), an alternating step is performed as well.
+
+    :param net: The pandapipesNet for which to solve the coupled system
+    :type net: pandapipesNet
+    :return: The new and old values of the unknowns and the residual
+    """
+    if "iterations_bidirectional" not in net["_internal_data"]:
+        net["_internal_data"]["iterations_bidirectional"] = 1
+        return solve_bidirectional(net)
+    if not net["_internal_data"]["coupled_active_pit"]:
+        reduce_pit(net, mode="hydraulics")
+        net["_internal_data"]["coupled_active_pit"] = True
+    options = net["_options"]
+    branch_pit = net["_active_pit"]["branch"]
+    node_pit = net["_active_pit"]["node"]
+    set_thermal_flow_direction(branch_pit)
+    thermal_rows = get_thermal_node_rows(node_pit, branch_pit)
+    if thermal_rows is None:
+        logger.debug("The coupled system cannot be set up, an alternating step is performed.")
+        extract_coupled_results(net)
+        net["_internal_data"]["coupled_active_pit"] = False
+        return solve_bidirectional(net)
+    share_active_lookups(net)
+
+    system_matrix, load_vector, residual = build_coupled_system(
+        net, assemble_hydraulic_system, assemble_thermal_system, thermal_rows)
+    len_n, len_b = len(node_pit), len(branch_pit)
+    x = solve_newton_step(net, system_matrix, load_vector, "coupled")
+
+    m_init_old = branch_pit[:, MDOTINIT].copy()
+    p_init_old = node_pit[:, PINIT].copy()
+    t_out_old = branch_pit[:, TOUTINIT].copy()
+    t_init_old = node_pit[:, TINIT].copy()
+    branch_pit[:, MDOTINIT] += x[len_n:len_n + len_b]
+    node_pit[:, PINIT] += x[:len_n] * options["alpha"]
+    node_pit[:, TINIT] += x[len_n + len_b:2 * len_n + len_b] * options["alpha"]
+    branch_pit[:, TOUTINIT] += x[2 * len_n + len_b:]
+    return [branch_pit[:, MDOTINIT], m_init_old, node_pit[:, PINIT], p_init_old,
+            branch_pit[:, TOUTINIT], t_out_old, node_pit[:, TINIT], t_init_old], residual
+
+
+def share_active_lookups(net):
+    """
+    Uses the active nodes and branches of the hydraulic calculation also for the heat transfer \
+    calculation, so that both systems can be assembled on the same active pit.
+
+    :param net: The pandapipesNet
+    :type net: pandapipesNet
+    :return: No output
+    """
+    for pit_type in ["node", "branch"]:
+        for lookup in ["active_", "from_to_active_", "index_active_", "rows_active_"]:
+            net["_lookups"]["%s_%sheat_transfer" % (pit_type, lookup)] = \
+                net["_lookups"]["%s_%shydraulics" % (pit_type, lookup)]
+
+
+def extract_coupled_results(net):
+    """
+    Transfers the hydraulic and thermal results of the coupled calculation from the common \
+    active pit to the general pit.
+
+    :param net: The pandapipesNet
+    :type net: pandapipesNet
+    :return: No output
+    """
+    share_active_lookups(net)
+    extract_results_active_pit(net, mode="hydraulics")
+    extract_results_active_pit(net, mode="heat_transfer")
+
+
 def solve_hydraulics(net):
     """
     Create and solve the linearized system of equations (based on a jacobian in form of a scipy
@@ -222,25 +641,70 @@ def solve_hydraulics(net):
     branch_pit = net["_active_pit"]["branch"]
     node_pit = net["_active_pit"]["node"]
 
-    branch_lookups = get_lookup(net, "branch", "from_to_active_hydraulics")
-    for comp in net['component_list']:
-        comp.adaption_before_derivatives_hydraulic(net, branch_pit, node_pit, branch_lookups, options)
-    calculate_derivatives_hydraulic(net, branch_pit, node_pit, options)
-    for comp in net['component_list']:
-        comp.adaption_after_derivatives_hydraulic(net, branch_pit, node_pit, branch_lookups, options)
-    jacobian, epsilon = build_system_matrix(net, branch_pit, node_pit, False)
+    formulation = options["hydraulic_formulation"]
+    if formulation == "auto":
+        formulation = "radial" if net["_lookups"].get("radial_hydraulics", False) else "full"
+    assemble_system = partial(assemble_hydraulic_system, matrix_free=formulation == "krylov")
+    jacobian, epsilon = assemble_system(net)
 
     m_init_old = branch_pit[:, MDOTINIT].copy()
     p_init_old = node_pit[:, PINIT].copy()
 
-    x = spsolve(jacobian, epsilon)
+    x = solve_newton_step(net, jacobian, epsilon, "hydraulics", len(node_pit), formulation)
 
-    branch_pit[:, MDOTINIT] -= x[len(node_pit):]
-    node_pit[:, PINIT] -= x[:len(node_pit)] * options["alpha"]
+    if options["nonlinear_method"] == "linesearch":
+        def apply_step(step_length):
+            branch_pit[:, MDOTINIT] = m_init_old - x[len(node_pit):] * step_length
+            node_pit[:, PINIT] = p_init_old - x[:len(node_pit)] * step_length
+
+        line_search(net, epsilon, apply_step, assemble_system, "hydraulics",
+                    (MDOTINIT, PINIT))
+    else:
+        branch_pit[:, MDOTINIT] -= x[len(node_pit):]
+        node_pit[:, PINIT] -= x[:len(node_pit)] * options["alpha"]
 
     return [branch_pit[:, MDOTINIT], m_init_old, node_pit[:, PINIT], p_init_old], epsilon
 
 
+def assemble_hydraulic_system(net, matrix_free=False):
+    """
+    Calculates the derivatives of the hydraulic equations at the current state of the active pit \
+    and builds the jacobian and the load vector (residual) of the hydraulic system.
+
+    :param net: The pandapipesNet for which to build the hydraulic system
+    :type net: pandapipesNet
+    :param matrix_free: If True, the jacobian is returned as a linear operator that evaluates \
+        products with the derivatives in the pit instead of an assembled matrix (c.f. \
+        :class:`pandapipes.pf.build_system_matrix.HydraulicJacobianOperator`)
+    :type matrix_free: bool, default False
+    :return: jacobian, epsilon - The system matrix and the load vector
+    :rtype: scipy.sparse.csr_matrix, numpy.ndarray
+    """
+    options = net["_options"]
+    branch_pit = net["_active_pit"]["branch"]
+    node_pit = net["_active_pit"]["node"]
+
+    cached_system = get_line_search_system(net, "hydraulics", (MDOTINIT, PINIT))
+    if cached_system is not None:
+        return cached_system
+
+    branch_lookups = get_lookup(net, "branch", "from_to_active_hydraulics")
+    for comp in net['component_list']:
+        comp.adaption_before_derivatives_hydraulic(net, branch_pit, node_pit, branch_lookups, options)
+    calculate_derivatives_hydraulic(net, branch_pit, node_pit, options)
+    load_factor = net.get("_internal_data", dict()).get("load_factor", None)
+    if load_factor is not None:
+        # pressure lifts of pumps and compressors in the load continuation; the load vector is
+        # linear in the pressure lift, so that the pit column itself is not scaled
+        branch_pit[:, LOAD_VEC_BRANCHES] -= (1 - load_factor) * branch_pit[:, PL]
+    for comp in net['component_list']:
+        comp.adaption_after_derivatives_hydraulic(net, branch_pit, node_pit, branch_lookups, options)
+    if matrix_free:
+        return HydraulicJacobianOperator(branch_pit, node_pit), \
+            build_hydraulic_load_vector(branch_pit, node_pit)
+    return build_system_matrix(net, branch_pit, node_pit, False)
+
+
 def solve_temperature(net):
     """
     This function contains the procedure to build and solve a linearized system of equation based on
@@ -257,34 +721,152 @@ def solve_temperature(net):
     options = net["_options"]
     branch_pit = net["_active_pit"]["branch"]
     node_pit = net["_active_pit"]["node"]
-    branch_lookups = get_lookup(net, "branch", "from_to_active_heat_transfer")
 
     # Negative velocity values are turned to positive ones (including exchange of from_node and
     # to_node for temperature calculation
-    branch_pit[:, MDOTINIT_T] = branch_pit[:, MDOTINIT]
-    branch_pit[:, FROM_NODE_T] = branch_pit[:, FROM_NODE]
-    branch_pit[:, TO_NODE_T] = branch_pit[:, TO_NODE]
-    mask = branch_pit[:, MDOTINIT] < 0
-    branch_pit[mask, MDOTINIT_T] = -branch_pit[mask, MDOTINIT]
-    branch_pit[mask, FROM_NODE_T] = branch_pit[mask, TO_NODE]
-    branch_pit[mask, TO_NODE_T] = branch_pit[mask, FROM_NODE]
+    set_thermal_flow_direction(branch_pit)
 
+    jacobian, epsilon = assemble_thermal_system(net)
+
+    t_init_old = node_pit[:, TINIT].copy()
+    t_out_old = branch_pit[:, TOUTINIT].copy()
+
+    x = solve_newton_step(net, jacobian, epsilon, "heat_transfer", len(node_pit),
+                          options["heat_formulation"])
+
+    if options["nonlinear_method"] == "linesearch":
+        def apply_step(step_length):
+            node_pit[:, TINIT] = t_init_old + x[:len(node_pit)] * step_length
+            branch_pit[:, TOUTINIT] = t_out_old + x[len(node_pit):] * step_length
+
+        line_search(net, epsilon, apply_step, assemble_thermal_system, "heat_transfer",
+                    (TOUTINIT, TINIT))
+    else:
+        node_pit[:, TINIT] += x[:len(node_pit)] * options["alpha"]
+        branch_pit[:, TOUTINIT] += x[len(node_pit):]
+
+    return [branch_pit[:, TOUTINIT], t_out_old, node_pit[:, TINIT], t_init_old], epsilon
+
+
+def assemble_thermal_system(net):
+    """
+    Calculates the derivatives of the heat transfer equations at the current state of the active \
+    pit and builds the jacobian and the load vector (residual) of the thermal system.
+
+    :param net: The pandapipesNet for which to build the thermal system
+    :type net: pandapipesNet
+    :return: jacobian, epsilon - The system matrix and the load vector
+    :rtype: scipy.sparse.csr_matrix, numpy.ndarray
+    """
+    options = net["_options"]
+    branch_pit = net["_active_pit"]["branch"]
+    node_pit = net["_active_pit"]["node"]
+
+    cached_system = get_line_search_system(net, "heat_transfer", (TOUTINIT, TINIT))
+    if cached_system is not None:
+        return cached_system
+
+    branch_lookups = get_lookup(net, "branch", "from_to_active_heat_transfer")
     for comp in net['component_list']:
         comp.adaption_before_derivatives_thermal(net, branch_pit, node_pit, branch_lookups, options)
     calculate_derivatives_thermal(net, branch_pit, node_pit, options)
     for comp in net['component_list']:
         comp.adaption_after_derivatives_thermal(net, branch_pit, node_pit, branch_lookups, options)
-    jacobian, epsilon = build_system_matrix(net, branch_pit, node_pit, True)
+    return build_system_matrix(net, branch_pit, node_pit, True)
 
-    t_init_old = node_pit[:, TINIT].copy()
-    t_out_old = branch_pit[:, TOUTINIT].copy()
 
-    x = spsolve(jacobian, epsilon)
+def line_search(net, residual, apply_step, assemble_system, system_name, state_columns):
+    """
+    Non-monotone backtracking line search along the Newton step with the Armijo condition on the \
+    norm of the full residual. Starting with the full step, the step length is halved until \
+    ||F(x + step_length * dx)|| <= (1 - **linesearch_armijo** * step_length) * F_ref holds or \
+    **linesearch_max_backtracks** reductions were performed. The reference F_ref is the maximum \
+    residual norm of the last **linesearch_memory** iterations, so that single increases of the \
+    residual, which are typical for the Newton steps in gas networks, are tolerated. The first \
+    step from the initial state is always accepted, as the initial guess of the mass flows is \
+    no meaningful reference. The step length is applied to all unknowns of the system and \
+    reported to the quasi-Newton method (c.f. :func:`scale_quasi_newton_step`). The \
+    system assembled at the accepted state is stored in net["_internal_data"], so that it can be \
+    reused in the next Newton iteration (c.f. :func:`get_line_search_system`).
+
+    :param net: The pandapipesNet for which to perform the line search
+    :type net: pandapipesNet
+    :param residual: The load vector (residual) at the start of the step
+    :type residual: numpy.ndarray
+    :param apply_step: function that sets the unknowns in the active pit to the state after a \
+        step with the given step length
+    :type apply_step: callable
+    :param assemble_system: function that returns the jacobian and the load vector at the \
+        current state of the active pit
+    :type assemble_system: callable
+    :param system_name: The name of the system ("hydraulics" or "heat_transfer")
+    :type system_name: str
+    :param state_columns: The pit columns of the unknowns (branch column, node column)
+    :type state_columns: tuple
+    :return: step_length - The accepted step length
+    :rtype: float
+    """
+    max_backtracks, armijo, memory = get_net_options(
+        net, "linesearch_max_backtracks", "linesearch_armijo", "linesearch_memory")
+    history = net["_internal_data"].setdefault("line_search_history_" + system_name, [])
+    history.append(linalg.norm(residual))
+    reference_norm = max(history[-memory:]) if len(history) > 1 else np.inf
+    step_length = 1.
+    for backtrack in range(max_backtracks + 1):
+        apply_step(step_length)
+        system = assemble_system(net)
+        if linalg.norm(system[1]) <= (1. - armijo * step_length) * reference_norm \
+                or backtrack == max_backtracks:
+            break
+        step_length /= 2
+    logger.debug("line search step length: %s" % step_length)
+    scale_quasi_newton_step(net, system_name, step_length, residual)
+
+    branch_col, node_col = state_columns
+    net["_internal_data"]["line_search_" + system_name] = (
+        net["_active_pit"]["branch"][:, branch_col].copy(),
+        net["_active_pit"]["node"][:, node_col].copy(), system)
+    return step_length
+
+
+def reset_line_search(net):
+    """
+    Discards the residual history and the stored systems of the line search, so that a new \
+    Newton-Raphson loop starts without information of a previous calculation.
+
+    :param net: The pandapipesNet
+    :type net: pandapipesNet
+    :return: No output
+    """
+    internal_data = net.get("_internal_data", dict())
+    for key in [k for k in internal_data.keys() if k.startswith("line_search_")]:
+        del internal_data[key]
 
-    node_pit[:, TINIT] += x[:len(node_pit)] * options["alpha"]
-    branch_pit[:, TOUTINIT] += x[len(node_pit):]
 
-    return [branch_pit[:, TOUTINIT], t_out_old, node_pit[:, TINIT], t_init_old], epsilon
+def get_line_search_system(net, system_name, state_columns):
+    """
+    Returns the system assembled during the line search of the last iteration if the unknowns in \
+    the active pit were not changed since then, otherwise None. The stored system is discarded in \
+    any case.
+
+    :param net: The pandapipesNet
+    :type net: pandapipesNet
+    :param system_name: The name of the system ("hydraulics" or "heat_transfer")
+    :type system_name: str
+    :param state_columns: The pit columns of the unknowns (branch column, node column)
+    :type state_columns: tuple
+    :return: system - The jacobian and load vector or None
+    :rtype: tuple
+    """
+    stored = net.get("_internal_data", dict()).pop("line_search_" + system_name, None)
+    if stored is None:
+        return None
+    branch_state, node_state, system = stored
+    branch_col, node_col = state_columns
+    if np.array_equal(branch_state, net["_active_pit"]["branch"][:, branch_col]) \
+            and np.array_equal(node_state, net["_active_pit"]["node"][:, node_col]):
+        return system
+    return None
 
 
 def set_damping_factor(net, niter, errors):
@@ -325,7 +907,7 @@ def finalize_iteration(net, niter, residual_norm, nonlinear_method, errors, tols
         if get_net_option(net, "alpha") != 1:
             net.converged = False
             return
-    elif nonlinear_method != "constant":
+    elif nonlinear_method not in ["constant", "linesearch"]:
         logger.warning("No proper nonlinear method chosen. Using constant settings.")
     for error, var, tol in zip(errors.values(), vars, tols):
         converged = error[niter] <= tol
@@ -3,7 +3,7 @@
 # Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
 
 import numpy as np
-from pandapipes.pf.internals_toolbox import select_from_pit
+from pandapipes.pf.internals_toolbox import select_from_pit, _sum_by_group, _sum_by_index
 
 
 def test_select_from_pit():
@@ -22,3 +22,13 @@ def test_select_from_pit():
 
     assert np.all(ret == expected_result)
 
+
+def test_sum_by_index():
+    indices = np.array([3, 0, 3, 1, 0, 3])
+    values = np.array([1., 2., 3., 4., 5., np.nan])
+
+    uni, sums = _sum_by_group(False, indices, values.copy())
+    ret = _sum_by_index(indices, values, 5)
+    assert np.array_equal(ret[uni], sums, equal_nan=True)
+    assert ret[2] == 0 and ret[4] == 0
+    assert np.isnan(ret[3])
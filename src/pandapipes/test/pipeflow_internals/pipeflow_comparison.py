@@ -0,0 +1,94 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+
+import pandapipes
+
+# Calculations that perform the same Newton iterations as the reference (other formulations of the
+# linear system, reused internal data) agree up to round-off errors, calculations with other
+# nonlinear iterations (e.g. line search, load continuation) only up to the convergence tolerances.
+SAME_ITERATIONS_TOLERANCE = {"rtol": 1e-8, "atol": 1e-10}
+CONVERGENCE_TOLERANCE = {"rtol": 1e-5, "atol": 1e-6}
+
+
+def assert_results_close(net, net_ref, tables=None, same_iterations=True, compare_pit=False):
+    """
+    Asserts that the result tables (and optionally the internal pit) of two calculated nets agree \
+    within the tolerance that applies to the way in which the net was calculated compared to the \
+    reference (c.f. SAME_ITERATIONS_TOLERANCE and CONVERGENCE_TOLERANCE).
+
+    :param net: The calculated net
+    :type net: pandapipesNet
+    :param net_ref: The reference net
+    :type net_ref: pandapipesNet
+    :param tables: The names of the result tables to compare, if None, the result tables of all \
+        components of the reference net are compared
+    :type tables: iterable, default None
+    :param same_iterations: If True, both nets were calculated with the same Newton iterations
+    :type same_iterations: bool, default True
+    :param compare_pit: If True, the node and branch pit are compared as well
+    :type compare_pit: bool, default False
+    :return: No output
+    """
+    tolerance = SAME_ITERATIONS_TOLERANCE if same_iterations else CONVERGENCE_TOLERANCE
+    if tables is None:
+        tables = ["res_" + comp.table_name() for comp in net_ref["component_list"]]
+    for table in tables:
+        assert np.allclose(net[table].values.astype(np.float64),
+                           net_ref[table].values.astype(np.float64), equal_nan=True,
+                           **tolerance), "results of %s differ" % table
+    if compare_pit:
+        for pit_type in ["node", "branch"]:
+            assert np.allclose(net["_pit"][pit_type], net_ref["_pit"][pit_type], equal_nan=True,
+                               **tolerance), "%s pit differs" % pit_type
+
+
+def pressure_control_net():
+    net = pandapipes.create_empty_network("net", add_stdtypes=False, fluid="lgas")
+    j1, j2, j3, j4, j5 = pandapipes.create_junctions(net, 5, pn_bar=5, tfluid_k=283.15)
+    pandapipes.create_pipe_from_parameters(net, j2, j3, k_mm=1., length_km=5., diameter_m=0.1022)
+    pandapipes.create_pipe_from_parameters(net, j3, j4, k_mm=1., length_km=10., diameter_m=0.1022)
+    pandapipes.create_pipe_from_parameters(net, j3, j5, k_mm=1., length_km=2., diameter_m=0.1022)
+    pandapipes.create_pipe_from_parameters(net, j4, j5, k_mm=1., length_km=2., diameter_m=0.1022)
+    pandapipes.create_pressure_control(net, j1, j2, j4, 2.)
+    pandapipes.create_ext_grid(net, j1, 5, 283.15, type="p")
+    pandapipes.create_sink(net, j4, 0.1)
+    pandapipes.create_sink(net, j5, 0.05)
+    return net
+
+
+def heat_consumer_net(treturn=True):
+    net = pandapipes.create_empty_network("net", add_stdtypes=False, fluid="water")
+    juncs = pandapipes.create_junctions(net, 6, pn_bar=5, tfluid_k=286,
+                                        system=["flow"] * 3 + ["return"] * 3)
+    pandapipes.create_pipes_from_parameters(
+        net, juncs[[0, 1, 3, 4]], juncs[[1, 2, 4, 5]], k_mm=0.1, length_km=1, diameter_m=0.1022,
+        system=["flow"] * 2 + ["return"] * 2, alpha_w_per_m2k=10, text_k=273.15)
+    pandapipes.create_circ_pump_const_pressure(net, juncs[-1], juncs[0], 5, 2, 300, type='pt')
+    pandapipes.create_heat_consumer(net, juncs[1], juncs[4], 0.1022, controlled_mdot_kg_per_s=3,
+                                    qext_w=150000)
+    if treturn:
+        # the mass flow of this consumer depends on the temperatures
+        pandapipes.create_heat_consumer(net, juncs[2], juncs[3], 0.1022,
+                                        treturn_k=285.4461399735642, qext_w=75000)
+    else:
+        pandapipes.create_heat_consumer(net, juncs[2], juncs[3], 0.1022,
+                                        deltat_k=5.9673377831196035, qext_w=75000)
+    return net
+
+
+def islands_net(n_islands=3):
+    net = pandapipes.create_empty_network("net", add_stdtypes=False, fluid="lgas")
+    for k in range(n_islands):
+        j = pandapipes.create_junctions(net, 4, pn_bar=1, tfluid_k=283.15)
+        pandapipes.create_ext_grid(net, j[0], 1, 283.15)
+        pandapipes.create_pipes_from_parameters(net, j[:-1], j[1:], length_km=1., diameter_m=0.1,
+                                                k_mm=0.1)
+        # the first islands are meshed, the last one is radial
+        if k < n_islands - 1:
+            pandapipes.create_pipe_from_parameters(net, j[0], j[3], length_km=2.,
+                                                   diameter_m=0.1, k_mm=0.1)
+        pandapipes.create_sinks(net, j[1:], 0.001 * (k + 1))
+    return net
@@ -0,0 +1,64 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as heat_nw
+from pandapipes.idx_branch import FROM_NODE, TO_NODE, FROM_NODE_T, TO_NODE_T, MDOTINIT
+from pandapipes.pf.pipeflow_setup import get_lookup
+
+
+def test_active_pit_view():
+    net = gas_nw.gas_meshed_delta()
+    pandapipes.pipeflow(net)
+    assert net["_active_pit"]["node"] is net["_pit"]["node"]
+    assert net["_active_pit"]["branch"] is net["_pit"]["branch"]
+    assert get_lookup(net, "node", "rows_active_hydraulics") is None
+    assert get_lookup(net, "branch", "rows_active_hydraulics") is None
+
+
+def test_active_pit_rows():
+    # the versatility net contains closed valves
+    net = gas_nw.gas_versatility()
+    pandapipes.pipeflow(net, iter=30)
+    assert net["_active_pit"]["node"] is net["_pit"]["node"]
+    branch_rows = get_lookup(net, "branch", "rows_active_hydraulics")
+    assert np.array_equal(branch_rows,
+                          np.flatnonzero(get_lookup(net, "branch", "active_hydraulics")))
+    assert len(branch_rows) < len(net["_pit"]["branch"])
+    assert np.array_equal(net["_active_pit"]["branch"], net["_pit"]["branch"][branch_rows],
+                          equal_nan=True)
+
+    # if nodes are inactive, the node indices of the active branch pit are reduced
+    net.pipe.loc[net.pipe.index[-1], "in_service"] = False
+    net.junction.loc[net.pipe.at[net.pipe.index[-1], "to_junction"], "in_service"] = False
+    pandapipes.pipeflow(net, iter=30)
+    node_rows = get_lookup(net, "node", "rows_active_hydraulics")
+    branch_rows = get_lookup(net, "branch", "rows_active_hydraulics")
+    assert np.array_equal(node_rows, np.flatnonzero(get_lookup(net, "node", "active_hydraulics")))
+    assert np.array_equal(net["_active_pit"]["node"], net["_pit"]["node"][node_rows],
+                          equal_nan=True)
+    active_from_nodes = net["_active_pit"]["branch"][:, FROM_NODE].astype(np.int32)
+    assert np.array_equal(node_rows[active_from_nodes],
+                          net["_pit"]["branch"][branch_rows, FROM_NODE])
+    assert np.isnan(net.res_junction.at[net.pipe.at[net.pipe.index[-1], "to_junction"], "p_bar"])
+
+
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+def test_active_pit_view_thermal_nodes(mode):
+    # the reversed pipe carries a negative mass flow, for which the heat transfer calculation
+    # exchanges the nodes in flow direction in the active pit, but not in the general pit
+    net = heat_nw.heat_transfer_delta()
+    pipe = net.pipe.index[0]
+    net.pipe.loc[pipe, ["from_junction", "to_junction"]] = \
+        net.pipe.loc[pipe, ["to_junction", "from_junction"]].values
+    pandapipes.pipeflow(net, mode=mode)
+    branch_pit = net["_pit"]["branch"]
+    assert net["_active_pit"]["branch"] is branch_pit
+    assert np.any(branch_pit[:, MDOTINIT] < 0)
+    assert np.array_equal(branch_pit[:, FROM_NODE_T], branch_pit[:, FROM_NODE])
+    assert np.array_equal(branch_pit[:, TO_NODE_T], branch_pit[:, TO_NODE])
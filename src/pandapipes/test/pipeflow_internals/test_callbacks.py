@@ -0,0 +1,75 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+from pandapipes.networks import simple_water_networks, simple_heat_transfer_networks
+
+
+class IterationRecorder:
+    def __init__(self, stop_at=None):
+        self.records = []
+        self.stop_at = stop_at
+
+    def __call__(self, net, **kwargs):
+        self.records.append(kwargs)
+        return kwargs["niter"] == self.stop_at
+
+
+def test_callbacks_hydraulics():
+    net = simple_water_networks.water_meshed_delta()
+    recorder = IterationRecorder()
+    niters = []
+    pandapipes.pipeflow(net, iter=100,
+                        callbacks=[recorder, lambda net, niter, **kwargs: niters.append(niter)])
+    assert net.converged
+
+    n_iter = net["_internal_results"]["iterations_hydraulics"]
+    assert niters == list(range(n_iter))
+    assert len(recorder.records) == n_iter
+    assert not net["_internal_results"]["terminated_hydraulics"]
+    last = recorder.records[-1]
+    assert last["mode"] == "hydraulics"
+    assert last["converged"]
+    assert not any(record["converged"] for record in recorder.records[:-1])
+    assert last["residual_norm"] == net["_internal_results"]["residual_norm_hydraulics"]
+    assert set(last["errors"]) == {"mdot", "p"}
+    assert last["errors"]["p"] == net["_internal_results"]["p"][-1]
+    assert last["alpha"] == 1
+    totals = [record["timings"]["total"] for record in recorder.records]
+    assert np.all(np.diff(totals) >= 0)
+    assert all(record["timings"]["iteration"] >= 0 for record in recorder.records)
+
+
+def test_callbacks_termination():
+    net = simple_water_networks.water_meshed_delta()
+    recorder = IterationRecorder(stop_at=1)
+    with pytest.raises(pandapipes.PipeflowNotConverged):
+        pandapipes.pipeflow(net, iter=100, callbacks=[recorder])
+    assert len(recorder.records) == 2
+    assert net["_internal_results"]["iterations_hydraulics"] == 2
+    assert net["_internal_results"]["terminated_hydraulics"]
+
+    # a termination request in the converged iteration does not invalidate the result
+    net = simple_water_networks.water_meshed_delta()
+    pandapipes.pipeflow(net, iter=100, callbacks=[lambda net, converged, **kwargs: converged])
+    assert net.converged
+    assert not net["_internal_results"]["terminated_hydraulics"]
+
+
+def test_callbacks_user_options():
+    net = simple_heat_transfer_networks.heat_transfer_delta()
+    recorder = IterationRecorder()
+    pandapipes.set_user_pf_options(net, callbacks=[recorder])
+    pandapipes.pipeflow(net, mode="bidirectional")
+    assert net.converged
+    assert len(recorder.records) == net["_internal_results"]["iterations_bidirectional"]
+    assert {record["mode"] for record in recorder.records} == {"bidirectional"}
+    assert set(recorder.records[0]["errors"]) == {"mdot", "p", "TOUT", "T"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
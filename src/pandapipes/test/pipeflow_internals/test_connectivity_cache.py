@@ -0,0 +1,169 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+from pandapipes.idx_branch import ACTIVE
+from pandapipes.pf.incremental_connectivity import create_adjacency, update_connectivity
+from pandapipes.pf.pipeflow_setup import check_connectivity, set_net_option
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, \
+    heat_consumer_net, islands_net
+
+
+def assert_cache_statistics(net, hits, misses):
+    assert net["_internal_results"]["connectivity_cache_hits"] == hits
+    assert net["_internal_results"]["connectivity_cache_misses"] == misses
+
+
+def test_connectivity_cache():
+    net = gas_nw.gas_versatility()
+    # the cache is only used if it is switched on
+    pandapipes.pipeflow(net, iter=30)
+    assert "_connectivity_cache" not in net
+    assert_cache_statistics(net, 0, 0)
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True)
+    assert_cache_statistics(net, 0, 1)
+
+    # changed set points do not change the connectivity
+    net.sink.mdot_kg_per_s *= 1.1
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True)
+    assert_cache_statistics(net, 1, 0)
+
+    # a closed valve changes the active branches
+    net.valve.opened = True
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True)
+    assert_cache_statistics(net, 0, 1)
+    net_ref = copy.deepcopy(net)
+    del net_ref["_connectivity_cache"]
+    pandapipes.pipeflow(net_ref, iter=30, connectivity_cache=False)
+    assert "_connectivity_cache" not in net_ref
+    assert_cache_statistics(net_ref, 0, 0)
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True)
+    assert_cache_statistics(net, 1, 0)
+    assert_results_close(net, net_ref)
+    for pit_type in ["node", "branch"]:
+        assert np.array_equal(net["_lookups"]["%s_active_hydraulics" % pit_type],
+                              net_ref["_lookups"]["%s_active_hydraulics" % pit_type])
+    assert net["_lookups"]["radial_hydraulics"] == net_ref["_lookups"]["radial_hydraulics"]
+
+
+def test_connectivity_cache_islands():
+    net = islands_net()
+    pandapipes.pipeflow(net, solve_islands=True, connectivity_cache=True)
+    assert_cache_statistics(net, 0, 1)
+    islands = net["_lookups"]["node_island_hydraulics"]
+    net.sink.mdot_kg_per_s *= 1.1
+    pandapipes.pipeflow(net, solve_islands=True, connectivity_cache=True)
+    assert_cache_statistics(net, 1, 0)
+    assert np.array_equal(net["_lookups"]["node_island_hydraulics"], islands)
+    assert list(net["_lookups"]["radial_islands_hydraulics"]) == [False, False, True]
+
+    # the option changes the result of the search
+    pandapipes.pipeflow(net, connectivity_cache=True)
+    assert_cache_statistics(net, 0, 1)
+    assert "node_island_hydraulics" not in net["_lookups"]
+
+
+def test_connectivity_cache_bidirectional():
+    net = heat_consumer_net()
+    pandapipes.pipeflow(net, mode="bidirectional", iter=30, alpha=0.65,
+                        connectivity_cache=True)
+    iterations = net["_internal_results"]["iterations_bidirectional"]
+    # the heat transfer connectivity is only searched again if the flow pattern changes
+    hits = net["_internal_results"]["connectivity_cache_hits"]
+    misses = net["_internal_results"]["connectivity_cache_misses"]
+    assert hits + misses == iterations + 1
+    assert hits >= iterations - 1
+
+
+def reachable_nodes(from_nodes, to_nodes, active_branches, slack_nodes, len_nodes):
+    adjacency = csr_matrix((np.ones(np.sum(active_branches)), (from_nodes[active_branches],
+                                                                to_nodes[active_branches])),
+                           shape=(len_nodes, len_nodes))
+    _, labels = connected_components(adjacency, directed=False)
+    return np.isin(labels, labels[slack_nodes])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_connectivity(seed):
+    rng = np.random.default_rng(seed)
+    len_nodes, len_branches = 200, 260
+    from_nodes = rng.integers(0, len_nodes, len_branches)
+    to_nodes = rng.integers(0, len_nodes, len_branches)
+    slack_nodes = rng.choice(len_nodes, 3, replace=False)
+    slack_mask = np.isin(np.arange(len_nodes), slack_nodes)
+    adjacency = create_adjacency(from_nodes, to_nodes, len_nodes)
+    active = rng.random(len_branches) < 0.8
+    connected = reachable_nodes(from_nodes, to_nodes, active, slack_nodes, len_nodes)
+    for n_switched in [1, 1, 2, 5, 1, 3] * 5:
+        new_active = np.copy(active)
+        switched = rng.choice(len_branches, n_switched, replace=False)
+        new_active[switched] = ~new_active[switched]
+        updated, n_visited = update_connectivity(adjacency, connected, active, new_active,
+                                                 from_nodes, to_nodes, slack_mask)
+        active = new_active
+        connected = reachable_nodes(from_nodes, to_nodes, active, slack_nodes, len_nodes)
+        if updated is not None:
+            assert np.array_equal(updated, connected)
+
+
+def test_incremental_connectivity():
+    net = gas_nw.gas_versatility()
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True, incremental_connectivity=True)
+    pipes = net.pipe.index
+    for pipe in [pipes[0], pipes[3], pipes[-1]]:
+        for in_service in [False, True]:
+            net.pipe.loc[pipe, "in_service"] = in_service
+            pandapipes.pipeflow(net, iter=30, connectivity_cache=True,
+                                incremental_connectivity=True)
+            assert net["_internal_results"]["connectivity_incremental_updates"] == 1
+
+            net_ref = copy.deepcopy(net)
+            pandapipes.pipeflow(net_ref, iter=30)
+            assert_results_close(net, net_ref)
+            for lookup in ["node_active_hydraulics", "branch_active_hydraulics",
+                           "radial_hydraulics"]:
+                assert np.array_equal(net["_lookups"][lookup], net_ref["_lookups"][lookup])
+
+    net.pipe.loc[pipes[0], "in_service"] = False
+    pandapipes.pipeflow(net, iter=30, connectivity_cache=True)
+    assert net["_internal_results"]["connectivity_incremental_updates"] == 0
+    assert net["_internal_results"]["connectivity_cache_misses"] == 1
+
+
+def test_incremental_connectivity_local():
+    # switching single pipes of a realistic net one after another, the local searches find the
+    # same connected nodes and branches as the full searches, visiting only a small share of the
+    # nodes
+    net = gas_nw.schutterwald()
+    pandapipes.pipeflow(net)
+    node_pit = net["_pit"]["node"]
+    switched = np.random.default_rng(0).choice(len(net["_pit"]["branch"]), 100, replace=False)
+    results = dict()
+    for incremental in [False, True]:
+        set_net_option(net, "connectivity_cache", True)
+        set_net_option(net, "incremental_connectivity", incremental)
+        net.pop("_connectivity_cache", None)
+        branch_pit = np.copy(net["_pit"]["branch"])
+        check_connectivity(net, branch_pit, node_pit)
+        results[incremental] = []
+        for branch in switched:
+            for active in [0., 1.]:
+                branch_pit[branch, ACTIVE] = active
+                results[incremental].append(check_connectivity(net, branch_pit, node_pit))
+    for full, local in zip(results[False], results[True]):
+        assert np.array_equal(full[0], local[0]) and np.array_equal(full[1], local[1])
+    # most switches are handled locally and all local searches (including the aborted ones)
+    # visit less than 5 % of the nodes that the full searches visit
+    cache = net["_connectivity_cache"]
+    n_checks = 2 * len(switched)
+    assert cache["incremental"] >= 0.7 * n_checks
+    assert cache["visited"] < 0.05 * n_checks * len(node_pit)
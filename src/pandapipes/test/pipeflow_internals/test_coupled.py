@@ -0,0 +1,170 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import sys
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.idx_branch import MDOTINIT, TOUTINIT
+from pandapipes.idx_node import PINIT, TINIT
+from pandapipes.pf.coupled_system import build_coupled_system, set_thermal_flow_direction
+from pandapipes.pf.fixed_point_acceleration import accelerate_fixed_point
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, \
+    heat_consumer_net
+
+
+@pytest.mark.parametrize("treturn", [True, False])
+def test_monolithic_coupling(treturn):
+    net_ref = heat_consumer_net(treturn)
+    pandapipes.pipeflow(net_ref, mode="bidirectional", iter=30, alpha=0.65)
+
+    net = heat_consumer_net(treturn)
+    pandapipes.pipeflow(net, mode="bidirectional", bidirectional_coupling="monolithic")
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    if treturn:
+        assert net["_internal_results"]["iterations_bidirectional"] \
+               < net_ref["_internal_results"]["iterations_bidirectional"]
+
+
+@pytest.mark.parametrize("create_net", [nw.heat_transfer_delta, nw.heat_transfer_delta_2sinks])
+def test_monolithic_coupling_delta(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, mode="bidirectional", tol_p=1e-8, tol_m=1e-8, tol_T=1e-8)
+
+    net = create_net()
+    pandapipes.pipeflow(net, mode="bidirectional", tol_p=1e-8, tol_m=1e-8, tol_T=1e-8,
+                        bidirectional_coupling="monolithic")
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+def coupled_residual(net, thermal_rows):
+    pf = sys.modules["pandapipes.pipeflow"]
+    set_thermal_flow_direction(net["_active_pit"]["branch"])
+    _, residual_hyd = pf.assemble_hydraulic_system(net)
+    _, load_t = pf.assemble_thermal_system(net)
+    return np.concatenate([residual_hyd, -load_t])
+
+
+def test_coupled_jacobian(monkeypatch):
+    # the analytic cross derivatives are compared with finite differences at the first iterate of
+    # the monolithic Newton method (consumers with fixed deltat are not considered, as their mass
+    # flow is overwritten in the pit instead of being part of the residual)
+    pf = sys.modules["pandapipes.pipeflow"]
+    systems = []
+
+    def check_coupled_system(net, assemble_hydraulics, assemble_thermal, thermal_rows):
+        system = build_coupled_system(net, assemble_hydraulics, assemble_thermal, thermal_rows)
+        if systems:
+            return system
+        systems.append(system[0].toarray())
+        branch_pit, node_pit = net["_active_pit"]["branch"], net["_active_pit"]["node"]
+        len_nb = len(node_pit) + len(branch_pit)
+        state = branch_pit.copy(), node_pit.copy()
+        residual = coupled_residual(net, thermal_rows)
+        for block, (pit, col, steps) in enumerate([(node_pit, TINIT, 1e-4),
+                                                   (branch_pit, TOUTINIT, 1e-4),
+                                                   (node_pit, PINIT, 1e-7),
+                                                   (branch_pit, MDOTINIT, 1e-7)]):
+            offset = [len_nb, len_nb + len(node_pit), 0, len(node_pit)][block]
+            rows = slice(0, len_nb) if block < 2 else slice(len_nb, 2 * len_nb)
+            for i in range(len(pit)):
+                pit[i, col] += steps
+                derivative = (coupled_residual(net, thermal_rows) - residual)[rows] / steps
+                branch_pit[:], node_pit[:] = state
+                assert np.allclose(systems[0][rows, offset + i], derivative, rtol=1e-4,
+                                   atol=1e-6 * np.abs(systems[0][rows]).max())
+        return system
+
+    monkeypatch.setattr(pf, "build_coupled_system", check_coupled_system)
+    net = heat_consumer_net()
+    pandapipes.pipeflow(net, mode="bidirectional", bidirectional_coupling="monolithic")
+    assert net.converged
+    assert systems
+
+
+@pytest.mark.parametrize("acceleration", ["anderson", "aitken"])
+def test_accelerated_coupling(acceleration):
+    net_ref = heat_consumer_net()
+    pandapipes.pipeflow(net_ref, mode="bidirectional", iter=30, alpha=0.65)
+
+    net = heat_consumer_net()
+    with pytest.raises(pandapipes.PipeflowNotConverged):
+        pandapipes.pipeflow(net, mode="bidirectional", iter=30)
+
+    net = heat_consumer_net()
+    pandapipes.pipeflow(net, mode="bidirectional", iter=30, bidirectional_acceleration=acceleration)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    if acceleration == "anderson":
+        assert net["_internal_results"]["iterations_bidirectional"] \
+               < net_ref["_internal_results"]["iterations_bidirectional"]
+
+
+@pytest.mark.parametrize("acceleration", ["anderson", "aitken"])
+def test_accelerated_coupling_delta(acceleration):
+    net_ref = nw.heat_transfer_delta_2sinks()
+    pandapipes.pipeflow(net_ref, mode="bidirectional", tol_p=1e-8, tol_m=1e-8, tol_T=1e-8)
+
+    net = nw.heat_transfer_delta_2sinks()
+    pandapipes.pipeflow(net, mode="bidirectional", tol_p=1e-8, tol_m=1e-8, tol_T=1e-8,
+                        bidirectional_acceleration=acceleration, acceleration_memory=2)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+@pytest.mark.parametrize("acceleration", ["anderson", "aitken"])
+@pytest.mark.parametrize("create_net", [nw.heat_transfer_delta, gas_nw.gas_versatility,
+                                        gas_nw.gas_tcross1, water_nw.water_meshed_pumps])
+def test_accelerated_coupling_iterations(create_net, acceleration):
+    # the plain iteration converges superlinearly on these nets, so that it is not accelerated
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, mode="bidirectional")
+
+    net = create_net()
+    pandapipes.pipeflow(net, mode="bidirectional", bidirectional_acceleration=acceleration)
+    assert net["_internal_results"]["iterations_bidirectional"] \
+           <= net_ref["_internal_results"]["iterations_bidirectional"]
+    assert_results_close(net, net_ref)
+
+
+@pytest.mark.parametrize("acceleration", ["anderson", "aitken"])
+def test_acceleration_safeguard(acceleration):
+    # oscillating, diverging iteration x -> -1.1 * x + 1 with the fixed point 1 / 2.1
+    state, weights = dict(), np.ones(2)
+    x = np.array([0., 2.])
+    x_plain = accelerate_fixed_point(state, x, -1.1 * x + 1, weights, acceleration)
+    assert not state["accelerated"]
+    x_next = accelerate_fixed_point(state, x_plain, -1.1 * x_plain + 1, weights, acceleration)
+    assert state["accelerated"]
+    assert np.allclose(x_next, 1 / 2.1)
+
+    # an accelerated iterate that increases the residual is rejected and replaced by the plain
+    # step of the previous iterate
+    x_next += 10
+    x_rejected = accelerate_fixed_point(state, x_next, -1.1 * x_next + 1, weights, acceleration)
+    assert np.array_equal(x_rejected, -1.1 * x_plain + 1)
+    assert not state["accelerated"]
+
+
+def test_unknown_acceleration():
+    net = heat_consumer_net()
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow(net, mode="bidirectional", bidirectional_acceleration="broyden")
+
+
+def test_unknown_coupling():
+    net = heat_consumer_net()
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow(net, mode="bidirectional", bidirectional_coupling="simultaneous")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
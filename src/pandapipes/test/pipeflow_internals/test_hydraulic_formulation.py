@@ -0,0 +1,241 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as heat_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.pf.build_system_matrix import HydraulicJacobianOperator
+from pandapipes.pipeflow import assemble_hydraulic_system
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, \
+    pressure_control_net
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, gas_nw.gas_versatility,
+                                        water_nw.water_meshed_pumps,
+                                        water_nw.water_meshed_2valves, pressure_control_net])
+def test_schur_complement(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref)
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="schur")
+    assert net.converged
+    assert_results_close(net, net_ref)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        == net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+def test_schur_complement_heat(mode):
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode=mode)
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode=mode, hydraulic_formulation="schur")
+    assert net.converged
+    assert_results_close(net, net_ref)
+
+
+def radial_net(n_junctions=60):
+    net = pandapipes.create_empty_network("net", add_stdtypes=False, fluid="lgas")
+    junctions = pandapipes.create_junctions(net, n_junctions, pn_bar=1, tfluid_k=283.15)
+    pandapipes.create_ext_grid(net, junctions[0], 1, 283.15, type="pt")
+    # binary tree, every second pipe is connected in reverse direction
+    for j in range(1, n_junctions):
+        fj, tj = junctions[(j - 1) // 2], junctions[j]
+        if j % 2:
+            fj, tj = tj, fj
+        pandapipes.create_pipe_from_parameters(net, fj, tj, k_mm=0.1, length_km=0.2,
+                                               diameter_m=0.05)
+    pandapipes.create_sinks(net, junctions[1:], 0.0005)
+    return net
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_tcross, gas_nw.gas_tcross1,
+                                        water_nw.water_strand_net_2pumps, radial_net])
+def test_radial_sweep(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="auto")
+    assert net.converged
+    assert net["_lookups"]["radial_hydraulics"]
+    # the sweep does not need any factorization
+    assert net["_internal_results"]["linear_solver_fill_in_hydraulics"] == 1
+    assert_results_close(net, net_ref)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        == net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, pressure_control_net])
+def test_radial_sweep_not_radial(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="radial")
+    assert not net["_lookups"]["radial_hydraulics"]
+    assert net.converged
+    assert_results_close(net, net_ref)
+
+
+def test_radial_sweep_out_of_service():
+    # closing a valve of the meshed network leads to a radial network
+    net = water_nw.water_meshed_2valves()
+    pandapipes.pipeflow(net)
+    assert not net["_lookups"]["radial_hydraulics"]
+
+    net.valve.loc[0, "opened"] = False
+    net_ref = copy.deepcopy(net)
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+    pandapipes.pipeflow(net)
+    assert net["_lookups"]["radial_hydraulics"]
+    assert_results_close(net, net_ref)
+
+
+def test_radial_sweep_quasi_newton():
+    net_ref = radial_net()
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+
+    net = radial_net()
+    pandapipes.pipeflow(net, jacobian_update="broyden", max_iter_hyd=30)
+    assert net.converged
+    assert np.allclose(net.res_junction.p_bar.values, net_ref.res_junction.p_bar.values,
+                       rtol=1e-6)
+
+
+def meshed_net(n_junctions=60, n_loops=5):
+    net = radial_net(n_junctions)
+    # close loops between neighbouring leaves of the binary tree
+    for j in range(n_loops):
+        pandapipes.create_pipe_from_parameters(net, n_junctions - 2 * j - 1, n_junctions - 2 * j - 2,
+                                               k_mm=0.1, length_km=0.3, diameter_m=0.05)
+    # parallel pipe to the first pipe
+    pandapipes.create_pipe_from_parameters(net, 0, 1, k_mm=0.1, length_km=0.2, diameter_m=0.04)
+    return net
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, gas_nw.gas_3parallel,
+                                        water_nw.water_meshed_pumps,
+                                        water_nw.water_meshed_2valves, meshed_net])
+def test_loop_flows(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="loop")
+    assert net.converged
+    assert_results_close(net, net_ref)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        == net_ref["_internal_results"]["iterations_hydraulics"]
+    n_loops = len(net_ref._active_pit["branch"]) - len(net_ref._active_pit["node"]) + 1
+    assert net["_internal_results"]["loops_hydraulics"] == n_loops
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_versatility, pressure_control_net])
+def test_loop_flows_fallback(create_net):
+    # several external grids or pressure controllers are solved in the full formulation
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, hydraulic_formulation="full")
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="loop")
+    assert net.converged
+    assert "loops_hydraulics" not in net["_internal_results"]
+    assert_results_close(net, net_ref)
+
+
+def test_loop_flows_heat():
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode="sequential", hydraulic_formulation="full")
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode="sequential", hydraulic_formulation="loop")
+    assert net.converged
+    assert_results_close(net, net_ref)
+
+
+def circulation_net():
+    net = pandapipes.create_empty_network("net", fluid="water")
+    j = pandapipes.create_junctions(net, 4, pn_bar=5, tfluid_k=330)
+    pandapipes.create_ext_grid(net, j[0], 5, 350)
+    pandapipes.create_pipe_from_parameters(net, j[0], j[1], 0.1, 0.1, k_mm=0.1,
+                                           alpha_w_per_m2k=5, text_k=280)
+    # the pump leads to a circulating flow in the loop j1 -> j2 -> j3 -> j1
+    pandapipes.create_pump(net, j[1], j[2], "P1")
+    pandapipes.create_pipe_from_parameters(net, j[2], j[3], 1, 0.1, k_mm=0.1,
+                                           alpha_w_per_m2k=5, text_k=280)
+    pandapipes.create_pipe_from_parameters(net, j[3], j[1], 1, 0.1, k_mm=0.1,
+                                           alpha_w_per_m2k=5, text_k=280)
+    pandapipes.create_sink(net, j[3], 0.5)
+    return net
+
+
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+@pytest.mark.parametrize("create_net, loops", [(heat_nw.heat_transfer_delta, 0),
+                                               (heat_nw.heat_transfer_delta_2sinks, 0),
+                                               (circulation_net, 1)])
+def test_upwind_heat_formulation(create_net, loops, mode):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, mode=mode, heat_formulation="full")
+
+    net = create_net()
+    pandapipes.pipeflow(net, mode=mode, heat_formulation="upwind")
+    assert net.converged
+    assert_results_close(net, net_ref)
+    assert net["_internal_results"]["loops_heat_transfer"] == loops
+    assert net["_internal_results"]["linear_solver_fill_in_heat_transfer"] == 1
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, gas_nw.gas_versatility,
+                                        water_nw.water_meshed_pumps, pressure_control_net])
+def test_newton_krylov_operator(create_net):
+    net = create_net()
+    pandapipes.pipeflow(net)
+    jacobian, load_vector = assemble_hydraulic_system(net)
+    operator, load_vector_mf = assemble_hydraulic_system(net, matrix_free=True)
+    assert isinstance(operator, HydraulicJacobianOperator)
+    x = np.random.default_rng(0).random(jacobian.shape[0])
+    assert np.allclose(operator @ x, jacobian @ x, rtol=1e-12, atol=1e-12)
+    assert np.array_equal(load_vector_mf, load_vector)
+
+
+@pytest.mark.parametrize("preconditioner", ["ilu", "block_jacobi"])
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, gas_nw.gas_versatility,
+                                        water_nw.water_meshed_pumps,
+                                        water_nw.water_meshed_2valves, pressure_control_net])
+def test_newton_krylov(create_net, preconditioner):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref)
+
+    net = create_net()
+    pandapipes.pipeflow(net, hydraulic_formulation="krylov", krylov_preconditioner=preconditioner,
+                        krylov_block_size=4)
+    assert net.converged
+    assert_results_close(net, net_ref)
+    assert net["_internal_results"]["krylov_iterations_hydraulics"] > 0
+
+
+def test_newton_krylov_linesearch():
+    net_ref = meshed_net()
+    pandapipes.pipeflow(net_ref, nonlinear_method="linesearch")
+
+    net = meshed_net()
+    pandapipes.pipeflow(net, nonlinear_method="linesearch", hydraulic_formulation="krylov")
+    assert net.converged
+    assert_results_close(net, net_ref)
+
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow(net, hydraulic_formulation="krylov", krylov_preconditioner="jacobi")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
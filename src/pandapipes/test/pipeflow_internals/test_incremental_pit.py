@@ -0,0 +1,100 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, \
+    pressure_control_net
+
+
+def change_setpoints(net, factor, dp):
+    # the set points are written to the tables directly, as done by controllers and time series
+    for table in ["sink", "source"]:
+        if table in net:
+            net[table]["mdot_kg_per_s"] *= factor
+    net.ext_grid.loc[net.ext_grid.index[0], "p_bar"] += dp
+    if "press_control" in net:
+        net.press_control["controlled_p_bar"] += dp / 2
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_meshed_pumps, gas_nw.gas_versatility,
+                                        pressure_control_net])
+def test_incremental_pit_update(create_net):
+    net = create_net()
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True)
+    assert net["_pit_structure"]["updates"] == 0
+    for i, (factor, dp) in enumerate([(1.2, 0.1), (0.7, -0.05)]):
+        change_setpoints(net, factor, dp)
+        pandapipes.pipeflow(net, iter=30, incremental_pit_update=True)
+        assert net.converged
+        assert net["_pit_structure"]["updates"] == i + 1
+
+        net_ref = copy.deepcopy(net)
+        del net_ref["_pit_structure"]
+        pandapipes.pipeflow(net_ref, iter=30)
+        assert_results_close(net, net_ref, compare_pit=True)
+
+
+def test_incremental_pit_direct_change():
+    net = gas_nw.gas_meshed_delta()
+    pandapipes.pipeflow(net, incremental_pit_update=True)
+    p_before = net.res_junction.p_bar.values.copy()
+    net.sink.mdot_kg_per_s = net.sink.mdot_kg_per_s * 1.5
+    pandapipes.pipeflow(net, incremental_pit_update=True)
+    assert net["_pit_structure"]["updates"] == 1
+    assert not np.allclose(net.res_junction.p_bar.values, p_before, rtol=0, atol=1e-9)
+
+    net_ref = copy.deepcopy(net)
+    del net_ref["_pit_structure"]
+    pandapipes.pipeflow(net_ref)
+    assert_results_close(net, net_ref, compare_pit=True)
+
+
+def test_incremental_pit_rebuild():
+    net = gas_nw.gas_versatility()
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True)
+
+    # the structure is not reused if it was invalidated or if the options or the structural
+    # columns change
+    net.pipe.loc[net.pipe.index[0], "length_km"] *= 1.5
+    pandapipes.invalidate_pit_structure(net)
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True)
+    assert net["_pit_structure"]["updates"] == 0
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net["_pit_structure"]["updates"] == 0
+    net.sink.loc[net.sink.index[0], "in_service"] = False
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net["_pit_structure"]["updates"] == 0
+    net.valve.loc[net.valve.index[0], "opened"] = not net.valve.opened.iloc[0]
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net["_pit_structure"]["updates"] == 0
+    net_ref = copy.deepcopy(net)
+    pandapipes.create_sink(net, net.junction.index[1], 0.01)
+    pandapipes.pipeflow(net, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net["_pit_structure"]["updates"] == 0
+
+    # unchanged set points only reuse the structure
+    net_unchanged = copy.deepcopy(net)
+    pandapipes.pipeflow(net_unchanged, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net_unchanged["_pit_structure"]["updates"] == 1
+    assert_results_close(net_unchanged, net, compare_pit=True)
+
+    # the changed mass flow of an out of service sink does not change the results
+    net_ref.sink.loc[net_ref.sink.index[0], "mdot_kg_per_s"] *= 3
+    pandapipes.pipeflow(net_ref, iter=30, incremental_pit_update=True, tol_p=1e-6)
+    assert net_ref["_pit_structure"]["updates"] == 1
+    net_oos = copy.deepcopy(net_ref)
+    del net_oos["_pit_structure"]
+    pandapipes.pipeflow(net_oos, iter=30, tol_p=1e-6)
+    assert_results_close(net_ref, net_oos, compare_pit=True)
+
+    # without the option, the structure is removed
+    pandapipes.pipeflow(net, iter=30, tol_p=1e-6)
+    assert "_pit_structure" not in net
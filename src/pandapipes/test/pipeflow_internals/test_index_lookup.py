@@ -0,0 +1,50 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+from pandapipes.pf.pipeflow_setup import IndexLookup, get_lookup
+from pandapipes.toolbox import reindex_elements
+
+
+@pytest.mark.parametrize("indices", [[3, 0, 7, 5], [4_000_000_017, 12, 9_876_543_210, 5]])
+def test_index_lookup(indices):
+    positions = np.arange(len(indices)) + 10
+    lookup = IndexLookup(indices, positions)
+    assert lookup.is_dense == (max(indices) < 1000)
+    assert len(lookup) == len(indices)
+    assert np.array_equal(lookup[np.array(indices)], positions)
+    assert lookup[indices[2]] == positions[2]
+    assert np.array_equal(lookup.positions, positions[np.argsort(indices)])
+    assert len(IndexLookup([], [])[np.array([], dtype=np.int64)]) == 0
+    for missing in [1, np.array([indices[0], 6]), -1, max(indices) + 1]:
+        with pytest.raises(KeyError):
+            lookup[missing]
+    with pytest.raises(KeyError):
+        IndexLookup([], [])[3]
+
+
+def test_pipeflow_unknown_junction():
+    net = gas_nw.gas_versatility()
+    net.sink.loc[net.sink.index[0], "junction"] = net.junction.index.max() + 5
+    with pytest.raises(KeyError):
+        pandapipes.pipeflow(net, iter=30)
+
+
+def test_pipeflow_high_indices():
+    net = gas_nw.gas_versatility()
+    pandapipes.pipeflow(net, iter=30)
+    res_junction = net.res_junction.values.copy()
+    res_pipe = net.res_pipe.values.copy()
+
+    reindex_elements(net, "junction", net.junction.index.values + 9_000_000_000)
+    pandapipes.pipeflow(net, iter=30)
+    lookup = get_lookup(net, "node", "index")["junction"]
+    assert not lookup.is_dense
+    assert lookup.indices.nbytes == 8 * len(net.junction)
+    assert np.allclose(net.res_junction.values, res_junction, equal_nan=True)
+    assert np.allclose(net.res_pipe.values, res_pipe, equal_nan=True)
@@ -0,0 +1,80 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as heat_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.pf.pipeflow_setup import PipeflowNotConverged
+
+
+def _changed_net(create_net, mode):
+    net = create_net()
+    pandapipes.pipeflow(net, mode=mode)
+    net.sink.mdot_kg_per_s *= 1.05
+    net_ref = copy.deepcopy(net)
+    pandapipes.pipeflow(net_ref, mode=mode)
+    return net, net_ref
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_versatility, water_nw.water_meshed_pumps])
+@pytest.mark.parametrize("init", ["results", "auto"])
+def test_init_results(create_net, init):
+    net, net_ref = _changed_net(create_net, "hydraulics")
+    pandapipes.pipeflow(net, init=init)
+    assert np.allclose(net.res_junction.values, net_ref.res_junction.values, rtol=1e-5)
+    assert np.allclose(net.res_pipe.v_mean_m_per_s.values, net_ref.res_pipe.v_mean_m_per_s.values,
+                       rtol=1e-3, atol=1e-3)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        < net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+def test_init_result_tables():
+    net, net_ref = _changed_net(gas_nw.gas_versatility, "hydraulics")
+    del net["_pit"]
+    pandapipes.pipeflow(net, init="results")
+    assert np.allclose(net.res_junction.values, net_ref.res_junction.values, rtol=1e-5)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        < net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+def test_init_changed_set_points():
+    net, _ = _changed_net(water_nw.water_meshed_pumps, "hydraulics")
+    # changed pressures of the external grids must not be overwritten by the last results
+    net.ext_grid.p_bar += 0.5
+    net_ref = copy.deepcopy(net)
+    pandapipes.pipeflow(net_ref)
+    pandapipes.pipeflow(net, init="results")
+    assert np.allclose(net.res_junction.values, net_ref.res_junction.values, rtol=1e-5)
+    assert np.allclose(net.res_ext_grid.values, net_ref.res_ext_grid.values, rtol=1e-4)
+
+
+def test_init_auto_not_converged():
+    net = water_nw.water_meshed_pumps()
+    with pytest.raises(PipeflowNotConverged):
+        pandapipes.pipeflow(net, max_iter_hyd=2)
+    net_ref = copy.deepcopy(net)
+    pandapipes.pipeflow(net_ref)
+    # the results of the diverged calculation are not used
+    pandapipes.pipeflow(net, init="auto")
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        == net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+def test_init_results_heat(mode):
+    net, net_ref = _changed_net(heat_nw.heat_transfer_delta, mode)
+    pandapipes.pipeflow(net, mode=mode, init="results")
+    assert np.allclose(net.res_junction.values, net_ref.res_junction.values, rtol=1e-5)
+    assert np.allclose(net.res_pipe.v_mean_m_per_s.values, net_ref.res_pipe.v_mean_m_per_s.values,
+                       rtol=1e-3, atol=1e-3)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,86 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapipes
+from pandapipes.pipeflow import PipeflowNotConverged
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, islands_net
+
+
+@pytest.mark.parametrize("island_workers", [1, 3])
+def test_islands(island_workers):
+    net_ref = islands_net()
+    pandapipes.pipeflow(net_ref, tol_p=1e-8, tol_m=1e-8)
+
+    net = islands_net()
+    pandapipes.pipeflow(net, tol_p=1e-8, tol_m=1e-8, solve_islands=True,
+                        island_workers=island_workers)
+    assert net.converged
+    assert np.all(net["_internal_results"]["islands_converged_hydraulics"])
+    assert list(net["_lookups"]["radial_islands_hydraulics"]) == [False, False, True]
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+def test_islands_not_converged():
+    net = islands_net()
+    # the sinks of the second island cannot be supplied
+    net.sink.loc[net.sink.junction.isin([4, 5, 6, 7]), "mdot_kg_per_s"] = 50.
+    net_ref = copy.deepcopy(net)
+    with pytest.raises(PipeflowNotConverged):
+        pandapipes.pipeflow(net_ref)
+
+    pandapipes.pipeflow(net, solve_islands=True)
+    assert net.converged
+    assert not net.user_pf_options["hyd_flag"]
+    assert list(net["_internal_results"]["islands_converged_hydraulics"]) == [True, False, True]
+    residual_norms = net["_internal_results"]["islands_residual_norm_hydraulics"]
+    assert residual_norms[1] > 1 > max(residual_norms[0], residual_norms[2])
+    # the last iterate of the island that did not converge is part of the results
+    assert not np.any(np.isnan(net.res_junction.p_bar.values))
+    assert not np.any(np.isnan(net.res_pipe.v_mean_m_per_s.values))
+
+    net.sink.loc[:, "mdot_kg_per_s"] = 50.
+    with pytest.raises(PipeflowNotConverged):
+        pandapipes.pipeflow(net, solve_islands=True)
+
+
+def test_islands_load_continuation():
+    net_ref = islands_net()
+    pandapipes.pipeflow(net_ref, tol_p=1e-8, tol_m=1e-8)
+
+    net = islands_net()
+    pandapipes.pipeflow(net, tol_p=1e-8, tol_m=1e-8, solve_islands=True, load_continuation=True,
+                        continuation_initial_step=0.25)
+    assert net.converged
+    assert np.all(net["_internal_results"]["islands_load_factor_hydraulics"] == 1)
+    # each island is ramped up in its own continuation steps
+    assert np.all(net["_internal_results"]["islands_iterations_hydraulics"]
+                  > net_ref["_internal_results"]["iterations_hydraulics"])
+    assert_results_close(net, net_ref, tables=["res_junction"])
+
+    # the island that cannot be supplied does not stop at the first failed solve
+    net.sink.loc[net.sink.junction.isin([4, 5, 6, 7]), "mdot_kg_per_s"] = 50.
+    pandapipes.pipeflow(net, solve_islands=True, load_continuation=True,
+                        continuation_max_solves=6)
+    factors = net["_internal_results"]["islands_load_factor_hydraulics"]
+    assert list(net["_internal_results"]["islands_converged_hydraulics"]) == [True, False, True]
+    assert factors[0] == factors[2] == 1 and factors[1] < 1
+
+
+def test_islands_sequential():
+    net_ref = islands_net()
+    pandapipes.pipeflow(net_ref, mode="sequential")
+
+    net = islands_net()
+    pandapipes.pipeflow(net, mode="sequential", solve_islands=True)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
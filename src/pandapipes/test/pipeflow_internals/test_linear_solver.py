@@ -0,0 +1,163 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import copy
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as heat_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.pf.linear_solver import umfpack_installed, solve_quasi_newton, \
+    scale_quasi_newton_step, _apply_inverse
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("create_net", [gas_nw.gas_meshed_delta, water_nw.water_meshed_2valves])
+def test_reuse_factorization_hydraulics(create_net, use_numba):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, use_numba=use_numba)
+
+    net = create_net()
+    pandapipes.pipeflow(net, use_numba=use_numba, reuse_factorization=True)
+    assert net.converged
+    assert_results_close(net, net_ref)
+    assert "_internal_data" not in net
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+def test_reuse_factorization_sequential(use_numba):
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode="sequential", use_numba=use_numba)
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode="sequential", use_numba=use_numba, reuse_factorization=True)
+    assert net.converged
+    assert_results_close(net, net_ref)
+
+
+def test_reuse_factorization_internal_data():
+    net = water_nw.water_meshed_2valves()
+    # the factorization is bypassed by the radial sweep if the net becomes radial
+    pandapipes.set_user_pf_options(net, hydraulic_formulation="full")
+    pandapipes.pipeflow(net, reuse_factorization=True, reuse_internal_data=True)
+    structure = net["_internal_data"]["factorization_hydraulics"]
+    res_ref = copy.deepcopy(net.res_junction)
+
+    # the cached ordering is kept for the next pipeflow, as the sparsity pattern is unchanged
+    pandapipes.pipeflow(net, reuse_factorization=True, reuse_internal_data=True)
+    assert net["_internal_data"]["factorization_hydraulics"] is structure
+    assert np.allclose(net.res_junction.values, res_ref.values)
+
+    # a change in topology leads to a new ordering
+    net.valve.loc[0, "opened"] = not net.valve.at[0, "opened"]
+    pandapipes.pipeflow(net, reuse_factorization=True, reuse_internal_data=True)
+    assert net["_internal_data"]["factorization_hydraulics"] is not structure
+    assert net.converged
+
+
+@pytest.mark.parametrize("linear_solver", ["superlu", "umfpack", "gmres", "bicgstab"])
+def test_linear_solver_backends(linear_solver):
+    if linear_solver == "umfpack" and not umfpack_installed:
+        pytest.skip("scikit-umfpack is not installed")
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode="sequential")
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode="sequential", linear_solver=linear_solver)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    assert net["_internal_results"]["linear_solver_time_heat_transfer"] > 0
+    assert net["_internal_results"]["linear_solver_fill_in_heat_transfer"] > 0
+
+
+@pytest.mark.parametrize("permc_spec", ["NATURAL", "MMD_ATA", "MMD_AT_PLUS_A", "COLAMD"])
+def test_superlu_permc_spec(permc_spec):
+    net_ref = gas_nw.gas_meshed_delta()
+    pandapipes.pipeflow(net_ref)
+
+    net = gas_nw.gas_meshed_delta()
+    pandapipes.pipeflow(net, linear_solver="superlu", permc_spec=permc_spec)
+    assert_results_close(net, net_ref)
+    assert np.isnan(net_ref["_internal_results"]["linear_solver_fill_in_hydraulics"])
+    assert net["_internal_results"]["linear_solver_fill_in_hydraulics"] >= 1
+
+
+def test_unknown_linear_solver():
+    net = gas_nw.gas_meshed_delta()
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow(net, linear_solver="unknown")
+
+
+@pytest.mark.parametrize("jacobian_update", ["chord", "broyden"])
+@pytest.mark.parametrize("hydraulic_formulation", ["full", "schur"])
+def test_quasi_newton(jacobian_update, hydraulic_formulation):
+    net_ref = water_nw.water_meshed_pumps()
+    pandapipes.pipeflow(net_ref)
+
+    net = water_nw.water_meshed_pumps()
+    pandapipes.pipeflow(net, jacobian_update=jacobian_update, max_iter_hyd=30,
+                        hydraulic_formulation=hydraulic_formulation)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    res = net["_internal_results"]
+    assert res["jacobian_factorizations_hydraulics"] < res["iterations_hydraulics"]
+    assert net_ref["_internal_results"]["jacobian_factorizations_hydraulics"] \
+        == net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+@pytest.mark.parametrize("jacobian_update", ["chord", "broyden"])
+def test_quasi_newton_sequential(jacobian_update):
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode="sequential")
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode="sequential", jacobian_update=jacobian_update,
+                        max_iter_hyd=30, max_iter_therm=30)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+def test_quasi_newton_time_series():
+    net = water_nw.water_meshed_pumps()
+    pandapipes.pipeflow(net, jacobian_update="chord", reuse_internal_data=True, max_iter_hyd=30)
+    assert "jacobian_update_hydraulics" in net["_internal_data"]
+
+    # a slightly changed operating point can be calculated with the kept factorization
+    net.sink.mdot_kg_per_s *= 1.01
+    pandapipes.pipeflow(net, jacobian_update="chord", reuse_internal_data=True, max_iter_hyd=30)
+    assert net.converged
+    res = net["_internal_results"]
+    assert res["jacobian_factorizations_hydraulics"] < res["iterations_hydraulics"]
+
+    net_ref = copy.deepcopy(net)
+    pandapipes.pipeflow(net_ref)
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+def test_broyden_secant_damped_step():
+    net = water_nw.water_meshed_pumps()
+    pandapipes.pipeflow(net, jacobian_update="broyden", nonlinear_method="linesearch")
+    net["_internal_data"] = dict()
+    matrix = csr_matrix(np.array([[4., 1., 0.], [1., 3., 1.], [0., 1., 2.]]))
+    residual = np.array([1., 2., 3.])
+    x, factorized = solve_quasi_newton(net, matrix, residual, "test", 3, "full", True)
+    assert factorized
+    # only half of the step is applied, e.g. by the line search
+    scale_quasi_newton_step(net, "test", 0.5, residual)
+    new_residual = np.array([0.3, 0.2, 0.1])
+    _, factorized = solve_quasi_newton(net, matrix, new_residual, "test", 3, "full", True)
+    assert not factorized
+    # the updated jacobian maps the applied step to the change of the residual
+    state = net["_internal_data"]["jacobian_update_test"]
+    assert len(state["updates"]) == 1
+    assert np.allclose(_apply_inverse(state, residual - new_residual), 0.5 * x)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
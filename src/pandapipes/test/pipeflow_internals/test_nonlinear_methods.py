@@ -0,0 +1,142 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_heat_transfer_networks as heat_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.idx_branch import LOAD_VEC_BRANCHES, PL
+from pandapipes.idx_node import LOAD
+from pandapipes.pipeflow import PipeflowNotConverged, assemble_hydraulic_system
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close
+
+
+@pytest.mark.parametrize("create_net", [gas_nw.gas_3parallel, gas_nw.schutterwald,
+                                        gas_nw.gas_meshed_square, gas_nw.gas_tcross1])
+def test_linesearch(create_net):
+    net_ref = create_net()
+    net_ref.sink.mdot_kg_per_s *= 3
+    pandapipes.pipeflow(net_ref, nonlinear_method="automatic", max_iter_hyd=30)
+
+    net = create_net()
+    net.sink.mdot_kg_per_s *= 3
+    pandapipes.pipeflow(net, nonlinear_method="linesearch", max_iter_hyd=30)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    assert net["_internal_results"]["iterations_hydraulics"] \
+        <= net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+def test_linesearch_monotone():
+    net_ref = gas_nw.gas_one_pipe1()
+    pandapipes.pipeflow(net_ref)
+
+    # with a memory of one iteration, the residual norm has to decrease in every iteration, so
+    # that the step length is reduced in some iterations
+    net = gas_nw.gas_one_pipe1()
+    pandapipes.pipeflow(net, nonlinear_method="linesearch", linesearch_memory=1, max_iter_hyd=30)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+def test_linesearch_heat(mode):
+    net_ref = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode=mode)
+
+    net = heat_nw.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode=mode, nonlinear_method="linesearch")
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+
+def high_load_net(mdot=0.205):
+    net = pandapipes.create_empty_network("net", add_stdtypes=False, fluid="lgas")
+    j = pandapipes.create_junctions(net, 6, pn_bar=5, tfluid_k=283.15)
+    pandapipes.create_ext_grid(net, j[0], 5, 283.15)
+    pandapipes.create_pipes_from_parameters(net, j[:-1], j[1:], length_km=2., diameter_m=0.1,
+                                            k_mm=0.1)
+    pandapipes.create_pipe_from_parameters(net, j[0], j[5], length_km=3., diameter_m=0.1,
+                                           k_mm=0.1)
+    pandapipes.create_sinks(net, j[1:], mdot)
+    return net
+
+
+def test_load_continuation():
+    net_ref = high_load_net()
+    pandapipes.pipeflow(net_ref)
+
+    # the target cannot be reached from the initial state within 6 iterations
+    net = high_load_net()
+    with pytest.raises(PipeflowNotConverged):
+        pandapipes.pipeflow(net, max_iter_hyd=6)
+
+    # by default, the continuation starts from a partial load
+    net = high_load_net()
+    pandapipes.pipeflow(net, max_iter_hyd=6, load_continuation=True)
+    assert net.converged
+    assert_results_close(net, net_ref, same_iterations=False)
+    assert list(net["_internal_results"]["continuation_factors_hydraulics"]) == [0.25, 0.75, 1.]
+    assert net["_internal_results"]["continuation_solves_hydraulics"] == 3
+
+    # if the target is tried directly, the step is halved after the failed solve
+    for _ in range(2):
+        net = high_load_net()
+        pandapipes.pipeflow(net, max_iter_hyd=6, load_continuation=True,
+                            continuation_initial_step=1.)
+        assert net.converged
+        assert_results_close(net, net_ref, same_iterations=False)
+        assert list(net["_internal_results"]["continuation_factors_hydraulics"]) == [0.5, 1.]
+        assert net["_internal_results"]["continuation_solves_hydraulics"] == 3
+        assert net["_options"]["alpha"] == 1
+
+
+def test_load_continuation_bounded():
+    # infeasible load (negative pressures)
+    net = high_load_net(0.3)
+    with pytest.raises(PipeflowNotConverged):
+        pandapipes.pipeflow(net, load_continuation=True, continuation_max_solves=4)
+    assert net["_internal_results"]["continuation_solves_hydraulics"] == 4
+    # the target loads are restored
+    assert np.allclose(net["_active_pit"]["node"][1:, LOAD], 0.3)
+
+
+def test_load_continuation_pressure_lift():
+    # the pressure lifts are scaled in the load vector only, so that repeated assemblies with the
+    # same load factor do not change the pit
+    net = water_nw.water_meshed_pumps()
+    pandapipes.pipeflow(net)
+    branch_pit = net["_active_pit"]["branch"]
+    pressure_lift = branch_pit[:, PL].copy()
+    assert np.any(pressure_lift != 0)
+    assemble_hydraulic_system(net)
+    load_branches = branch_pit[:, LOAD_VEC_BRANCHES].copy()
+    net["_internal_data"] = {"load_factor": 0.5}
+    for _ in range(2):
+        assemble_hydraulic_system(net)
+        assert np.allclose(branch_pit[:, PL], pressure_lift)
+        assert np.allclose(branch_pit[:, LOAD_VEC_BRANCHES], load_branches - 0.5 * pressure_lift)
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_meshed_pumps, gas_nw.gas_versatility])
+def test_load_continuation_pumps(create_net):
+    net_ref = create_net()
+    pandapipes.pipeflow(net_ref, tol_p=1e-6, tol_m=1e-6)
+
+    net = create_net()
+    pandapipes.pipeflow(net, tol_p=1e-6, tol_m=1e-6, load_continuation=True,
+                        continuation_initial_step=0.25)
+    assert net.converged
+    assert_results_close(net, net_ref, tables=["res_junction"], same_iterations=False)
+    assert np.allclose(net.res_pipe.mdot_from_kg_per_s.values,
+                       net_ref.res_pipe.mdot_from_kg_per_s.values, atol=1e-5)
+    assert list(net["_internal_results"]["continuation_factors_hydraulics"]) == [0.25, 0.75, 1.]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,104 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import heat_consumer_net, \
+    pressure_control_net
+
+TOLERANCES = dict(iter=100, tol_m=1e-9, tol_p=1e-9)
+
+
+def create_scenarios(net, n_scenarios=4):
+    rng = np.random.default_rng(0)
+    scenarios = {"sink": net.sink.mdot_kg_per_s.values
+                 * rng.uniform(0.5, 1.5, (n_scenarios, len(net.sink))),
+                 "ext_grid": net.ext_grid.p_bar.values
+                 + rng.uniform(-0.1, 0.1, (n_scenarios, len(net.ext_grid)))}
+    if "source" in net and len(net.source):
+        scenarios["source"] = net.source.mdot_kg_per_s.values \
+            * rng.uniform(0.5, 1.5, (n_scenarios, len(net.source)))
+    return scenarios
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_meshed_delta, water_nw.water_meshed_pumps,
+                                        gas_nw.gas_versatility, pressure_control_net])
+@pytest.mark.parametrize("batch_size", [None, 3])
+def test_pipeflow_batch(create_net, batch_size):
+    net = create_net()
+    scenarios = create_scenarios(net)
+    results = pandapipes.pipeflow_batch(net, scenarios, batch_size=batch_size, **TOLERANCES)
+    assert net.converged
+    assert np.all(results["converged"])
+
+    for k in range(len(results["converged"])):
+        net_ref = create_net()
+        for table, values in scenarios.items():
+            col = "p_bar" if table == "ext_grid" else "mdot_kg_per_s"
+            net_ref[table][col] = values[k]
+        pandapipes.pipeflow(net_ref, **TOLERANCES)
+        tables = ["res_" + comp.table_name() for comp in net_ref.component_list]
+        assert set(results) == set(tables) | {"converged"}
+        for table in tables:
+            for col in net_ref[table].columns:
+                assert results[table][col].shape == (4, len(net_ref[table]))
+                assert np.allclose(results[table][col][k], net_ref[table][col].values,
+                                   rtol=1e-5, atol=1e-8, equal_nan=True)
+
+    # the setpoints of the net are not changed
+    net_ref = create_net()
+    assert np.allclose(net.sink.mdot_kg_per_s.values, net_ref.sink.mdot_kg_per_s.values)
+    assert np.allclose(net.ext_grid.p_bar.values, net_ref.ext_grid.p_bar.values)
+
+
+def test_pipeflow_batch_not_converged():
+    net = water_nw.water_meshed_delta()
+    scenarios = {"sink": net.sink.mdot_kg_per_s.values * np.array([[1.], [1e8], [np.inf]])}
+    results = pandapipes.pipeflow_batch(net, scenarios, iter=100)
+    assert not net.converged
+    assert np.array_equal(results["converged"], [True, True, False])
+    assert np.all(np.isfinite(results["res_junction"]["p_bar"][:2]))
+    assert np.all(np.isnan(results["res_junction"]["p_bar"][2]))
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_meshed_delta, gas_nw.gas_meshed_delta])
+def test_pipeflow_batch_failed_scenario(create_net):
+    # the system of the second scenario is not finite, so that the stacked system fails
+    net = create_net()
+    mdot = net.sink.mdot_kg_per_s.values
+    scenarios = {"sink": np.vstack([mdot, np.full_like(mdot, np.inf), mdot * 1.1])}
+    results = pandapipes.pipeflow_batch(net, scenarios, **TOLERANCES)
+    assert np.array_equal(results["converged"], [True, False, True])
+    assert np.all(np.isnan(results["res_junction"]["p_bar"][1]))
+    for k in [0, 2]:
+        net_ref = create_net()
+        net_ref.sink.mdot_kg_per_s = scenarios["sink"][k]
+        pandapipes.pipeflow(net_ref, **TOLERANCES)
+        assert np.allclose(results["res_junction"]["p_bar"][k], net_ref.res_junction.p_bar.values,
+                           rtol=1e-5)
+
+    # the result tables of the net contain the last converged scenario
+    for col in net.res_pipe.columns:
+        assert np.allclose(net.res_pipe[col].values, results["res_pipe"][col][2], equal_nan=True)
+
+
+def test_pipeflow_batch_invalid():
+    net = water_nw.water_meshed_delta()
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow_batch(net, {"sink": np.ones((2, len(net.sink) + 1))})
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow_batch(net, {"sink": np.ones((2, len(net.sink))),
+                                        "ext_grid": np.ones((3, len(net.ext_grid)))})
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow_batch(net, {"pipe": np.ones((2, len(net.pipe)))})
+    with pytest.raises(UserWarning):
+        pandapipes.pipeflow_batch(heat_consumer_net(), {"ext_grid": np.ones((2, 0))})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,116 @@
+# Copyright (c) 2020-2024 by Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel, and University of Kassel. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+
+import numpy as np
+import pytest
+
+import pandapipes
+import pandapipes.networks.simple_gas_networks as gas_nw
+import pandapipes.networks.simple_water_networks as water_nw
+from pandapipes.test.pipeflow_internals.pipeflow_comparison import assert_results_close, \
+    pressure_control_net
+
+
+@pytest.mark.parametrize("create_net", [water_nw.water_meshed_pumps, gas_nw.gas_versatility,
+                                        pressure_control_net])
+def test_compiled_pipeflow(create_net):
+    net = create_net()
+    model = pandapipes.compile_pipeflow(net, iter=30)
+    for factor, dp in [(1., 0.), (1.3, 0.1), (0.6, -0.05)]:
+        sink = create_net().sink.mdot_kg_per_s.values * factor
+        ext_grid = create_net().ext_grid.p_bar.values + dp
+        model.solve(sink=sink, ext_grid=ext_grid)
+        assert net.converged
+        assert np.allclose(net.sink.mdot_kg_per_s.values, sink)
+
+        net_ref = create_net()
+        net_ref.sink.mdot_kg_per_s = sink
+        net_ref.ext_grid.p_bar = ext_grid
+        pandapipes.pipeflow(net_ref, iter=30)
+        assert_results_close(net, net_ref)
+        assert net["_internal_results"]["iterations_hydraulics"] \
+               == net_ref["_internal_results"]["iterations_hydraulics"]
+
+
+def test_compiled_pipeflow_warm_start():
+    net = gas_nw.gas_versatility()
+    model = pandapipes.compile_pipeflow(net, init="results", iter=30,
+                                        tol_m=1e-9, tol_p=1e-9)
+    model.solve(extract_results=False)
+    iterations_flat = net["_internal_results"]["iterations_hydraulics"]
+    assert net.res_junction.p_bar.isnull().all()
+
+    sink = net.sink.mdot_kg_per_s.values * 1.05
+    model.solve(extract_results=False, sink=sink)
+    assert net["_internal_results"]["iterations_hydraulics"] < iterations_flat
+    model.extract_results()
+
+    net_ref = gas_nw.gas_versatility()
+    net_ref.sink.mdot_kg_per_s = sink
+    pandapipes.pipeflow(net_ref, iter=30, tol_m=1e-9, tol_p=1e-9)
+    # the warm start performs other iterations than the flat start of the reference
+    assert_results_close(net, net_ref, same_iterations=False)
+
+    # a pipeflow of the net in between does not change the model
+    pandapipes.pipeflow(net, hydraulic_formulation="schur")
+    model.solve(sink=sink)
+    assert net["_options"]["hydraulic_formulation"] == "auto"
+    assert_results_close(net, net_ref, same_iterations=False)
+
+
+def test_compiled_pipeflow_not_converged():
+    net = water_nw.water_meshed_delta()
+    model = pandapipes.compile_pipeflow(net, iter=10, init="results")
+    sink = net.sink.mdot_kg_per_s.values
+    with pytest.raises(pandapipes.PipeflowNotConverged):
+        model.solve(sink=sink)
+    # the next solve starts from the initial state again
+    model.solve(sink=sink * 30)
+    assert net.converged
+
+    net_ref = water_nw.water_meshed_delta()
+    net_ref.sink.mdot_kg_per_s = sink * 30
+    pandapipes.pipeflow(net_ref, iter=10)
+    assert_results_close(net, net_ref)
+
+
+def test_compiled_pipeflow_invalid():
+    net = water_nw.water_meshed_delta()
+    with pytest.raises(UserWarning):
+        pandapipes.compile_pipeflow(net, mode="sequential")
+    model = pandapipes.compile_pipeflow(net, iter=100)
+    with pytest.raises(UserWarning):
+        model.solve(pipe=np.ones(len(net.pipe)))
+    with pytest.raises(UserWarning):
+        model.solve(sink=np.ones(len(net.sink) + 1))
+    pandapipes.create_sink(net, 0, 0.1)
+    with pytest.raises(UserWarning):
+        model.solve()
+    with pytest.raises(UserWarning):
+        pandapipes.compile_pipeflow(net, solve_islands=True)
+
+
+@pytest.mark.parametrize("table, column, value", [("pipe", "in_service", False),
+                                                  ("pipe", "to_junction", 0),
+                                                  ("junction", "in_service", False),
+                                                  ("ext_grid", "type", "t")])
+def test_compiled_pipeflow_structure_changed(table, column, value):
+    # changes of the structure that keep the number of rows are detected as well
+    net = water_nw.water_meshed_delta()
+    model = pandapipes.compile_pipeflow(net, iter=100)
+    model.solve()
+    net[table].loc[net[table].index[-1], column] = value
+    with pytest.raises(UserWarning):
+        model.solve()
+
+    # changes of the set points and the results do not change the structure
+    net = water_nw.water_meshed_delta()
+    model = pandapipes.compile_pipeflow(net, iter=100)
+    net.sink.mdot_kg_per_s *= 2
+    pandapipes.pipeflow(net, iter=100)
+    model.solve(sink=net.sink.mdot_kg_per_s.values)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -5,7 +5,12 @@
 import numpy as np
 import pytest
 
+import pandapipes
 import pandapipes.networks.simple_gas_networks as nw
+import pandapipes.networks.simple_heat_transfer_networks as nw_heat
+from pandapipes.idx_branch import MDOTINIT
+from pandapipes.pf.build_system_matrix import build_system_matrix
+from pandapipes.pf.coupled_system import set_thermal_flow_direction
 from pandapipes.pipeflow import logger as pf_logger
 from pandapipes.test.stanet_comparison.pipeflow_stanet_comparison import pipeflow_stanet_comparison
 
@@ -36,5 +41,42 @@ def test_update(use_numba, log_results=False):
     assert np.all(v_diff_abs < 0.05)
 
 
+@pytest.mark.parametrize("mode", ["sequential", "bidirectional"])
+def test_update_heat(mode):
+    net_ref = nw_heat.heat_transfer_delta()
+    pandapipes.pipeflow(net_ref, mode=mode)
+
+    net = nw_heat.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode=mode, only_update_hydraulic_matrix=True,
+                        only_update_heat_matrix=True, reuse_internal_data=True)
+    assert net.converged
+    assert "matrix_structure_hydraulics" in net["_internal_data"]
+    assert "matrix_structure_heat_transfer" in net["_internal_data"]
+    assert np.allclose(net.res_junction.values, net_ref.res_junction.values)
+    assert np.allclose(net.res_pipe.values, net_ref.res_pipe.values)
+
+
+def test_update_heat_flow_reversal():
+    net = nw_heat.heat_transfer_delta()
+    pandapipes.pipeflow(net, mode="sequential", only_update_heat_matrix=True,
+                        reuse_internal_data=True)
+    node_pit, branch_pit = net["_pit"]["node"], net["_pit"]["branch"]
+    set_thermal_flow_direction(branch_pit)
+    build_system_matrix(net, branch_pit, node_pit, True)
+    structure = net["_internal_data"]["matrix_structure_heat_transfer"]
+    matrix, load_vector = build_system_matrix(net, branch_pit, node_pit, True)
+    assert net["_internal_data"]["matrix_structure_heat_transfer"] is structure
+
+    # the structure is rebuilt if the flow direction of a branch changes
+    branch_pit[0, MDOTINIT] *= -1
+    set_thermal_flow_direction(branch_pit)
+    matrix, load_vector = build_system_matrix(net, branch_pit, node_pit, True)
+    assert net["_internal_data"]["matrix_structure_heat_transfer"] is not structure
+    net["_options"]["only_update_heat_matrix"] = False
+    matrix_ref, load_vector_ref = build_system_matrix(net, branch_pit, node_pit, True)
+    assert np.array_equal(matrix.toarray(), matrix_ref.toarray())
+    assert np.array_equal(load_vector, load_vector_ref)
+
+
 if __name__ == "__main__":
     pytest.main([r'pandapipes/test/pipeflow_internals/test_update_matrix.py'])